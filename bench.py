@@ -0,0 +1,441 @@
+"""
+Benchmarks for the Modoya web app.
+
+Runs against the Flask test client, so no server needs to be started.
+keys.py must exist (any key value works, no API calls are made).
+
+Usage:
+    python bench.py images
+    python bench.py snapshot [item_count]
+    python bench.py pricing [item_count]
+    python bench.py recommend [item_count]
+    python bench.py similar [item_count]
+    python bench.py search [item_count]
+    python bench.py fulltext [item_count]
+    python bench.py memory [item_count]
+    python bench.py workers [item_count] [worker_count]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import tempfile
+from urllib.parse import urlsplit, urlunsplit
+
+
+class SimulatedBrowserCache:
+    """
+    A minimal HTTP cache that follows Cache-Control and ETag the way a browser does.
+
+    Fresh entries are reused without a request, stale entries with a validator
+    are revalidated with If-None-Match, and everything else is fetched again.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.entries = {}
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.requests = 0
+        self.bytes_received = 0
+
+    def get(self, url):
+        entry = self.entries.get(url)
+        if entry and entry['fresh_until'] > time.time():
+            return
+
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        response = self.client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes_received += len(response.get_data()) + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+
+        if response.status_code == 304:
+            entry['fresh_until'] = self._fresh_until(response)
+        elif response.status_code == 200:
+            self.entries[url] = {'etag': response.headers.get('ETag'), 'fresh_until': self._fresh_until(response)}
+
+    @staticmethod
+    def _fresh_until(response):
+        cache_control = response.cache_control
+        if cache_control.no_cache or cache_control.max_age is None:
+            return 0
+        return time.time() + cache_control.max_age
+
+
+def strip_query(url):
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+
+
+def pick_srcset_candidate(srcset, min_width):
+    """Mimics a browser choosing the smallest srcset candidate at least min_width wide."""
+    candidates = []
+    for entry in srcset.split(','):
+        url, width = entry.strip().rsplit(' ', 1)
+        candidates.append((int(width.rstrip('w')), url))
+    candidates.sort()
+    for width, url in candidates:
+        if width >= min_width:
+            return url
+    return candidates[-1][1]
+
+
+def bench_images():
+    import main
+
+    client = main.app.test_client()
+    items = client.get('/api/items').get_json()['items']
+
+    scenarios = {
+        'before (original PNGs, unversioned)': [strip_query(item['image_url']) for item in items],
+        'after (fingerprinted WebP thumbnails)': [
+            pick_srcset_candidate(item['srcset']['webp'], 480) if item['srcset'] else item['image_url']
+            for item in items
+        ],
+    }
+
+    print(f"Images per page view: {len(items)}")
+    for name, urls in scenarios.items():
+        browser = SimulatedBrowserCache(client)
+        for url in urls:
+            browser.get(url)
+        first = (browser.requests, browser.bytes_received)
+
+        browser.reset_counters()
+        for url in urls:
+            browser.get(url)
+        returning = (browser.requests, browser.bytes_received)
+
+        print(f"{name}:")
+        print(f"    first view:     {first[0]:4d} requests, {first[1]:>12,d} bytes")
+        print(f"    returning view: {returning[0]:4d} requests, {returning[1]:>12,d} bytes")
+
+
+def make_synthetic_catalog(folder, item_count, source_folder="Pictures"):
+    """Writes item_count sidecars into folder by cycling through the real ones with new row_ids."""
+    import module
+
+    templates = module.load_metadata(source_folder)
+    for row_id in range(item_count):
+        data = dict(templates[row_id % len(templates)], row_id=row_id)
+        with open(os.path.join(folder, f"{row_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"    {label:<32} {time.perf_counter() - start:8.3f} s")
+    return result
+
+
+def bench_snapshot(item_count="100000"):
+    import module
+
+    item_count = int(item_count)
+    folder = tempfile.mkdtemp(prefix="modoya-bench-")
+    try:
+        make_synthetic_catalog(folder, item_count)
+        snapshot_path = os.path.join(folder, "catalog.snapshot")
+        print(f"Catalog load with {item_count:,d} sidecars:")
+        timed("parse every sidecar", module.get_all_items, folder)
+        workers = os.cpu_count() or 1
+        timings = {}
+        timed(f"parse in parallel ({workers} workers)", module.get_all_items, folder, None, workers, timings)
+        for phase, seconds in timings.items():
+            print(f"        {phase:<28} {seconds:8.3f} s")
+        timed("build snapshot", module.get_all_items, folder, snapshot_path)
+        timed("load from snapshot", module.get_all_items, folder, snapshot_path)
+        print(f"    snapshot size: {os.path.getsize(snapshot_path):,d} bytes")
+    finally:
+        shutil.rmtree(folder)
+
+
+def random_pricing_metadata(rng, row_id, vocabulary):
+    """Draws metadata from the real vocabularies plus unknown and missing values."""
+    metadata = {'row_id': row_id}
+    for field, values in vocabulary.items():
+        choice = rng.choice(values + ['Unknown', None])
+        if choice is not None:
+            metadata[field] = choice
+    return metadata
+
+
+def bench_pricing(item_count="100000"):
+    import module
+
+    catalog = module.get_all_items("Pictures")
+    vocabulary = {
+        field: sorted({getattr(item, field) for item in catalog if getattr(item, field)})
+        for field in ('category', 'material', 'style')
+    }
+    for rule_field, field in (('premium_materials', 'material'), ('premium_styles', 'style')):
+        vocabulary[field] = sorted(set(vocabulary[field]) | set(module.PRICING_RULES[rule_field]))
+    vocabulary['category'] = sorted(set(vocabulary['category']) | set(module.PRICING_RULES['rent']['base']))
+
+    rng = random.Random(0)
+    items = [module.make_item(random_pricing_metadata(rng, row_id, vocabulary)) for row_id in range(int(item_count))]
+    print(f"Pricing {len(items):,d} items:")
+    timed("calculate_rent + buyout per item", lambda: [
+        (module.calculate_rent(item), module.calculate_buyout_price(item)) for item in items
+    ])
+    engine = timed("PricingEngine (vectorized)", module.PricingEngine, items)
+    timed("reprice with compiled codes", engine.reprice, module.PRICING_RULES)
+    timed("lookup every item", lambda: [engine.price(row_id) for row_id in range(len(items))])
+
+
+def bench_recommend(item_count="100000"):
+    import module
+
+    templates = module.load_metadata("Pictures")
+    items = [
+        module.make_item(dict(templates[row_id % len(templates)], row_id=row_id))
+        for row_id in range(int(item_count))
+    ]
+    print(f"Style recommender over {len(items):,d} items:")
+    recommender = timed("build TF-IDF matrix", module.StyleRecommender, items)
+    print(f"    weights: {len(recommender):,d} items x {len(recommender.vocabulary):,d} terms, {len(recommender.data):,d} non-zero, {recommender.nbytes:,d} bytes")
+
+    query = module.analysis_terms({
+        "styleDNA": [{"name": "Japandi", "percentage": 80}, {"name": "Wabi-Sabi", "percentage": 60}],
+        "keyElements": ["natural wood", "linen", "low profile"],
+        "designRecommendations": ["Add a velvet accent chair"]
+    })
+    runs = 50
+    start = time.perf_counter()
+    for _ in range(runs):
+        recommender.rank(query, 4)
+    print(f"    {'rank top 4 (mean of ' + str(runs) + ')':<32} {(time.perf_counter() - start) / runs * 1000:8.2f} ms")
+
+
+def bench_similar(item_count="100000"):
+    import numpy as np
+    import module
+
+    folder = "Pictures"
+    store = module.ImageFeatureStore(folder, None)
+    real = np.array([store.get(module.image_filename(item)) for item in module.get_all_items(folder)])
+
+    # Synthetic SKUs: the real image vectors plus noise, renormalized.
+    rng = np.random.default_rng(0)
+    count = int(item_count)
+    vectors = real[rng.integers(len(real), size=count)] + rng.normal(0, 0.05, (count, real.shape[1]))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+    print(f"Visual similarity index over {count:,d} vectors ({real.shape[1]} dims):")
+    index = module.VisualSimilarityIndex(real.shape[1])
+    def add_all():
+        for row_id, vector in enumerate(vectors):
+            index.add(row_id, vector)
+    timed("incremental build", add_all)
+
+    latencies = []
+    hits = 0
+    queries = rng.integers(count, size=200)
+    for row_id in queries:
+        start = time.perf_counter()
+        found = index.similar(row_id, 8)
+        latencies.append(time.perf_counter() - start)
+        scores = vectors @ vectors[row_id]
+        scores[row_id] = -np.inf
+        exact = set(np.argpartition(-scores, 8)[:8].tolist())
+        hits += len(exact & {int(found_id) for found_id, _ in found})
+    latencies.sort()
+    print(f"    search p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+    print(f"    recall@8 vs exact search: {hits / (8 * len(queries)):.2%}")
+
+
+def bench_search(item_count="100000"):
+    import module
+
+    templates = module.load_metadata("Pictures")
+    catalog = module.Catalog(
+        module.make_item(dict(templates[row_id % len(templates)], row_id=row_id))
+        for row_id in range(int(item_count))
+    )
+    print(f"Faceted search over {len(catalog):,d} items:")
+    index = timed("build bitset indexes", catalog.search_index)
+
+    options = module.get_available_options(catalog)
+    rng = random.Random(0)
+    queries = []
+    for _ in range(200):
+        filters = {facet: [rng.choice(options[facet])] for facet in rng.sample(['style', 'color', 'season', 'category'], 2)}
+        queries.append((filters, rng.choice(['', '', 'chair', 'lamp', 'wood'])))
+
+    for label in ("cold queries", "repeated (cached)"):
+        latencies = []
+        for filters, text in queries:
+            start = time.perf_counter()
+            index.search(filters, text)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"    {label:<20} p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+
+def bench_fulltext(item_count="100000"):
+    import module
+
+    templates = module.load_metadata("Pictures")
+    items = [
+        module.make_item(dict(templates[row_id % len(templates)], row_id=row_id))
+        for row_id in range(int(item_count))
+    ]
+    print(f"Full-text index over {len(items):,d} items:")
+    index = module.FullTextIndex()
+    def add_all():
+        for item in items:
+            index.add(item)
+    timed("build (incremental adds)", add_all)
+    print(f"    {len(index.postings):,d} terms, {len(index.words):,d} words")
+
+    folder = tempfile.mkdtemp(prefix="modoya-bench-")
+    try:
+        path = os.path.join(folder, "catalog.fulltext")
+        timed("save", index.save, path, {}, {})
+        print(f"    index size: {os.path.getsize(path):,d} bytes")
+        timed("load", module.FullTextIndex.load, path)
+    finally:
+        shutil.rmtree(folder)
+
+    edited = module.make_item(dict(templates[0], row_id=0, attributes="Hand-rubbed zebrawood inlay"))
+    timed("re-index one changed sidecar", index.add, edited)
+
+    rng = random.Random(0)
+    words = [word for word in index.words if len(word) > 3]
+    workloads = {
+        'search': [f"{rng.choice(words)} {rng.choice(words)}" for _ in range(200)],
+        'search, common words': ['matte finish', 'wood chair', 'soft upholstery'] * 20,
+        'typeahead': [rng.choice(words)[:rng.randint(1, 4)] for _ in range(200)],
+    }
+    for label, queries in workloads.items():
+        func = index.suggest if label == 'typeahead' else index.search
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"    {label:<20} p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+
+def bench_memory(item_count="100000"):
+    import gc
+    import tracemalloc
+    import module
+
+    item_count = int(item_count)
+    folder = tempfile.mkdtemp(prefix="modoya-bench-")
+    try:
+        make_synthetic_catalog(folder, item_count)
+        paths = [os.path.join(folder, filename) for filename in module.list_sidecars(folder)]
+        representations = {
+            'before: dict wrapping the sidecar': lambda data, path: {"image_path": data.get("image_file"), "metadata": data},
+            'after: FurnitureItem': module.make_item,
+        }
+        print(f"Memory held by {item_count:,d} items (tracemalloc):")
+        for label, wrap in representations.items():
+            gc.collect()
+            tracemalloc.start()
+            items = [wrap(module.load_sidecar(path), path) for path in paths]
+            gc.collect()
+            held = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f"    {label:<36} {held / item_count:8,.0f} bytes per SKU, {held / 2**20:8.1f} MiB")
+
+        sample = items[:1000]
+        start = time.perf_counter()
+        for item in sample:
+            item.get('prompt')
+        print(f"    {'cold field (prompt) read':<36} {(time.perf_counter() - start) / len(sample) * 1e6:8.1f} us per item")
+    finally:
+        shutil.rmtree(folder)
+
+
+def process_memory():
+    """Returns (Rss, Pss, private) bytes of this process, read from /proc/self/smaps_rollup (Linux only)."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return fields['Rss'], fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+
+def start_worker(folder, snapshot_path, table_path, results, done):
+    """Loads a catalog the way a web worker does, reports timing and memory, then stays alive until done."""
+    import module
+
+    start = time.perf_counter()
+    if folder is None:
+        watcher = None
+    else:
+        watcher = module.CatalogWatcher(folder, snapshot_path, table_path=table_path)
+        module.get_available_options(watcher.catalog)
+    results.put((time.perf_counter() - start, watcher is not None and watcher._table_lock is None) + process_memory())
+    done.wait()
+
+
+def bench_workers(item_count="100000", worker_count="4"):
+    import multiprocessing
+    import module
+
+    item_count, worker_count = int(item_count), int(worker_count)
+    folder = tempfile.mkdtemp(prefix="modoya-bench-")
+    snapshot_path = os.path.join(folder, "catalog.snapshot")
+    table_path = os.path.join(folder, "catalog.table")
+    try:
+        make_synthetic_catalog(folder, item_count)
+        module.get_all_items(folder, snapshot_path)
+        publisher = module.CatalogWatcher(folder, snapshot_path, table_path=table_path)
+        print(f"{worker_count} workers, {item_count:,d} items (catalog table {os.path.getsize(table_path):,d} bytes):")
+
+        context = multiprocessing.get_context("spawn")
+        modes = {
+            'interpreter + imports only': (None, None, None),
+            'each worker loads the snapshot': (folder, snapshot_path, None),
+            'workers map the shared table': (folder, snapshot_path, table_path),
+        }
+        for label, args in modes.items():
+            results, done = context.Queue(), context.Event()
+            workers = [context.Process(target=start_worker, args=args + (results, done)) for _ in range(worker_count)]
+            for worker in workers:
+                worker.start()
+            reports = [results.get() for _ in workers]
+            done.set()
+            for worker in workers:
+                worker.join()
+            startup = max(seconds for seconds, *_ in reports)
+            private = sum(report[4] for report in reports) / len(reports)
+            pss = sum(report[3] for report in reports)
+            readers = sum(1 for report in reports if report[1])
+            print(f"    {label:<32} startup {startup:6.2f} s, private {private / 2**20:7.1f} MiB per worker, "
+                  f"PSS {pss / 2**20:7.1f} MiB total" + (f" ({readers} readers)" if args[2] else ""))
+        publisher.stop()
+    finally:
+        shutil.rmtree(folder)
+
+
+BENCHMARKS = {
+    'images': bench_images,
+    'snapshot': bench_snapshot,
+    'pricing': bench_pricing,
+    'recommend': bench_recommend,
+    'similar': bench_similar,
+    'search': bench_search,
+    'fulltext': bench_fulltext,
+    'memory': bench_memory,
+    'workers': bench_workers,
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Usage: python bench.py [{'|'.join(BENCHMARKS)}] [args...]")
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
@@ -1,60 +1,203 @@
-from flask import Flask, render_template, request, session, redirect, url_for, send_from_directory, jsonify
+from flask import Flask, render_template, request, session, redirect, url_for, send_from_directory, jsonify, abort, g, Response, stream_with_context
 import sys
-import os
 import random
 import time
-import base64
-import io
 import json
+import concurrent.futures
 from datetime import datetime
-from openai import OpenAI
+import httpx
+from openai import OpenAI, DefaultHttpxClient, APIConnectionError
 import keys
+import secrets
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from werkzeug.security import safe_join
 
-from module import get_all_items, filter_furniture, calculate_rent, calculate_buyout_price, get_item_by_id
+from module import CatalogWatcher, ThumbnailCache, ImageFeatureStore, SimilarItemsIndexer, SQLiteSessionStore, JobQueue, QueueFullError, ResultCache, analysis_cache_key, UploadTooLargeError, spool_uploads, encode_uploads, ResilientChatClient, UpstreamUnavailableError, StyleDNAStreamParser, FACETS, SEARCH_FACETS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, THUMBNAIL_FORMATS, IMMUTABLE_MAX_AGE, image_filename, get_item_by_id, validate_duration, QUOTE_DURATIONS
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+class ServerSideSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.load_session(sid)
+            if data is not None:
+                return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete_session(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified or (session.new and not any(session.values())):
+            return
+
+        self.store.save_session(session.sid, dict(session), app.permanent_session_lifetime.total_seconds())
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+SESSION_DB_PATH = "modoya_sessions.sqlite3"
+SESSION_STORE = SQLiteSessionStore(SESSION_DB_PATH)
 
 app = Flask(__name__)
 app.secret_key = 'your_super_secret_key_for_modoya' 
+app.session_interface = ServerSideSessionInterface(SESSION_STORE)
+
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+ANALYZER_MAX_DIMENSION = 1024
+ANALYZER_JPEG_QUALITY = 85
+UPLOAD_WORKERS = 6
+UPLOAD_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+app.config['MAX_CONTENT_LENGTH'] = 3 * MAX_UPLOAD_BYTES + 64 * 1024
+
+OPENAI_POOL_SIZE = 16
+OPENAI_MAX_CONCURRENCY = 8
+OPENAI_DEADLINE = 60.0
+OPENAI_MAX_RETRIES = 3
 
 try:
-    client = OpenAI(api_key=keys.OpenAI_key)
+    client = ResilientChatClient(
+        OpenAI(
+            api_key=keys.OpenAI_key,
+            max_retries=0,
+            http_client=DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=OPENAI_POOL_SIZE, max_keepalive_connections=OPENAI_POOL_SIZE)
+            )
+        ),
+        max_concurrency=OPENAI_MAX_CONCURRENCY,
+        deadline=OPENAI_DEADLINE,
+        max_retries=OPENAI_MAX_RETRIES,
+        retryable_exceptions=(APIConnectionError,)
+    )
 except AttributeError:
     sys.exit(1)
 
 FOLDER_PATH = "Pictures"
+THUMBNAIL_FOLDER = ".thumbnails"
+SNAPSHOT_PATH = ".catalog.snapshot"
+FULLTEXT_PATH = ".catalog.fulltext"
+CATALOG_TABLE_PATH = ".catalog.table"
+PRICING_RULES_PATH = "pricing_rules.json"
+CATALOG_POLL_INTERVAL = 5.0
 
 try:
-    ALL_FURNITURE_ITEMS = get_all_items(FOLDER_PATH)
+    CATALOG_WATCHER = CatalogWatcher(
+        FOLDER_PATH, SNAPSHOT_PATH, interval=CATALOG_POLL_INTERVAL,
+        pricing_rules_path=PRICING_RULES_PATH, fulltext_path=FULLTEXT_PATH, table_path=CATALOG_TABLE_PATH
+    )
 except FileNotFoundError:
     sys.exit(1)
+CATALOG_WATCHER.start()
 
-def encode_image(image_file):
+IMAGE_FEATURES_PATH = ".image_features.pkl"
+SIMILAR_ITEMS = SimilarItemsIndexer(ImageFeatureStore(FOLDER_PATH, IMAGE_FEATURES_PATH))
+SIMILAR_ITEMS.start(lambda: CATALOG_WATCHER.catalog, CATALOG_POLL_INTERVAL)
+MAX_SIMILAR_ITEMS = 24
+MAX_SUGGESTIONS = 10
+
+def current_catalog():
+    if 'catalog' not in g:
+        g.catalog = CATALOG_WATCHER.catalog
+    return g.catalog
+
+def spool_images(image_files):
+    return spool_uploads([image_file.stream for image_file in image_files], UPLOAD_EXECUTOR, max_bytes=MAX_UPLOAD_BYTES)
+
+def encode_images(uploads):
+    return encode_uploads(uploads, UPLOAD_EXECUTOR, max_dimension=ANALYZER_MAX_DIMENSION, quality=ANALYZER_JPEG_QUALITY)
+
+def close_uploads(uploads):
+    for upload in uploads:
+        upload.close()
+
+def format_server_timing(uploads):
+    entries = []
+    for position, upload in enumerate(uploads, start=1):
+        for phase, seconds in upload.info['timings'].items():
+            entries.append(f"image{position}-{phase};dur={seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+THUMBNAILS = ThumbnailCache(FOLDER_PATH, THUMBNAIL_FOLDER)
+THUMBNAILS.fingerprint_all(image_filename(item) for item in CATALOG_WATCHER.catalog)
+
+def build_image_variants(filename):
     try:
-        img_bytes = image_file.read()
-        b64_string = base64.b64encode(img_bytes).decode('utf-8')
-        return b64_string
-    except Exception as e:
-        return None
+        derivatives = {ext: THUMBNAILS.derivative_names(filename, ext) for ext in THUMBNAIL_FORMATS}
+    except FileNotFoundError:
+        return {}
+
+    srcset = {
+        ext: ", ".join(f"{url_for('serve_thumbnail', name=name)} {width}w" for width, name in names)
+        for ext, names in derivatives.items()
+    }
+    default_width, default_name = derivatives['jpg'][len(derivatives['jpg']) // 2]
+    return {
+        'thumbnail_url': url_for('serve_thumbnail', name=default_name),
+        'srcset': srcset
+    }
+
+def get_render_records():
+    records = current_catalog().render_records(
+        lambda filename: url_for('serve_pictures', filename=filename, v=THUMBNAILS.fingerprint(filename)),
+        build_image_variants
+    )
+    THUMBNAILS.save_manifest()
+    return records
+
+RECOMMENDATION_COUNT = 4
 
 def format_recommendations(items_list, match_reason=""):
     items_for_render = []
-    sample_size = min(len(items_list), 4)
-    recommended_items = random.sample(items_list, sample_size)
+    render_records = get_render_records()
     
-    for item in recommended_items:
-        img_url_path = item['image_path'].replace('\\', '/')
-        filename_only = img_url_path.split('/')[-1]
+    for item in items_list[:RECOMMENDATION_COUNT]:
+        record = render_records[item.id]
         items_for_render.append({
-            'id': item['metadata']['row_id'],
-            'series': item['metadata']['series'],
-            'style': item['metadata']['style'],
-            'category': item['metadata'].get('category', 'Furniture'),
-            'image_url': url_for('serve_pictures', filename=filename_only),
-            'monthly_rent': "%.2f" % calculate_rent(item['metadata']),
-            'buyout_price': "%.2f" % calculate_buyout_price(item['metadata']),
+            'id': record['id'],
+            'series': record['series'],
+            'style': record['style'],
+            'category': record['category'],
+            'image_url': record['image_url'],
+            'thumbnail_url': record.get('thumbnail_url', record['image_url']),
+            'monthly_rent': "%.2f" % record['monthly_rent'],
+            'buyout_price': "%.2f" % record['buyout_price'],
             'match_reason': match_reason
         })
     return items_for_render
 
+AI_MODEL = "gpt-4o"
+ANALYZER_WORKERS = 4
+ANALYZER_QUEUE_DEPTH = 16
+ANALYZER_JOBS = JobQueue(max_workers=ANALYZER_WORKERS, max_pending=ANALYZER_QUEUE_DEPTH)
+ANALYSIS_CACHE_FOLDER = ".analysis_cache"
+ANALYSIS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+ANALYSIS_CACHE = ResultCache(max_entries=512, ttl=7 * 24 * 60 * 60, disk_folder=ANALYSIS_CACHE_FOLDER, max_disk_bytes=ANALYSIS_CACHE_MAX_BYTES)
+
 AI_SYSTEM_PROMPT = """
 You are a professional interior design assistant. Your goal is to analyze
 three images provided by the user and return a JSON object that
@@ -78,44 +221,196 @@ You MUST respond with ONLY a valid JSON object in the following format.
 }
 """
 
+def send_fingerprinted(directory, filename, content_hash, immutable):
+    if immutable:
+        response = send_from_directory(directory, filename, etag=content_hash, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.immutable = True
+    else:
+        response = send_from_directory(directory, filename, etag=content_hash)
+    return response
+
+AI_FALLBACK_RESPONSE = {
+    "styleDNA": [
+        {"name": "Modern", "percentage": 100}
+    ],
+    "keyElements": [
+        "Clean Lines", "Neutral Color Palette", "Functional Decor"
+    ],
+    "designRecommendations": [
+        "Our Style Analyzer is busy right now, so here is a versatile modern selection. Please try again in a few minutes for a personalized analysis."
+    ],
+    "fallback": True
+}
+
 @app.route('/Pictures/<path:filename>')
 def serve_pictures(filename):
-    return send_from_directory(FOLDER_PATH, filename)
+    if safe_join(FOLDER_PATH, filename) is None:
+        abort(404)
+    content_hash = THUMBNAILS.fingerprint(filename)
+    if content_hash is None:
+        abort(404)
+    return send_fingerprinted(FOLDER_PATH, filename, content_hash, request.args.get('v') == content_hash)
+
+@app.route('/thumbnails/<name>')
+def serve_thumbnail(name):
+    path = THUMBNAILS.get(name)
+    if path is None:
+        abort(404)
+    return send_fingerprinted(THUMBNAIL_FOLDER, name, name.rpartition('.')[0], True)
+
+@app.context_processor
+def inject_picture_url():
+    def picture_url(filename):
+        return url_for('serve_pictures', filename=filename, v=THUMBNAILS.fingerprint(filename))
+    return {'picture_url': picture_url}
+
+def get_facet_filters():
+    return {facet: request.args.get(facet) for facet in FACETS if request.args.get(facet)}
 
 @app.route('/')
 def index():
-    if 'cart' not in session:
-        session['cart'] = {}
-
-    items_for_render = []
-    for item in ALL_FURNITURE_ITEMS:
-        img_url_path = item['image_path'].replace('\\', '/') 
-        filename_only = img_url_path.split('/')[-1]
-        
-        monthly_rent = calculate_rent(item['metadata'])
-        buyout_price = calculate_buyout_price(item['metadata'])
-        
-        item_data = item.copy()
-        item_data['id'] = item['metadata']['row_id']
-        item_data['image_url'] = url_for('serve_pictures', filename=filename_only)
-        item_data['monthly_rent'] = monthly_rent
-        item_data['buyout_price'] = buyout_price
-        items_for_render.append(item_data)
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    filters = get_facet_filters()
+    result = current_catalog().page(limit=DEFAULT_PAGE_SIZE, offset=(page - 1) * DEFAULT_PAGE_SIZE, **filters)
+    render_records = get_render_records()
+    items_for_render = [render_records[item_id] for item_id in result['ids']]
+    total_pages = max((result['total'] + DEFAULT_PAGE_SIZE - 1) // DEFAULT_PAGE_SIZE, 1)
         
     cart_item_count = len(session.get('cart', {}))
     return render_template('index.html', 
                            items=items_for_render,
-                           cart_item_count=cart_item_count)
+                           cart_item_count=cart_item_count,
+                           page=page,
+                           total_pages=total_pages,
+                           total_items=result['total'],
+                           next_cursor=result['next_cursor'],
+                           filters=filters,
+                           search_facets=SEARCH_FACETS)
+
+def api_item(record):
+    return {
+        'id': record['id'],
+        'series': record['series'],
+        'style': record['style'],
+        'category': record['category'],
+        'image_url': record['image_url'],
+        'thumbnail_url': record.get('thumbnail_url', record['image_url']),
+        'srcset': record.get('srcset', {}),
+        'monthly_rent': record['monthly_rent'],
+        'buyout_price': record['buyout_price']
+    }
+
+@app.route('/api/items')
+def api_items():
+    try:
+        result = current_catalog().page(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE),
+            **get_facet_filters()
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    render_records = get_render_records()
+    return jsonify({
+        "items": [api_item(render_records[item_id]) for item_id in result['ids']],
+        "next_cursor": result['next_cursor'],
+        "total": result['total']
+    })
+
+@app.route('/api/search')
+def api_search():
+    filters = {facet: request.args.getlist(facet) for facet in SEARCH_FACETS if request.args.getlist(facet)}
+    try:
+        result = current_catalog().search_index().search(
+            filters,
+            text=request.args.get('q'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    render_records = get_render_records()
+    return jsonify({
+        "items": [api_item(render_records[item_id]) for item_id in result['ids']],
+        "next_cursor": result['next_cursor'],
+        "total": result['total'],
+        "facets": result['facets']
+    })
+
+@app.route('/api/search/text')
+def api_search_text():
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    matches = CATALOG_WATCHER.fulltext.search(request.args.get('q', ''), limit)
+    render_records = get_render_records()
+    items = []
+    for item_id, score in matches:
+        record = render_records.get(item_id)
+        if record:
+            items.append({**api_item(record), 'score': round(score, 4)})
+    return jsonify({"q": request.args.get('q', ''), "items": items})
+
+@app.route('/api/suggest')
+def api_suggest():
+    try:
+        limit = min(max(int(request.args.get('limit', 8)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify({"suggestions": current_catalog().search_index().suggest(request.args.get('q', ''), limit)})
+
+@app.route('/api/items/<item_id>/similar')
+def api_similar_items(item_id):
+    if item_id not in current_catalog():
+        return jsonify({"error": "Item not found"}), 404
+    try:
+        limit = min(max(int(request.args.get('limit', 8)), 1), MAX_SIMILAR_ITEMS)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    matches = SIMILAR_ITEMS.similar(item_id, limit)
+    if matches is None:
+        return jsonify({"error": "Similar items are still being indexed"}), 503, {"Retry-After": "5"}
+
+    render_records = get_render_records()
+    items = []
+    for match_id, score in matches:
+        record = render_records.get(match_id)
+        if record:
+            items.append({**api_item(record), 'similarity': round(score, 4)})
+    return jsonify({"id": item_id, "items": items})
+
+@app.route('/api/items/<item_id>/quotes')
+def api_item_quotes(item_id):
+    try:
+        durations = [int(d) for d in request.args.get('durations', '').split(',') if d.strip()] or QUOTE_DURATIONS
+        quotes = current_catalog().quote_durations(item_id, durations)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if quotes is None:
+        return jsonify({"error": "Item not found"}), 404
+    return jsonify({
+        "id": item_id,
+        "pricing_version": current_catalog().pricing_rules.get("version"),
+        "quotes": quotes
+    })
 
 @app.route('/orders')
 def view_orders():
-    orders = session.get('orders', [])
+    orders = SESSION_STORE.list_orders(session.sid)
     orders.sort(key=lambda x: x['timestamp'], reverse=True)
     return render_template('orders.html', orders=orders)
 
 @app.route('/add_to_cart/<item_id>', methods=['GET'])
 def add_to_cart(item_id):
-    item = get_item_by_id(ALL_FURNITURE_ITEMS, item_id)
+    item = get_item_by_id(current_catalog(), item_id)
     if not item:
         return redirect(url_for('index'))
 
@@ -136,35 +431,44 @@ def get_full_cart_details():
     rent_total = 0
     buy_total = 0
     
-    if 'cart' not in session:
-        session['cart'] = {}
+    cart = session.get('cart', {})
+
+    catalog = current_catalog()
+    rent_lines = []
+    for item_id, cart_item_data in cart.items():
+        if not isinstance(cart_item_data, dict) or cart_item_data.get('order_type', 'RENT') != 'RENT':
+            continue
+        duration = int(cart_item_data.get('duration', 12))
+        if not validate_duration(duration, catalog.pricing_rules):
+            duration = cart_item_data['duration'] = 12
+            session.modified = True
+        rent_lines.append((item_id, duration))
+    rent_quotes = dict(zip((item_id for item_id, _ in rent_lines), catalog.quote_many(rent_lines)))
 
-    for item_id in list(session['cart'].keys()):
-        cart_item_data = session['cart'].get(item_id)
+    render_records = get_render_records()
+    for item_id in list(cart.keys()):
+        cart_item_data = cart.get(item_id)
         
         if not isinstance(cart_item_data, dict):
-            del session['cart'][item_id]
+            del cart[item_id]
             session.modified = True
             continue 
 
-        item = get_item_by_id(ALL_FURNITURE_ITEMS, item_id)
-
-        if item:
-            img_url_path = item['image_path'].replace('\\', '/')
-            filename_only = img_url_path.split('/')[-1]
-            image_url = url_for('serve_pictures', filename=filename_only)
+        record = render_records.get(str(item_id))
 
-            monthly_rent = calculate_rent(item['metadata'])
-            buyout_price = calculate_buyout_price(item['metadata'])
+        if record:
+            monthly_rent = record['monthly_rent']
+            buyout_price = record['buyout_price']
             duration = int(cart_item_data.get('duration', 12)) 
             order_type = cart_item_data.get('order_type', 'RENT') 
 
             item_details = {
                 'id': item_id,
-                'series': item['metadata']['series'],
-                'style': item['metadata']['style'],
-                'category': item['metadata'].get('category', 'Furniture'),
-                'image_url': image_url,
+                'series': record['series'],
+                'style': record['style'],
+                'category': record['category'],
+                'image_url': record['image_url'],
+                'thumbnail_url': record.get('thumbnail_url', record['image_url']),
                 'monthly_rent': monthly_rent,
                 'buyout_price': buyout_price,
                 'duration': duration,
@@ -173,9 +477,16 @@ def get_full_cart_details():
             }
 
             if order_type == 'RENT':
-                total_cost = monthly_rent * duration
-                item_details['total_cost'] = total_cost
-                rent_total += total_cost
+                quote = rent_quotes[item_id]
+                item_details.update(
+                    duration=quote['duration'],
+                    monthly_rent=quote['monthly_rent'],
+                    list_monthly_rent=quote['list_monthly_rent'],
+                    discount_rate=quote['discount_rate'],
+                    rent_to_own_credit=quote['rent_to_own_credit'],
+                    total_cost=quote['total_cost']
+                )
+                rent_total += quote['total_cost']
                 rent_items.append(item_details)
             elif order_type == 'BUY':
                 total_cost = buyout_price
@@ -183,7 +494,7 @@ def get_full_cart_details():
                 buy_total += total_cost
                 buy_items.append(item_details)
         else:
-            del session['cart'][item_id] 
+            del cart[item_id] 
             session.modified = True
     
     return {
@@ -201,12 +512,13 @@ def view_cart():
         rent_items=cart_data['rent_items'],
         buy_items=cart_data['buy_items'],
         rent_total=cart_data['rent_total'],
-        buy_total=cart_data['buy_total']
+        buy_total=cart_data['buy_total'],
+        max_rental_months=current_catalog().pricing_rules.get('terms', {}).get('max_months')
     )
 
 @app.route('/api/add_to_cart/<item_id>', methods=['POST'])
 def api_add_to_cart(item_id):
-    item = get_item_by_id(ALL_FURNITURE_ITEMS, item_id)
+    item = get_item_by_id(current_catalog(), item_id)
     if not item:
         return jsonify({"success": False, "error": "Item not found"}), 404
 
@@ -230,7 +542,7 @@ def api_add_to_cart(item_id):
     cart_preview = all_items[:3]
     cart_item_count = len(all_items)
     
-    message = f"Added {item['metadata']['series']} to cart ({'Buyout' if order_type == 'BUY' else 'Rental'})."
+    message = f"Added {item.series} to cart ({'Buyout' if order_type == 'BUY' else 'Rental'})."
 
     return jsonify({
         "success": True,
@@ -251,7 +563,7 @@ def update_cart(item_id):
     elif action == 'update_duration':
         try:
             new_duration = int(request.form.get('duration'))
-            if new_duration > 0:
+            if validate_duration(new_duration, current_catalog().pricing_rules):
                 session['cart'][item_id]['duration'] = new_duration
         except (ValueError, TypeError):
             pass 
@@ -301,10 +613,7 @@ def checkout():
         'type': cart_type
     }
     
-    if 'orders' not in session:
-        session['orders'] = []
-    
-    session['orders'].append(new_order)
+    SESSION_STORE.append_order(session.sid, new_order)
     
     new_session_cart = {}
     for item in items_to_keep:
@@ -329,28 +638,13 @@ def clear_cart():
 
 @app.route('/remove_item/<item_id>')
 def remove_item(item_id):
-    if item_id in session['cart']:
+    if item_id in session.get('cart', {}):
         del session['cart'][item_id]
         session.modified = True
     return redirect(url_for('view_cart'))
 
-@app.route('/analyze_style', methods=['POST'])
-def analyze_style():
-    file1 = request.files.get('image1')
-    file2 = request.files.get('image2')
-    file3 = request.files.get('image3')
-
-    if not file1 or not file2 or not file3:
-        return jsonify({"error": "Missing one or more images"}), 400
-
-    b64_image1 = encode_image(file1)
-    b64_image2 = encode_image(file2)
-    b64_image3 = encode_image(file3)
-    
-    if not all([b64_image1, b64_image2, b64_image3]):
-        return jsonify({"error": "Failed to process images"}), 500
-
-    messages_payload = [
+def build_analyzer_messages(b64_images):
+    return [
         {
             "role": "system",
             "content": AI_SYSTEM_PROMPT
@@ -362,50 +656,203 @@ def analyze_style():
                     "type": "text",
                     "text": "Please analyze these three interior design images and return the JSON object describing my style preferences."
                 },
-                {
-                    "type": "image_url",
-                    "image_url": { "url": f"data:image/jpeg;base64,{b64_image1}" }
-                },
-                {
-                    "type": "image_url",
-                    "image_url": { "url": f"data:image/jpeg;base64,{b64_image2}" }
-                },
-                {
-                    "type": "image_url",
-                    "image_url": { "url": f"data:image/jpeg;base64,{b64_image3}" }
-                }
+                *[
+                    {
+                        "type": "image_url",
+                        "image_url": { "url": f"data:image/jpeg;base64,{b64_image}" }
+                    }
+                    for b64_image in b64_images
+                ]
             ]
         }
     ]
 
+def request_style_analysis(b64_images, cache_key=None):
     try:
         response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages_payload,
+            model=AI_MODEL,
+            messages=build_analyzer_messages(b64_images),
             response_format={"type": "json_object"},
             max_tokens=1024
         )
-        
-        ai_response_content = response.choices[0].message.content
-        ai_json_response = json.loads(ai_response_content)
+    except UpstreamUnavailableError:
+        return dict(AI_FALLBACK_RESPONSE)
+    
+    ai_response_content = response.choices[0].message.content
+    ai_json_response = json.loads(ai_response_content)
+    if cache_key:
+        ANALYSIS_CACHE.set(cache_key, ai_json_response)
+    return ai_json_response
+
+def build_analysis_response(ai_json_response):
+    catalog = current_catalog()
+    matched_styles = catalog.style_taxonomy().resolve_dna(ai_json_response.get("styleDNA"))
+
+    top_style = "Modern"
+    if matched_styles:
+        top_style = matched_styles[0][0]
+    elif ai_json_response.get("styleDNA") and len(ai_json_response["styleDNA"]) > 0:
+        top_style = ai_json_response["styleDNA"][0].get("name", "Modern")
+    
+    recommended_items_data = catalog.recommend(ai_json_response, k=RECOMMENDATION_COUNT)
+    
+    formatted_recommendations = format_recommendations(recommended_items_data, top_style)
 
-        top_style = "Modern"
-        if ai_json_response.get("styleDNA") and len(ai_json_response["styleDNA"]) > 0:
-            top_style = ai_json_response["styleDNA"][0].get("name", "Modern")
-        
-        recommended_items_data = filter_furniture(ALL_FURNITURE_ITEMS, style=top_style)
-        
-        formatted_recommendations = format_recommendations(recommended_items_data, top_style)
+    return {
+        **ai_json_response,
+        "matchedStyles": [{"name": style, "weight": round(weight, 2)} for style, weight in matched_styles],
+        "recommendations": formatted_recommendations
+    }
 
-        final_response = {
-            **ai_json_response,
-            "recommendations": formatted_recommendations
+@app.route('/analyze_style', methods=['POST'])
+def analyze_style():
+    file1 = request.files.get('image1')
+    file2 = request.files.get('image2')
+    file3 = request.files.get('image3')
+
+    if not file1 or not file2 or not file3:
+        return jsonify({"error": "Missing one or more images"}), 400
+
+    try:
+        uploads = spool_images([file1, file2, file3])
+    except UploadTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": f"Failed to process images: {e}"}), 400
+
+    try:
+        cache_key = analysis_cache_key([upload.info['sha256'] for upload in uploads], AI_SYSTEM_PROMPT, AI_MODEL)
+        cached_response = ANALYSIS_CACHE.get(cache_key)
+        if cached_response is None:
+            b64_images = encode_images(uploads)
+    except ValueError as e:
+        return jsonify({"error": f"Failed to process images: {e}"}), 400
+    finally:
+        close_uploads(uploads)
+
+    server_timing = {"Server-Timing": format_server_timing(uploads)}
+    app.logger.info("analyze_style ingest: %s", [upload.info for upload in uploads])
+    if cached_response is not None:
+        return jsonify({"status": "done", **build_analysis_response(cached_response)}), server_timing
+
+    if request.args.get('mode') == 'job':
+        try:
+            job_id = ANALYZER_JOBS.submit(request_style_analysis, b64_images, cache_key)
+        except QueueFullError:
+            return jsonify({"error": "The Style Analyzer is busy, please try again shortly."}), 429, {"Retry-After": "5", **server_timing}
+        return jsonify({
+            "job_id": job_id,
+            "status_url": url_for('analyze_style_status', job_id=job_id)
+        }), 202, server_timing
+
+    try:
+        model_start = time.perf_counter()
+        ai_json_response = request_style_analysis(b64_images, cache_key)
+        server_timing["Server-Timing"] += f", model;dur={(time.perf_counter() - model_start) * 1000:.1f}"
+        return jsonify({"status": "done", **build_analysis_response(ai_json_response)}), server_timing
+
+    except Exception as e:
+        return jsonify({"status": "failed", "error": f"AI analysis failed: {str(e)}"}), 500
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_style_analysis(image_count, b64_images, cache_key, ai_json_response):
+    yield sse_event("accepted", {"images": image_count})
+
+    if ai_json_response is None:
+        try:
+            stream = client.chat.completions.create(
+                model=AI_MODEL,
+                messages=build_analyzer_messages(b64_images),
+                response_format={"type": "json_object"},
+                max_tokens=1024,
+                stream=True
+            )
+            parser = StyleDNAStreamParser()
+            try:
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    for entry in parser.feed(chunk.choices[0].delta.content or ""):
+                        yield sse_event("styleDNA", entry)
+            finally:
+                stream.close()
+            ai_json_response = json.loads(parser.text)
+            ANALYSIS_CACHE.set(cache_key, ai_json_response)
+        except UpstreamUnavailableError:
+            ai_json_response = dict(AI_FALLBACK_RESPONSE)
+            for entry in ai_json_response["styleDNA"]:
+                yield sse_event("styleDNA", entry)
+        except Exception as e:
+            yield sse_event("error", {"error": f"AI analysis failed: {str(e)}"})
+            return
+    else:
+        for entry in ai_json_response.get("styleDNA", []):
+            yield sse_event("styleDNA", entry)
+
+    try:
+        yield sse_event("result", build_analysis_response(ai_json_response))
+    except Exception as e:
+        yield sse_event("error", {"error": f"AI analysis failed: {str(e)}"})
+
+@app.route('/analyze_style/stream', methods=['POST'])
+def analyze_style_stream():
+    image_files = [request.files.get('image1'), request.files.get('image2'), request.files.get('image3')]
+    if not all(image_files):
+        return jsonify({"error": "Missing one or more images"}), 400
+
+    try:
+        uploads = spool_images(image_files)
+    except UploadTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": f"Failed to process images: {e}"}), 400
+
+    b64_images = None
+    try:
+        cache_key = analysis_cache_key([upload.info['sha256'] for upload in uploads], AI_SYSTEM_PROMPT, AI_MODEL)
+        cached_response = ANALYSIS_CACHE.get(cache_key)
+        if cached_response is None:
+            b64_images = encode_images(uploads)
+    except ValueError as e:
+        return jsonify({"error": f"Failed to process images: {e}"}), 400
+    finally:
+        close_uploads(uploads)
+
+    return Response(
+        stream_with_context(stream_style_analysis(len(uploads), b64_images, cache_key, cached_response)),
+        mimetype='text/event-stream',
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Server-Timing": format_server_timing(uploads)
         }
-        
-        return jsonify(final_response)
+    )
+
+@app.route('/analyze_style/<job_id>')
+def analyze_style_status(job_id):
+    job = ANALYZER_JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+
+    if job['status'] == 'failed':
+        return jsonify({"status": "failed", "error": f"AI analysis failed: {job['error']}"}), 500
+    if job['status'] != 'done':
+        return jsonify({"status": job['status']}), 202
 
+    try:
+        return jsonify({"status": "done", **build_analysis_response(job['result'])})
     except Exception as e:
-        return jsonify({"error": f"AI analysis failed: {str(e)}"}), 500
+        return jsonify({"status": "failed", "error": f"AI analysis failed: {str(e)}"}), 500
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"Upload too large; each image may be at most {MAX_UPLOAD_BYTES // (1024 * 1024)} MB."}), 413
+
+@app.route('/api/analyzer_cache')
+def analyzer_cache_stats():
+    return jsonify(ANALYSIS_CACHE.stats())
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
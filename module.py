@@ -1,140 +1,4083 @@
 import os
+import sys
 import json
+import pickle
+import sqlite3
 import random
-from PIL import Image
+import base64
+import io
+import bisect
+import hashlib
+import threading
+import tempfile
+import time
+import concurrent.futures
+import collections
+import secrets
+import types
+import copy
+import re
+import math
+import functools
+import logging
+import mmap
+import numpy as np
+from PIL import Image, ImageOps
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 def load_metadata(folder):
     """
-    Loads JSON metadata files from the specified folder.
-    
-    Args:
-        folder (str): Path to the directory containing JSON files.
+    Loads JSON metadata files from the specified folder.
+    
+    Args:
+        folder (str): Path to the directory containing JSON files.
+        
+    Returns:
+        list: A list of dictionaries containing the loaded metadata.
+    """
+    data_list = []
+    for file in os.listdir(folder):
+        if file.endswith(".json"):
+            with open(os.path.join(folder, file), "r", encoding="utf-8") as f:
+                data = json.load(f)
+                data_list.append(data)
+    return data_list
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+def load_sidecar(path):
+    """Loads a single JSON metadata sidecar."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def list_sidecars(folder):
+    """
+    Lists the JSON sidecars in a folder with their modification times.
+    
+    Args:
+        folder (str): Path to the directory containing JSON files.
+        
+    Returns:
+        dict: Sidecar filename to st_mtime_ns, in directory listing order.
+    """
+    with os.scandir(folder) as entries:
+        return {entry.name: entry.stat().st_mtime_ns for entry in entries if entry.name.endswith(".json")}
+
+def pack_snapshot(manifest, metadata_list):
+    """
+    Packs sidecar metadata into a columnar snapshot.
+    
+    Each metadata field becomes one list, and short strings are interned so
+    repeated categorical values (style, color, ...) are stored once. Missing
+    fields are stored as None and dropped again by unpack_snapshot().
+    
+    Args:
+        manifest (dict): Sidecar filename to st_mtime_ns, in the same order as metadata_list.
+        metadata_list (list): Parsed sidecar dicts.
+        
+    Returns:
+        dict: The snapshot.
+    """
+    fields = {}
+    for data in metadata_list:
+        for field in data:
+            fields.setdefault(field, None)
+
+    columns = {}
+    for field in fields:
+        column = []
+        for data in metadata_list:
+            value = data.get(field)
+            if isinstance(value, str) and len(value) < 100:
+                value = sys.intern(value)
+            column.append(value)
+        columns[field] = column
+
+    return {
+        'format': SNAPSHOT_FORMAT_VERSION,
+        'manifest': manifest,
+        'columns': columns
+    }
+
+def unpack_snapshot(snapshot):
+    """Rebuilds the list of metadata dicts from a snapshot made by pack_snapshot()."""
+    names = list(snapshot['columns'])
+    return [
+        dict(zip(names, row)) if None not in row
+        else {name: value for name, value in zip(names, row) if value is not None}
+        for row in zip(*snapshot['columns'].values())
+    ]
+
+def read_snapshot(snapshot_path):
+    """
+    Reads a catalog snapshot file.
+    
+    Returns:
+        dict: The snapshot, or None if it is missing, unreadable or from another format version.
+    """
+    try:
+        with open(snapshot_path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return snapshot
+
+def write_snapshot(snapshot_path, snapshot):
+    """Writes a catalog snapshot atomically."""
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
+
+def add_timing(timings, phase, seconds):
+    """Accumulates seconds for a load phase into an optional timings dict."""
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+def _parse_sidecar_chunk(folder, filenames):
+    """
+    Reads and parses a chunk of sidecars. Runs in worker processes when loading in parallel.
+    
+    Returns:
+        tuple: (list of parsed dicts, seconds spent reading, seconds spent parsing).
+    """
+    read_seconds = 0.0
+    parse_seconds = 0.0
+    results = []
+    for filename in filenames:
+        start = time.perf_counter()
+        with open(os.path.join(folder, filename), "rb") as f:
+            raw = f.read()
+        parsed = time.perf_counter()
+        results.append(json.loads(raw))
+        read_seconds += parsed - start
+        parse_seconds += time.perf_counter() - parsed
+    return results, read_seconds, parse_seconds
+
+def parse_sidecars(folder, filenames, workers=0, chunk_size=500, timings=None):
+    """
+    Reads and parses many sidecars, optionally fanned out over a process pool.
+    
+    Args:
+        folder (str): Path to the directory containing JSON files.
+        filenames (list): Sidecar filenames to parse.
+        workers (int): Worker processes to use; 0 or 1 parses in this process.
+        chunk_size (int): Sidecars handed to a worker at a time.
+        timings (dict, optional): Receives 'reading' and 'parsing' seconds (summed over workers).
+        
+    Returns:
+        dict: Sidecar filename to parsed metadata, in the order of filenames.
+    """
+    filenames = list(filenames)
+    chunks = [filenames[i:i + chunk_size] for i in range(0, len(filenames), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_parse_sidecar_chunk, [folder] * len(chunks), chunks))
+    else:
+        results = [_parse_sidecar_chunk(folder, chunk) for chunk in chunks]
+
+    parsed = {}
+    for chunk, (data_list, read_seconds, parse_seconds) in zip(chunks, results):
+        parsed.update(zip(chunk, data_list))
+        add_timing(timings, 'reading', read_seconds)
+        add_timing(timings, 'parsing', parse_seconds)
+    return parsed
+
+def row_id_sort_key(data):
+    """Sort key ordering metadata by row_id, numerically where possible."""
+    row_id = data.get('row_id')
+    try:
+        return (0, int(row_id), '')
+    except (TypeError, ValueError):
+        return (1, 0, str(row_id))
+
+def load_metadata_parallel(folder, workers=0, timings=None):
+    """
+    Loads every sidecar, fanned out over a process pool, ordered by row_id.
+    
+    Args:
+        folder (str): Path to the directory containing JSON files.
+        workers (int): Worker processes to use; 0 or 1 parses in this process.
+        timings (dict, optional): Receives per-phase seconds ('listing', 'reading', 'parsing').
+        
+    Returns:
+        list: A list of dictionaries containing the loaded metadata.
+    """
+    start = time.perf_counter()
+    listing = list_sidecars(folder)
+    add_timing(timings, 'listing', time.perf_counter() - start)
+
+    parsed = parse_sidecars(folder, listing, workers, timings=timings)
+    return sorted(parsed.values(), key=row_id_sort_key)
+
+def load_sidecar_table(folder, snapshot_path, workers=0, timings=None):
+    """
+    Loads sidecar metadata through a compiled snapshot file, keeping track of source files.
+    
+    See load_metadata_snapshot().
+    
+    Returns:
+        tuple: (dict of sidecar filename to st_mtime_ns, list of metadata in the same order).
+    """
+    start = time.perf_counter()
+    listing = list_sidecars(folder)
+    add_timing(timings, 'listing', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    snapshot = read_snapshot(snapshot_path)
+    previous_manifest = snapshot['manifest'] if snapshot else {}
+    previous = dict(zip(previous_manifest, unpack_snapshot(snapshot))) if snapshot else {}
+    add_timing(timings, 'snapshot', time.perf_counter() - start)
+
+    stale = [filename for filename, mtime_ns in listing.items() if previous_manifest.get(filename) != mtime_ns]
+    parsed = parse_sidecars(folder, stale, workers, timings=timings)
+    changed = snapshot is None or bool(stale) or len(listing) != len(previous_manifest)
+
+    data_by_file = {
+        filename: parsed[filename] if filename in parsed else previous[filename]
+        for filename in listing
+    }
+    if workers:
+        ordered = sorted(data_by_file, key=lambda filename: row_id_sort_key(data_by_file[filename]))
+        if ordered != list(previous_manifest):
+            changed = True
+        listing = {filename: listing[filename] for filename in ordered}
+        data_by_file = {filename: data_by_file[filename] for filename in ordered}
+
+    data_list = list(data_by_file.values())
+    if changed:
+        start = time.perf_counter()
+        write_snapshot(snapshot_path, pack_snapshot(listing, data_list))
+        add_timing(timings, 'snapshot', time.perf_counter() - start)
+    return listing, data_list
+
+def load_metadata_snapshot(folder, snapshot_path, workers=0, timings=None):
+    """
+    Loads sidecar metadata through a compiled snapshot file.
+    
+    The snapshot is read in one go; only sidecars whose mtime differs from the
+    snapshot manifest (or that are new) are parsed again. The snapshot is
+    rewritten when anything was added, changed or removed. With workers, the
+    stale sidecars are parsed in parallel and the result is ordered by row_id.
+    
+    Args:
+        folder (str): Path to the directory containing JSON files.
+        snapshot_path (str): Path of the snapshot file (created if missing).
+        workers (int): Worker processes for re-parsing; 0 keeps directory listing order.
+        timings (dict, optional): Receives per-phase seconds ('listing', 'snapshot',
+            'reading', 'parsing').
+        
+    Returns:
+        list: A list of dictionaries containing the loaded metadata.
+    """
+    return load_sidecar_table(folder, snapshot_path, workers, timings)[1]
+
+def load_image(file_path):
+    """
+    Opens an image file using PIL.
+    
+    Args:
+        file_path (str): Path to the image file.
+        
+    Returns:
+        Image: A PIL Image object.
+    """
+    return Image.open(file_path)
+
+class UploadTooLargeError(ValueError):
+    """Raised when an uploaded file exceeds the configured size limit."""
+
+def prepare_image_for_upload(stream, max_dimension=1024, quality=85, max_bytes=None):
+    """
+    Decodes an uploaded image, downsizes it and re-encodes it as base64 JPEG.
+    
+    The image is decoded straight from the upload stream (JPEGs are decoded at
+    reduced scale where possible), so the original bytes are never copied
+    into memory as a whole.
+    
+    Args:
+        stream: A seekable binary file object, e.g. FileStorage.stream.
+        max_dimension (int): Longest side of the output image in pixels.
+        quality (int): JPEG quality of the output.
+        max_bytes (int, optional): Reject uploads larger than this before decoding.
+        
+    Returns:
+        str: The base64-encoded JPEG.
+        
+    Raises:
+        UploadTooLargeError: If the upload exceeds max_bytes.
+        ValueError: If the upload is not a readable image.
+    """
+    if max_bytes is not None:
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        if size > max_bytes:
+            raise UploadTooLargeError(f"Image is {size} bytes; the limit is {max_bytes} bytes")
+    stream.seek(0)
+
+    try:
+        with Image.open(stream) as img:
+            img.draft('RGB', (max_dimension, max_dimension))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Not a readable image: {e}") from e
+
+    return base64.b64encode(buffer.getbuffer()).decode('ascii')
+
+ALLOWED_UPLOAD_FORMATS = ('JPEG', 'MPO', 'PNG', 'WEBP', 'GIF', 'BMP', 'TIFF')
+MIN_UPLOAD_DIMENSION = 32
+MAX_UPLOAD_PIXELS = 50_000_000
+
+class InvalidUploadError(ValueError):
+    """Raised when an upload is not an acceptable image."""
+
+class SpooledUpload:
+    """
+    An upload spooled to a temp file and verified as an image, not yet encoded.
+    
+    Attributes:
+        info (dict): 'format', 'width', 'height', 'bytes', 'sha256' (hex digest of the
+            raw upload) and per-phase 'timings' in seconds: 'spool', 'verify' and,
+            once encoded, 'encode'.
+    """
+
+    def __init__(self, file, info):
+        self.file = file
+        self.info = info
+
+    def encode(self, max_dimension=1024, quality=85):
+        """
+        Downsizes the upload and re-encodes it as base64 JPEG for the model.
+        
+        Args:
+            max_dimension (int): Longest side of the prepared image.
+            quality (int): JPEG quality of the prepared image.
+            
+        Returns:
+            str: The base64-encoded JPEG.
+        """
+        start = time.perf_counter()
+        b64_image = prepare_image_for_upload(self.file, max_dimension=max_dimension, quality=quality)
+        self.info['timings']['encode'] = time.perf_counter() - start
+        return b64_image
+
+    def close(self):
+        """Deletes the spooled temp file."""
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def spool_upload(stream, max_bytes, chunk_size=1 << 16):
+    """
+    Spools an upload to a temp file, hashing it on the way, and verifies it is a sane image.
+    
+    The digest of the raw bytes is available before anything is decoded, so
+    callers can look up cached results without paying for encode().
+    
+    Args:
+        stream: A readable binary file object, e.g. FileStorage.stream.
+        max_bytes (int): Reject uploads larger than this while spooling.
+        chunk_size (int): Bytes copied at a time while spooling.
+        
+    Returns:
+        SpooledUpload: The verified upload; close it when done.
+        
+    Raises:
+        UploadTooLargeError: If the upload exceeds max_bytes.
+        InvalidUploadError: If the upload is not an allowed image format or size.
+    """
+    timings = {}
+    spooled = tempfile.TemporaryFile()
+    try:
+        start = time.perf_counter()
+        size = 0
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"Image is larger than the limit of {max_bytes} bytes")
+            digest.update(chunk)
+            spooled.write(chunk)
+        timings['spool'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        spooled.seek(0)
+        try:
+            with Image.open(spooled) as img:
+                image_format, (width, height) = img.format, img.size
+                img.verify()
+        except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+            raise InvalidUploadError("Not a readable image") from e
+        if image_format not in ALLOWED_UPLOAD_FORMATS:
+            raise InvalidUploadError(f"Unsupported image format: {image_format}")
+        if min(width, height) < MIN_UPLOAD_DIMENSION or width * height > MAX_UPLOAD_PIXELS:
+            raise InvalidUploadError(f"Unsupported image dimensions: {width}x{height}")
+        timings['verify'] = time.perf_counter() - start
+    except BaseException:
+        spooled.close()
+        raise
+
+    return SpooledUpload(spooled, {
+        'format': image_format,
+        'width': width,
+        'height': height,
+        'bytes': size,
+        'sha256': digest.hexdigest(),
+        'timings': timings
+    })
+
+def ingest_upload(stream, max_bytes, max_dimension=1024, quality=85, chunk_size=1 << 16):
+    """
+    Spools and verifies an upload (see spool_upload()) and prepares it for the model.
+    
+    Args:
+        stream: A readable binary file object, e.g. FileStorage.stream.
+        max_bytes (int): Reject uploads larger than this while spooling.
+        max_dimension (int): Longest side of the prepared image.
+        quality (int): JPEG quality of the prepared image.
+        chunk_size (int): Bytes copied at a time while spooling.
+        
+    Returns:
+        tuple: (base64 JPEG string, info dict as in SpooledUpload.info).
+        
+    Raises:
+        UploadTooLargeError: If the upload exceeds max_bytes.
+        InvalidUploadError: If the upload is not an allowed image format or size.
+    """
+    with spool_upload(stream, max_bytes, chunk_size=chunk_size) as upload:
+        b64_image = upload.encode(max_dimension=max_dimension, quality=quality)
+    return b64_image, upload.info
+
+def _results_by_position(futures):
+    """Returns the results of finished futures in order, prefixing a ValueError with its 1-based position."""
+    results = []
+    for position, future in enumerate(futures, start=1):
+        try:
+            results.append(future.result())
+        except ValueError as e:
+            raise type(e)(f"Image {position}: {e}") from e
+    return results
+
+def ingest_uploads(streams, executor, **kwargs):
+    """
+    Ingests several uploads in parallel on a shared executor.
+    
+    Args:
+        streams (list): Readable binary file objects.
+        executor (concurrent.futures.Executor): Shared, bounded executor.
+        **kwargs: Passed to ingest_upload().
+        
+    Returns:
+        list: (base64 JPEG string, info dict) per stream, in order.
+        
+    Raises:
+        UploadTooLargeError, InvalidUploadError: For the first upload (in order) that fails;
+            the message is prefixed with its 1-based position.
+    """
+    futures = [executor.submit(ingest_upload, stream, **kwargs) for stream in streams]
+    concurrent.futures.wait(futures)
+    return _results_by_position(futures)
+
+def spool_uploads(streams, executor, **kwargs):
+    """
+    Spools several uploads in parallel on a shared executor (see spool_upload()).
+    
+    Args:
+        streams (list): Readable binary file objects.
+        executor (concurrent.futures.Executor): Shared, bounded executor.
+        **kwargs: Passed to spool_upload().
+        
+    Returns:
+        list: SpooledUpload per stream, in order; close them when done.
+        
+    Raises:
+        UploadTooLargeError, InvalidUploadError: For the first upload (in order) that fails;
+            the message is prefixed with its 1-based position. The others are closed.
+    """
+    futures = [executor.submit(spool_upload, stream, **kwargs) for stream in streams]
+    concurrent.futures.wait(futures)
+    try:
+        return _results_by_position(futures)
+    except BaseException:
+        for future in futures:
+            if future.exception() is None:
+                future.result().close()
+        raise
+
+def encode_uploads(uploads, executor, **kwargs):
+    """
+    Encodes several spooled uploads for the model in parallel on a shared executor.
+    
+    Args:
+        uploads (list): SpooledUpload objects.
+        executor (concurrent.futures.Executor): Shared, bounded executor.
+        **kwargs: Passed to SpooledUpload.encode().
+        
+    Returns:
+        list: Base64 JPEG string per upload, in order.
+        
+    Raises:
+        ValueError: For the first upload (in order) that fails to decode.
+    """
+    futures = [executor.submit(upload.encode, **kwargs) for upload in uploads]
+    concurrent.futures.wait(futures)
+    return _results_by_position(futures)
+
+THUMBNAIL_WIDTHS = (240, 480, 768)
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+def file_content_hash(file_path, chunk_size=1 << 20):
+    """
+    Computes a short SHA-256 content hash of a file without loading it all into memory.
+    
+    Args:
+        file_path (str): Path to the file.
+        chunk_size (int): Bytes read per chunk.
+        
+    Returns:
+        str: The first 16 hex digits of the digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+class ThumbnailCache:
+    """
+    Generates resized WebP/JPEG derivatives of catalog images and caches them on disk.
+
+    Derivatives are named '<content hash>-<width>.<ext>', so a changed source
+    image gets new names and stale derivatives are never served. Content
+    hashes are remembered per (mtime, size) in a manifest inside the cache
+    folder, so restarts do not re-read every source image.
+    """
+
+    MANIFEST_NAME = "hashes.json"
+
+    def __init__(self, source_folder, cache_folder, widths=THUMBNAIL_WIDTHS, quality=80):
+        """
+        Args:
+            source_folder (str): Directory containing the original images.
+            cache_folder (str): Directory where derivatives and the hash manifest are written.
+            widths (tuple): Allowed derivative widths in pixels.
+            quality (int): Encoder quality for WebP and JPEG output.
+        """
+        self.source_folder = source_folder
+        self.cache_folder = cache_folder
+        self.widths = tuple(sorted(widths))
+        self.quality = quality
+        self._hashes = {}
+        self._sources = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        os.makedirs(cache_folder, exist_ok=True)
+        self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.cache_folder, self.MANIFEST_NAME), "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        for filename, (mtime_ns, size, content_hash) in entries.items():
+            self._hashes[filename] = (mtime_ns, size, content_hash)
+
+    def save_manifest(self):
+        """
+        Persists newly computed content hashes, if any.
+        
+        The hashes are copied under a lock and written outside it, so
+        request threads keep hashing while the file is written. Returns at
+        once if nothing changed or another thread is already saving; hashes
+        added meanwhile are written by a later call.
+        """
+        if not self._dirty or not self._save_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                if not self._dirty:
+                    return
+                hashes = dict(self._hashes)
+                self._dirty = False
+            path = os.path.join(self.cache_folder, self.MANIFEST_NAME)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(hashes, f)
+                os.replace(tmp_path, path)
+            except OSError:
+                with self._lock:
+                    self._dirty = True
+                raise
+        finally:
+            self._save_lock.release()
+
+    def content_hash(self, filename):
+        """
+        Returns the content hash of a source image, recomputing it only if the file changed.
+        
+        Raises:
+            FileNotFoundError: If the source image does not exist.
+        """
+        stat = os.stat(os.path.join(self.source_folder, filename))
+        cached = self._hashes.get(filename)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            content_hash = cached[2]
+        else:
+            content_hash = file_content_hash(os.path.join(self.source_folder, filename))
+            with self._lock:
+                self._hashes[filename] = (stat.st_mtime_ns, stat.st_size, content_hash)
+                self._dirty = True
+        self._sources[content_hash] = filename
+        return content_hash
+
+    def fingerprint(self, filename):
+        """Returns the content hash of a source image, or None if it does not exist."""
+        try:
+            return self.content_hash(filename)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def fingerprint_all(self, filenames):
+        """
+        Computes content hashes for many source images up front and persists them.
+        
+        Returns:
+            dict: filename to content hash (None for missing files).
+        """
+        fingerprints = {filename: self.fingerprint(filename) for filename in filenames}
+        self.save_manifest()
+        return fingerprints
+
+    def derivative_names(self, filename, ext):
+        """
+        Lists the derivative names of a source image for one format.
+        
+        Returns:
+            list: (width, derivative name) pairs, smallest width first.
+        """
+        content_hash = self.content_hash(filename)
+        return [(width, f"{content_hash}-{width}.{ext}") for width in self.widths]
+
+    def get(self, name):
+        """
+        Returns the on-disk path of a derivative, generating it on first use.
+        
+        Args:
+            name (str): A derivative name as produced by derivative_names().
+            
+        Returns:
+            str: Path to the derivative, or None if the name is not a known derivative.
+        """
+        stem, _, ext = name.rpartition('.')
+        content_hash, _, width = stem.rpartition('-')
+        if ext not in THUMBNAIL_FORMATS or not width.isdigit() or int(width) not in self.widths:
+            return None
+        filename = self._sources.get(content_hash)
+        if filename is None:
+            return None
+
+        path = os.path.join(self.cache_folder, name)
+        if not os.path.exists(path):
+            self._render(os.path.join(self.source_folder, filename), path, int(width), THUMBNAIL_FORMATS[ext])
+        return path
+
+    def _render(self, source_path, path, width, image_format):
+        with load_image(source_path) as img:
+            if img.width > width:
+                height = max(round(img.height * width / img.width), 1)
+                img = img.resize((width, height), Image.LANCZOS)
+            if img.mode not in ('RGB', 'RGBA') or (image_format == 'JPEG' and img.mode != 'RGB'):
+                img = img.convert('RGB')
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, format=image_format, quality=self.quality)
+        os.replace(tmp_path, path)
+
+def get_all_items(folder, snapshot_path=None, workers=0, timings=None):
+    """
+    Aggregates all furniture items (images and metadata) from the folder.
+    
+    Args:
+        folder (str): Directory containing the assets.
+        snapshot_path (str, optional): Compiled snapshot to load from and keep up to date.
+            Without it every sidecar is parsed.
+        workers (int): Worker processes for parsing sidecars. Items are then ordered by row_id.
+        timings (dict, optional): Receives per-phase load seconds.
+        
+    Returns:
+        list: FurnitureItems. Their cold fields stay in memory, since the
+            loaders do not report which sidecar each item came from.
+    """
+    items = []
+    if snapshot_path:
+        metadata_list = load_metadata_snapshot(folder, snapshot_path, workers, timings)
+    elif workers or timings is not None:
+        metadata_list = load_metadata_parallel(folder, workers, timings)
+    else:
+        metadata_list = load_metadata(folder)
+    for data in metadata_list:
+        items.append(make_item(data))
+    return items
+
+ITEM_FIELDS = ('category', 'series', 'style', 'material', 'color', 'attributes', 'location', 'season')
+HOT_FIELDS = frozenset(ITEM_FIELDS + ('row_id', 'image_file'))
+
+class FurnitureItem:
+    """
+    A catalog item: row_id, image path and the categorical sidecar fields.
+
+    Fields live in __slots__ and categorical strings are interned, so items
+    sharing a style or color share one string instead of each holding a
+    parsed copy. The remaining sidecar fields (the long generation prompt,
+    model, size, json_file) are cold: they are re-read from the sidecar
+    when asked for rather than kept in every worker. Items made without a
+    sidecar path keep their cold fields in memory.
+
+    get() mirrors dict.get() over every sidecar field, so an item can be
+    passed wherever sidecar metadata is expected (calculate_rent(), item_terms()).
+    """
+
+    __slots__ = ('id', 'row_id', 'image_path', 'source', '_cold') + ITEM_FIELDS
+
+    def __init__(self, data, source=None):
+        """
+        Args:
+            data (dict): Parsed sidecar metadata.
+            source (str, optional): Path of the sidecar, used to load cold fields on demand.
+        """
+        self.row_id = data.get('row_id')
+        self.id = str(self.row_id)
+        self.image_path = data.get('image_file')
+        for field in ITEM_FIELDS:
+            value = data.get(field)
+            setattr(self, field, sys.intern(value) if isinstance(value, str) else value)
+        self.source = source
+        self._cold = None if source else {key: value for key, value in data.items() if key not in HOT_FIELDS}
+
+    def __repr__(self):
+        return f"{type(self).__name__}(row_id={self.row_id!r}, series={self.series!r})"
+
+    def cold_fields(self):
+        """
+        Returns the sidecar fields not kept on the item, reading the sidecar if needed.
+        
+        The result is not cached. A sidecar that is gone or unreadable (e.g.
+        mid-update, before the watcher replaces the item) yields {}.
+        """
+        if self._cold is not None:
+            return self._cold
+        try:
+            data = load_sidecar(self.source)
+        except (OSError, ValueError):
+            return {}
+        return {key: value for key, value in data.items() if key not in HOT_FIELDS}
+
+    def get(self, field, default=None):
+        """Returns a sidecar field like dict.get(); cold fields are loaded on demand."""
+        if field == 'image_file':
+            value = self.image_path
+        elif field in HOT_FIELDS:
+            value = getattr(self, field)
+        else:
+            return self.cold_fields().get(field, default)
+        return default if value is None else value
+
+CATALOG_TABLE_MAGIC = b"MODOYA-TABLE-01\n"
+CATALOG_TABLE_ALIGNMENT = 64
+CATALOG_TABLE_STRINGS = ('image_path', 'filename')
+
+def _string_column(values):
+    """Encodes strings as (int64 offsets, utf-8 bytes); None is stored as ''."""
+    encoded = [(value or '').encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+def write_catalog_table(path, folder, rows):
+    """
+    Writes catalog rows as a memory-mappable column file, atomically.
+    
+    Categorical fields are stored as int32 codes into a per-field vocabulary,
+    strings as offsets into one UTF-8 blob, and row_ids as int64 when they
+    are all integers. The header (vocabularies and array locations) is
+    pickled at the end of the file; the arrays before it are 64-byte
+    aligned so CatalogTable can view them in place.
+    
+    Args:
+        path (str): Destination file.
+        folder (str): Sidecar folder, recorded so readers can load cold fields.
+        rows (list): (sidecar filename, st_mtime_ns, item) triples in catalog order.
+    """
+    arrays = {}
+    vocabularies = {}
+    for field in ITEM_FIELDS:
+        codes = {}
+        arrays[field] = np.array([codes.setdefault(getattr(item, field), len(codes)) for _, _, item in rows], dtype=np.int32)
+        vocabularies[field] = list(codes)
+    row_ids = [item.row_id for _, _, item in rows]
+    integer_ids = all(type(row_id) is int for row_id in row_ids)
+    if integer_ids:
+        arrays['row_id'] = np.array(row_ids, dtype=np.int64)
+    else:
+        arrays['row_id.offsets'], arrays['row_id.bytes'] = _string_column(str(row_id) for row_id in row_ids)
+    arrays['image_path.offsets'], arrays['image_path.bytes'] = _string_column(item.image_path for _, _, item in rows)
+    arrays['filename.offsets'], arrays['filename.bytes'] = _string_column(filename for filename, _, _ in rows)
+    arrays['mtime_ns'] = np.array([mtime_ns for _, mtime_ns, _ in rows], dtype=np.int64)
+
+    header = {
+        'version': time.time_ns(),
+        'count': len(rows),
+        'folder': folder,
+        'integer_ids': integer_ids,
+        'vocabularies': vocabularies,
+        'arrays': {}
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CATALOG_TABLE_MAGIC)
+        for name, array in arrays.items():
+            f.write(b"\0" * (-f.tell() % CATALOG_TABLE_ALIGNMENT))
+            header['arrays'][name] = (array.dtype.str, f.tell(), len(array))
+            f.write(array.tobytes())
+        header_offset = f.tell()
+        f.write(pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL))
+        f.write(header_offset.to_bytes(8, 'little'))
+    os.replace(tmp_path, path)
+
+class CatalogTable:
+    """
+    A catalog table file (see write_catalog_table()) mapped read-only.
+
+    The columns are NumPy views straight into the mapping, so every process
+    that opens the same file shares one copy of it in the page cache and
+    opening it parses nothing but the small header. A replaced file is a
+    new inode: processes still holding the old table keep reading the old
+    contents until they let go of it.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): A file written by write_catalog_table().
+            
+        Raises:
+            ValueError: If the file is not a catalog table.
+        """
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(CATALOG_TABLE_MAGIC)] != CATALOG_TABLE_MAGIC:
+            raise ValueError(f"Not a catalog table: {path}")
+        try:
+            header_offset = int.from_bytes(self._map[-8:], 'little')
+            header = pickle.loads(self._map[header_offset:-8])
+        except (pickle.UnpicklingError, EOFError, IndexError) as e:
+            raise ValueError(f"Corrupt catalog table: {path}") from e
+        self.version = header['version']
+        self.count = header['count']
+        self.folder = header['folder']
+        self.integer_ids = header['integer_ids']
+        self.vocabularies = header['vocabularies']
+        self.columns = {
+            name: np.frombuffer(self._map, dtype=np.dtype(dtype), count=count, offset=offset)
+            for name, (dtype, offset, count) in header['arrays'].items()
+        }
+        self._blob_offsets = {
+            name[:-len('.bytes')]: offset for name, (_, offset, _) in header['arrays'].items() if name.endswith('.bytes')
+        }
+
+    def __len__(self):
+        return self.count
+
+    def string(self, column, row):
+        """Decodes one value of a string column ('' was stored for None)."""
+        offsets = self.columns[f"{column}.offsets"]
+        base = self._blob_offsets[column]
+        return self._map[base + int(offsets[row]):base + int(offsets[row + 1])].decode('utf-8')
+
+    def value(self, field, row):
+        """Returns one categorical value (an ITEM_FIELDS entry) of a row."""
+        return self.vocabularies[field][self.columns[field][row]]
+
+    def row_id(self, row):
+        """Returns a row's row_id as stored in its sidecar (int or str)."""
+        if self.integer_ids:
+            return int(self.columns['row_id'][row])
+        return self.string('row_id', row)
+
+    def manifest(self):
+        """Returns the sidecar filename to st_mtime_ns mapping the table was written from, in row order."""
+        return {self.string('filename', row): int(mtime_ns) for row, mtime_ns in enumerate(self.columns['mtime_ns'])}
+
+def _table_field(field):
+    return property(lambda item: item._ref[0].value(field, item._ref[1]))
+
+class TableItem:
+    """
+    A FurnitureItem view of one CatalogTable row.
+
+    The item holds only (table, row); fields are decoded from the shared
+    mapping when read, and categorical values come from the table's
+    vocabulary, so they are shared too. `_ref` is replaced as a whole when
+    a newer table has the same row, so concurrent readers never see a
+    table paired with another table's row number.
+    """
+
+    __slots__ = ('_ref',)
+    _cold = None
+
+    def __init__(self, table, row):
+        self._ref = (table, row)
+
+    @property
+    def row_id(self):
+        return self._ref[0].row_id(self._ref[1])
+
+    @property
+    def id(self):
+        return str(self.row_id)
+
+    @property
+    def image_path(self):
+        return self._ref[0].string('image_path', self._ref[1]) or None
+
+    @property
+    def source(self):
+        table, row = self._ref
+        return os.path.join(table.folder, table.string('filename', row))
+
+    category = _table_field('category')
+    series = _table_field('series')
+    style = _table_field('style')
+    material = _table_field('material')
+    color = _table_field('color')
+    attributes = _table_field('attributes')
+    location = _table_field('location')
+    season = _table_field('season')
+
+    __repr__ = FurnitureItem.__repr__
+    cold_fields = FurnitureItem.cold_fields
+    get = FurnitureItem.get
+
+def make_item(data, source=None):
+    """Wraps sidecar metadata into a FurnitureItem (see FurnitureItem for source)."""
+    return FurnitureItem(data, source)
+
+def image_filename(item):
+    """Returns the bare image filename of an item, normalizing Windows-style paths."""
+    return item.image_path.replace('\\', '/').split('/')[-1]
+
+def build_render_record(item, image_url, prices=None):
+    """
+    Builds the render-ready view of an item used by the templates and JSON responses.
+    
+    Args:
+        item (FurnitureItem): A furniture item.
+        image_url (str): Public URL of the item's image.
+        prices (tuple, optional): Precomputed (monthly_rent, buyout_price), e.g. from a PricingEngine.
+        
+    Returns:
+        dict: id, series, style, category, image_url, monthly_rent and buyout_price.
+    """
+    if prices is None:
+        prices = (calculate_rent(item), calculate_buyout_price(item))
+    return {
+        'id': item.row_id,
+        'series': item.series,
+        'style': item.style,
+        'category': item.get('category', 'Furniture'),
+        'image_url': image_url,
+        'monthly_rent': prices[0],
+        'buyout_price': prices[1]
+    }
+
+FACETS = ('category', 'style', 'color', 'season', 'material')
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+class Catalog:
+    """
+    In-memory furniture catalog keyed by row_id with an inverted index per facet.
+
+    Items are FurnitureItems, as returned by get_all_items(), so iterating a
+    Catalog behaves like iterating the original list.
+    """
+
+    def __init__(self, items=None):
+        """
+        Args:
+            items (list, optional): Furniture items as returned by get_all_items().
+        """
+        self.items_by_id = {}
+        self.indexes = {facet: {} for facet in FACETS}
+        self._position = {}
+        self._next_position = 0
+        self.version = 0
+        self._render_records = None
+        self._render_dirty = set()
+        self._render_lock = threading.Lock()
+        self._ordered_ids = []
+        self._ordered_positions = []
+        self._ordered_version = None
+        self.pricing_rules = PRICING_RULES
+        self._pricing = None
+        self._pricing_version = None
+        self._quotes = {}
+        self._recommender = None
+        self._recommender_version = None
+        self._recommender_lock = threading.Lock()
+        self._taxonomy = None
+        self._taxonomy_version = None
+        self._search_index = None
+        self._search_index_version = None
+        self._search_index_lock = threading.Lock()
+        for item in items or []:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.items_by_id)
+
+    def __iter__(self):
+        return iter(self.items_by_id.values())
+
+    def __contains__(self, item_id):
+        return str(item_id) in self.items_by_id
+
+    def add(self, item):
+        """
+        Adds an item (or replaces the item with the same row_id) and updates the facet indexes.
+        
+        Args:
+            item (FurnitureItem): The item to add.
+        """
+        item_id = item.id
+        if item_id in self.items_by_id:
+            self._unindex(item_id, self.items_by_id[item_id])
+        else:
+            self._position[item_id] = self._next_position
+            self._next_position += 1
+        self.items_by_id[item_id] = item
+        self.version += 1
+        self._render_dirty.add(item_id)
+        self._quotes.pop(item_id, None)
+        for facet in FACETS:
+            value = getattr(item, facet)
+            if value:
+                self.indexes[facet].setdefault(str(value).lower(), set()).add(item_id)
+
+    def remove(self, item_id):
+        """
+        Removes an item by row_id.
+        
+        Returns:
+            FurnitureItem: The removed item, or None if it was not in the catalog.
+        """
+        item_id = str(item_id)
+        item = self.items_by_id.pop(item_id, None)
+        if item is not None:
+            self._unindex(item_id, item)
+            del self._position[item_id]
+            self.version += 1
+            self._render_dirty.discard(item_id)
+            self._quotes.pop(item_id, None)
+            if self._render_records is not None:
+                self._render_records.pop(item_id, None)
+        return item
+
+    def copy(self):
+        """
+        Returns an independent copy that can be modified while this catalog keeps serving reads.
+        
+        Cached render records are carried over, so only items changed on the
+        copy have to be rebuilt.
+        """
+        clone = Catalog()
+        clone.items_by_id = dict(self.items_by_id)
+        clone.indexes = {
+            facet: {value: set(ids) for value, ids in index.items()}
+            for facet, index in self.indexes.items()
+        }
+        clone._position = dict(self._position)
+        clone._next_position = self._next_position
+        clone.version = self.version
+        clone.pricing_rules = self.pricing_rules
+        clone._pricing = self._pricing
+        clone._pricing_version = self._pricing_version
+        clone._quotes = {item_id: dict(quotes) for item_id, quotes in self._quotes.items()}
+        clone._recommender = self._recommender
+        clone._recommender_version = self._recommender_version
+        with self._render_lock:
+            if self._render_records is not None:
+                clone._render_records = dict(self._render_records)
+            clone._render_dirty = set(self._render_dirty)
+        return clone
+
+    def _unindex(self, item_id, item):
+        for facet in FACETS:
+            value = getattr(item, facet)
+            if not value:
+                continue
+            key = str(value).lower()
+            ids = self.indexes[facet].get(key)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self.indexes[facet][key]
+
+    def get(self, item_id):
+        """Retrieves a single item by its row_id in O(1), or None."""
+        return self.items_by_id.get(str(item_id))
+
+    def pricing(self):
+        """Returns a PricingEngine over the whole catalog under its current rules, cached per version."""
+        if self._pricing_version != self.version:
+            self._pricing = PricingEngine(self, self.pricing_rules)
+            self._pricing_version = self.version
+        return self._pricing
+
+    def recommender(self):
+        """
+        Returns the StyleRecommender for the catalog, rebuilt when the catalog changes.
+        
+        A rebuild reuses the term counts of unchanged items from the previous
+        index. CatalogWatcher builds it before publishing a catalog, so
+        requests find it ready.
+        """
+        with self._recommender_lock:
+            if self._recommender_version != self.version:
+                self._recommender = StyleRecommender(self, previous=self._recommender)
+                self._recommender_version = self.version
+            return self._recommender
+
+    def search_index(self):
+        """
+        Returns the SearchIndex of the catalog, rebuilt when the catalog changes.
+        
+        CatalogWatcher builds it before publishing a catalog, so requests find it ready.
+        """
+        with self._search_index_lock:
+            if self._search_index_version != self.version:
+                self._search_index = SearchIndex(self)
+                self._search_index_version = self.version
+            return self._search_index
+
+    def style_taxonomy(self):
+        """Returns the StyleTaxonomy of the catalog's styles, rebuilt when the catalog changes."""
+        if self._taxonomy_version != self.version:
+            self._taxonomy = StyleTaxonomy(get_available_options(self)['style'])
+            self._taxonomy_version = self.version
+        return self._taxonomy
+
+    def recommend(self, ai_json, k=4):
+        """
+        Picks catalog items for a Style Analyzer response.
+        
+        The styleDNA entries are resolved to catalog styles and the k slots are
+        shared between them by weight; within each style, items are ranked by
+        similarity to the whole response. Slots left over (e.g. when no style
+        resolves) are filled from the unrestricted ranking and then in catalog
+        order, so a non-empty catalog always yields recommendations.
+        
+        Args:
+            ai_json (dict): The analyzer response (styleDNA, keyElements, designRecommendations).
+            k (int): Number of items to return.
+            
+        Returns:
+            list: Up to k furniture items.
+        """
+        styles = self.style_taxonomy().resolve_dna(ai_json.get("styleDNA"))
+        if styles:
+            ai_json = {**ai_json, "styleDNA": [{"name": style, "percentage": weight} for style, weight in styles]}
+        query = analysis_terms(ai_json)
+        recommender = self.recommender()
+
+        chosen = []
+        for style, slots in allocate_slots(styles, k):
+            candidates = [item_id for item_id in self.matching_ids(style=style) if item_id not in chosen]
+            ranked = [item_id for item_id, _ in recommender.rank(query, slots, candidates)]
+            chosen.extend(ranked or candidates[:slots])
+
+        if len(chosen) < k:
+            for item_id, _ in recommender.rank(query, k + len(chosen)):
+                if len(chosen) < k and item_id not in chosen:
+                    chosen.append(item_id)
+        if len(chosen) < k:
+            for item_id in self._ordered()[0]:
+                if len(chosen) >= k:
+                    break
+                if item_id not in chosen:
+                    chosen.append(item_id)
+        return [self.items_by_id[item_id] for item_id in chosen]
+
+    def set_pricing_rules(self, rules):
+        """
+        Switches the catalog to new pricing rules.
+        
+        The whole catalog is repriced from its cached factorized codes, and
+        only items whose rent or buyout price actually changed have their
+        render records rebuilt.
+        
+        Args:
+            rules (dict): Pricing rules in the shape of PRICING_RULES.
+            
+        Returns:
+            list: row_ids (str) whose prices changed.
+        """
+        current = self.pricing()
+        repriced = current.with_rules(rules)
+        changed = current.changed_ids(repriced)
+        self.pricing_rules = rules
+        self._pricing = repriced
+        self._quotes = {}
+        with self._render_lock:
+            self._render_dirty.update(changed)
+        return changed
+
+    def quote_many(self, requests):
+        """
+        Quotes rentals for many (row_id, duration) pairs, e.g. a whole cart.
+        
+        Quotes are memoized by (row_id, duration, pricing rules version); all
+        pairs missing from the memo are priced and quoted together in one
+        vectorized pass.
+        
+        Args:
+            requests (list): (row_id, duration) pairs.
+            
+        Returns:
+            list: A quote dict (see quote_terms()) per pair, or None for unknown row_ids.
+            
+        Raises:
+            ValueError: If a duration is outside the rental terms.
+        """
+        rules_version = self.pricing_rules.get("version")
+        quotes = [None] * len(requests)
+        misses = {}
+        for i, (item_id, duration) in enumerate(requests):
+            item_id, duration = str(item_id), int(duration)
+            if not validate_duration(duration, self.pricing_rules):
+                raise ValueError(f"Unsupported rental duration: {duration} months")
+            if item_id not in self.items_by_id:
+                continue
+            quote = self._quotes.get(item_id, {}).get((duration, rules_version))
+            if quote is None:
+                misses.setdefault((item_id, duration), []).append(i)
+            else:
+                quotes[i] = quote
+
+        if misses:
+            pricing = PricingEngine(
+                (self.items_by_id[item_id] for item_id in {item_id for item_id, _ in misses}), self.pricing_rules
+            )
+            prices = [pricing.price(item_id) for item_id, _ in misses]
+            computed = quote_terms(
+                [rent for rent, _ in prices], [buyout for _, buyout in prices],
+                [duration for _, duration in misses], self.pricing_rules
+            )
+            for ((item_id, duration), positions), quote in zip(misses.items(), computed):
+                self._quotes.setdefault(item_id, {})[(duration, rules_version)] = quote
+                for i in positions:
+                    quotes[i] = quote
+        return quotes
+
+    def quote_durations(self, item_id, durations=None):
+        """
+        Quotes one item over several terms, e.g. for a "compare 3/6/12/24 months" table.
+        
+        Args:
+            item_id (str|int): The item's row_id.
+            durations (list, optional): Terms in months; defaults to QUOTE_DURATIONS.
+            
+        Returns:
+            list: A quote dict per duration, or None if the item is unknown.
+        """
+        if str(item_id) not in self.items_by_id:
+            return None
+        return self.quote_many([(item_id, duration) for duration in durations or QUOTE_DURATIONS])
+
+    def render_records(self, image_url_builder, image_variants_builder=None):
+        """
+        Returns render-ready records for every item.
+        
+        Records are built on first use and afterwards only rebuilt for items
+        added or replaced since, so they are reused across requests. The
+        items being (re)built are priced together by a PricingEngine.
+        
+        Args:
+            image_url_builder (callable): Maps an image filename to its public URL.
+            image_variants_builder (callable, optional): Maps an image filename to a dict of
+                extra image fields (e.g. thumbnail URLs) merged into each record.
+            
+        Returns:
+            dict: row_id (str) to record, in catalog order.
+        """
+        with self._render_lock:
+            if self._render_records is None:
+                self._render_records = {}
+                dirty = list(self.items_by_id)
+            else:
+                dirty = sorted(self._render_dirty, key=self._position.__getitem__)
+            pricing = PricingEngine((self.items_by_id[item_id] for item_id in dirty), self.pricing_rules)
+            for item_id in dirty:
+                item = self.items_by_id[item_id]
+                filename = image_filename(item)
+                record = build_render_record(item, image_url_builder(filename), pricing.price(item_id))
+                if image_variants_builder is not None:
+                    record.update(image_variants_builder(filename))
+                self._render_records[item_id] = record
+            self._render_dirty.clear()
+            return self._render_records
+
+    def _ordered(self):
+        """Returns (ids, positions) for the whole catalog in order, cached per version."""
+        if self._ordered_version != self.version:
+            self._ordered_ids = list(self.items_by_id)
+            self._ordered_positions = [self._position[item_id] for item_id in self._ordered_ids]
+            self._ordered_version = self.version
+        return self._ordered_ids, self._ordered_positions
+
+    def matching_ids(self, **criteria):
+        """
+        Resolves facet criteria (case-insensitive) to row_ids using set intersections.
+        
+        Args:
+            **criteria: Facet name to value, e.g. style='Wabi-Sabi'. Empty values are ignored.
+            
+        Returns:
+            list: Matching row_ids (str) in catalog order.
+        """
+        id_sets = []
+        for facet, value in criteria.items():
+            if not value:
+                continue
+            if facet not in self.indexes:
+                raise ValueError(f"Unknown facet: {facet}")
+            ids = self.indexes[facet].get(str(value).lower())
+            if not ids:
+                return []
+            id_sets.append(ids)
+
+        if not id_sets:
+            return self._ordered()[0]
+
+        id_sets.sort(key=len)
+        matched = id_sets[0].intersection(*id_sets[1:])
+        return sorted(matched, key=self._position.__getitem__)
+
+    def filter(self, **criteria):
+        """
+        Filters items by facet values (case-insensitive) using set intersections.
+        
+        Args:
+            **criteria: Facet name to value, e.g. style='Wabi-Sabi'. Empty values are ignored.
+            
+        Returns:
+            list: Matching items in catalog order.
+        """
+        return [self.items_by_id[item_id] for item_id in self.matching_ids(**criteria)]
+
+    def page(self, cursor=None, limit=DEFAULT_PAGE_SIZE, offset=0, **criteria):
+        """
+        Returns one page of matching row_ids.
+        
+        Cursors point just past the last item returned, so they stay valid when
+        items are added or removed between requests.
+        
+        Args:
+            cursor (str, optional): Cursor returned by a previous call. Takes precedence over offset.
+            limit (int): Page size, capped at MAX_PAGE_SIZE.
+            offset (int): Number of matching items to skip when no cursor is given.
+            **criteria: Facet filters, as in filter().
+            
+        Returns:
+            dict: 'ids' for this page, 'next_cursor' (None on the last page) and 'total' matches.
+            
+        Raises:
+            ValueError: If the cursor is malformed or the limit/offset is out of range.
+        """
+        limit = int(limit)
+        offset = int(offset)
+        if limit < 1 or offset < 0:
+            raise ValueError("limit must be positive and offset non-negative")
+        limit = min(limit, MAX_PAGE_SIZE)
+
+        ids = self.matching_ids(**criteria)
+        if cursor:
+            if ids is self._ordered_ids:
+                positions = self._ordered_positions
+            else:
+                positions = [self._position[item_id] for item_id in ids]
+            offset = bisect.bisect_right(positions, decode_cursor(cursor))
+
+        page_ids = ids[offset:offset + limit]
+        next_cursor = None
+        if offset + limit < len(ids):
+            next_cursor = encode_cursor(self._position[page_ids[-1]])
+        return {'ids': page_ids, 'next_cursor': next_cursor, 'total': len(ids)}
+
+def encode_cursor(position):
+    """Encodes a catalog position as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(f"p{position}".encode('ascii')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_cursor.
+    
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not raw.startswith('p') or not raw[1:].isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return int(raw[1:])
+
+SEARCH_FACETS = FACETS + ('location',)
+SEARCH_TEXT_FIELDS = ('series', 'attributes')
+
+def bitset(positions, size):
+    """Packs catalog positions into a Python int with one bit per position."""
+    mask = np.zeros(size, dtype=bool)
+    mask[positions] = True
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+class SearchIndex:
+    """
+    Bitset indexes for faceted search over a catalog snapshot.
+
+    Every facet value and every token of SEARCH_TEXT_FIELDS maps to an int
+    with one bit per catalog position, so filters are ANDs/ORs of ints and
+    facet counts are popcounts. Results and counts are cached per query in
+    an LRU ResultCache; build a new index when the catalog changes (see
+    Catalog.search_index()).
+    """
+
+    MAX_PREFIX_EXPANSIONS = 64
+    PREFIX_SCAN_LIMIT = 512
+
+    def __init__(self, catalog, query_cache_size=1024):
+        """
+        Args:
+            catalog (Catalog): The catalog to index.
+            query_cache_size (int): Queries kept in the LRU cache.
+        """
+        self.size = catalog._next_position
+        self.ids_at = [None] * self.size
+        value_positions = {facet: {} for facet in SEARCH_FACETS}
+        self.labels = {facet: {} for facet in SEARCH_FACETS}
+        token_positions = {}
+        for item_id, item in catalog.items_by_id.items():
+            position = catalog._position[item_id]
+            self.ids_at[position] = item_id
+            for facet in SEARCH_FACETS:
+                value = getattr(item, facet)
+                if value:
+                    key = str(value).lower()
+                    value_positions[facet].setdefault(key, []).append(position)
+                    self.labels[facet].setdefault(key, str(value))
+            for field in SEARCH_TEXT_FIELDS:
+                for token in tokenize(getattr(item, field) or ''):
+                    token_positions.setdefault(token, []).append(position)
+
+        self.all = bitset([catalog._position[item_id] for item_id in catalog.items_by_id], self.size)
+        self.facets = {
+            facet: {key: bitset(positions, self.size) for key, positions in values.items()}
+            for facet, values in value_positions.items()
+        }
+        self.tokens = {token: bitset(positions, self.size) for token, positions in token_positions.items()}
+        self.token_counts = {token: len(positions) for token, positions in token_positions.items()}
+        self.vocabulary = sorted(self.tokens)
+        self.cache = ResultCache(max_entries=query_cache_size, ttl=math.inf)
+
+    def text_bits(self, text):
+        """
+        Matches free text against SEARCH_TEXT_FIELDS.
+        
+        Every query token must match; a token matches any indexed token it is
+        a prefix of, so partially typed words already narrow the results.
+        A short prefix is expanded to its MAX_PREFIX_EXPANSIONS most frequent
+        completions (among the first PREFIX_SCAN_LIMIT in sorted order), plus
+        the token itself, so a one-letter query costs a bounded number of ORs.
+        
+        Returns:
+            int: Bitset of matching positions.
+        """
+        bits = self.all
+        for token in tokenize(text or ''):
+            start = bisect.bisect_left(self.vocabulary, token)
+            candidates = []
+            for candidate in self.vocabulary[start:start + self.PREFIX_SCAN_LIMIT]:
+                if not candidate.startswith(token):
+                    break
+                candidates.append(candidate)
+            if len(candidates) > self.MAX_PREFIX_EXPANSIONS:
+                candidates.sort(key=lambda candidate: (-self.token_counts[candidate], candidate))
+                candidates = candidates[:self.MAX_PREFIX_EXPANSIONS]
+                if token in self.tokens and token not in candidates:
+                    candidates.append(token)
+            matched = 0
+            for candidate in candidates:
+                matched |= self.tokens[candidate]
+            bits &= matched
+        return bits
+
+    def suggest(self, text, limit=8):
+        """
+        Completes the last word of a search box query from SEARCH_TEXT_FIELDS.
+        
+        Completions are ranked by how many items the completed query matches
+        and completions matching nothing are dropped, so every suggestion is
+        a query search() returns results for.
+        
+        Returns:
+            list: Full query strings, most matches first.
+        """
+        tokens = tokenize(text or '')
+        if not tokens:
+            return []
+        key = json.dumps(['suggest', tokens, limit])
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        head = ' '.join(tokens[:-1])
+        scope = self.text_bits(head)
+        start = bisect.bisect_left(self.vocabulary, tokens[-1])
+        ranked = []
+        for word in self.vocabulary[start:start + self.PREFIX_SCAN_LIMIT]:
+            if not word.startswith(tokens[-1]):
+                break
+            count = (self.tokens[word] & scope).bit_count()
+            if count:
+                ranked.append((-count, word))
+        ranked.sort()
+        suggestions = [f"{head} {word}" if head else word for _, word in ranked[:limit]]
+        self.cache.set(key, suggestions)
+        return suggestions
+
+    def search(self, filters=None, text=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Runs a faceted query.
+        
+        Values within one facet are ORed, facets are ANDed. Each facet's
+        counts apply every other active filter but not its own, so they show
+        what selecting another value of that facet would return.
+        
+        Args:
+            filters (dict, optional): Facet name to a list of values (case-insensitive).
+            text (str, optional): Free text over SEARCH_TEXT_FIELDS.
+            cursor (str, optional): Cursor returned by a previous call.
+            limit (int): Page size, capped at MAX_PAGE_SIZE.
+            
+        Returns:
+            dict: 'ids' for this page, 'next_cursor', 'total' matches and
+                'facets' (facet to {value: count}).
+            
+        Raises:
+            ValueError: For an unknown facet, a malformed cursor or a limit out of range.
+        """
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        limit = min(limit, MAX_PAGE_SIZE)
+        selected = {}
+        for facet, values in (filters or {}).items():
+            if facet not in self.facets:
+                raise ValueError(f"Unknown facet: {facet}")
+            values = sorted({str(value).lower() for value in values if value})
+            if values:
+                selected[facet] = values
+        text = ' '.join(tokenize(text or ''))
+        start = decode_cursor(cursor) + 1 if cursor else 0
+
+        key = json.dumps([selected, text, start, limit])
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        masks = {}
+        for facet, values in selected.items():
+            mask = 0
+            for value in values:
+                mask |= self.facets[facet].get(value, 0)
+            masks[facet] = mask
+        base = self.text_bits(text)
+        matches = base
+        for mask in masks.values():
+            matches &= mask
+
+        counts = {}
+        for facet, index in self.facets.items():
+            scope = base
+            for other, mask in masks.items():
+                if other != facet:
+                    scope &= mask
+            counts[facet] = {}
+            for value, bits in index.items():
+                count = (bits & scope).bit_count()
+                if count or value in selected.get(facet, ()):
+                    counts[facet][self.labels[facet][value]] = count
+
+        remaining = matches >> start
+        page_ids = []
+        position = start - 1
+        while remaining and len(page_ids) < limit:
+            skip = (remaining & -remaining).bit_length()
+            remaining >>= skip
+            position += skip
+            page_ids.append(self.ids_at[position])
+
+        result = {
+            'ids': page_ids,
+            'next_cursor': encode_cursor(position) if remaining else None,
+            'total': matches.bit_count(),
+            'facets': counts
+        }
+        self.cache.set(key, result)
+        return result
+
+EMBEDDED_FIELDS = ('category', 'series', 'style', 'material', 'color', 'attributes', 'location', 'season')
+EMBEDDED_FIELD_WEIGHT = 3
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """Splits text into lowercase alphanumeric tokens."""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+def item_terms(metadata):
+    """
+    Counts the weighted terms describing an item.
+    
+    Metadata fields count EMBEDDED_FIELD_WEIGHT times per token, the
+    generation prompt once, so the curated fields dominate its boilerplate.
+    
+    Returns:
+        collections.Counter: Term to weighted count.
+    """
+    terms = collections.Counter(tokenize(metadata.get('prompt') or ''))
+    fields = collections.Counter(tokenize(' '.join(str(metadata.get(field) or '') for field in EMBEDDED_FIELDS)))
+    for token, count in fields.items():
+        terms[token] += count * EMBEDDED_FIELD_WEIGHT
+    return terms
+
+def analysis_terms(ai_json):
+    """
+    Turns a Style Analyzer response into weighted query terms.
+    
+    Each styleDNA name is weighted by its percentage, key elements count
+    once, and design recommendations half as much.
+    
+    Returns:
+        collections.Counter: Term to weight.
+    """
+    terms = collections.Counter()
+    for entry in ai_json.get("styleDNA") or []:
+        try:
+            weight = float(entry.get("percentage", 100)) / 100
+        except (TypeError, ValueError, AttributeError):
+            continue
+        for token in tokenize(entry.get("name", "")):
+            terms[token] += weight
+    for element in ai_json.get("keyElements") or []:
+        for token in tokenize(element):
+            terms[token] += 1.0
+    for recommendation in ai_json.get("designRecommendations") or []:
+        for token in tokenize(recommendation):
+            terms[token] += 0.5
+    return terms
+
+FULLTEXT_FIELD_WEIGHTS = {'series': 3, 'attributes': 2, 'prompt': 1}
+FULLTEXT_FORMAT_VERSION = 1
+FULLTEXT_STOP_WORDS = frozenset(('a', 'all', 'an', 'and', 'any', 'do', 'for', 'from', 'in', 'no', 'not', 'of', 'on', 'only', 'or', 'the', 'to', 'used', 'with'))
+STEM_SUFFIXES = (
+    ('ational', 'ate'), ('ization', 'ize'), ('iveness', 'ive'), ('fulness', 'ful'), ('ousness', 'ous'),
+    ('sses', 'ss'), ('ies', 'y'), ('ings', ''), ('ing', ''), ('edly', ''), ('ed', ''), ('ly', ''), ('s', '')
+)
+
+@functools.lru_cache(maxsize=65536)
+def stem(token):
+    """
+    Strips common English suffixes so inflections share one index term.
+    
+    A light suffix stripper in the spirit of Porter's first steps: at most
+    one suffix is removed and at least three characters are kept, so
+    'cushions', 'finished' and 'upholstered' become 'cushion', 'finish' and
+    'upholster' while 'glass' and 'oak' stay as they are.
+    """
+    if token.isdigit():
+        return token
+    for suffix, replacement in STEM_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            if suffix == 's' and token.endswith(('ss', 'us', 'is')):
+                return token
+            return token[:-len(suffix)] + replacement
+    return token
+
+class FullTextIndex:
+    """
+    BM25-ranked inverted index over FULLTEXT_FIELD_WEIGHTS fields.
+
+    Tokens are stemmed and FULLTEXT_STOP_WORDS are skipped; a field's weight
+    is added to the term frequency for every occurrence.
+
+    Postings map each stemmed term to {slot: weighted term frequency}, where
+    a slot is a reusable row in the document length array. Items are added
+    and removed one at a time, so a changed sidecar only touches its own
+    postings. Queries score just the postings of their terms with NumPy;
+    the last query word is also matched as a prefix of the surface
+    vocabulary (kept sorted), which is what typeahead uses as well, so no
+    request ever scans the catalog.
+
+    slot_terms maps each slot to the terms it was indexed under, so
+    removing an item only touches its own postings. The map is not
+    persisted, which keeps the saved index small; it is rebuilt from the
+    postings when an index is loaded.
+
+    Methods take an internal lock; one index can be updated by the catalog
+    watcher while request threads query it.
+    """
+
+    MAX_PREFIX_EXPANSIONS = 16
+    PREFIX_SCAN_LIMIT = 512
+    MAX_COMPLETION_DF = 0.9
+    MIN_DOCUMENTS_FOR_DF_CUTOFF = 20
+
+    def __init__(self, k1=1.2, b=0.75):
+        """
+        Args:
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 document length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.slots = {}
+        self.slot_ids = []
+        self.free_slots = []
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.total_length = 0.0
+        self.words = []
+        self.stem_words = {}
+        self.slot_terms = {}
+        self._compiled = {}
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock'], state['_compiled'], state['slot_terms']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        slot_terms = collections.defaultdict(list)
+        for term, postings in self.postings.items():
+            for slot in postings:
+                slot_terms[slot].append(term)
+        self.slot_terms = {slot: tuple(terms) for slot, terms in slot_terms.items()}
+        self._compiled = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, item_id):
+        return str(item_id) in self.slots
+
+    def add(self, item):
+        """Indexes an item, replacing any earlier version with the same row_id."""
+        item_id = item.id
+        terms = collections.Counter()
+        words = set()
+        for field, weight in FULLTEXT_FIELD_WEIGHTS.items():
+            for token, count in collections.Counter(tokenize(item.get(field) or '')).items():
+                if token not in FULLTEXT_STOP_WORDS:
+                    terms[stem(token)] += count * weight
+                    words.add(token)
+
+        with self._lock:
+            self.remove(item_id)
+            if self.free_slots:
+                slot = self.free_slots.pop()
+                self.slot_ids[slot] = item_id
+            else:
+                slot = len(self.slot_ids)
+                self.slot_ids.append(item_id)
+                if slot >= len(self.lengths):
+                    self.lengths = np.concatenate([self.lengths, np.zeros(max(slot, 64), dtype=np.float32)])
+            length = sum(terms.values())
+            self.lengths[slot] = length
+            self.total_length += length
+            for term, count in terms.items():
+                self.postings.setdefault(term, {})[slot] = count
+                self._compiled.pop(term, None)
+            self.slot_terms[slot] = tuple(terms)
+            for word in words:
+                known = self.stem_words.setdefault(stem(word), set())
+                if word not in known:
+                    known.add(word)
+                    bisect.insort(self.words, word)
+            self.slots[item_id] = slot
+
+    def remove(self, item_id):
+        """Drops an item from the index; unknown ids are ignored."""
+        with self._lock:
+            slot = self.slots.pop(str(item_id), None)
+            if slot is None:
+                return
+            for term in self.slot_terms.pop(slot, ()):
+                postings = self.postings[term]
+                if postings.pop(slot, None) is None:
+                    continue
+                self._compiled.pop(term, None)
+                if not postings:
+                    del self.postings[term]
+                    for word in self.stem_words.pop(term, ()):
+                        del self.words[bisect.bisect_left(self.words, word)]
+            self.total_length -= float(self.lengths[slot])
+            self.lengths[slot] = 0
+            self.slot_ids[slot] = None
+            self.free_slots.append(slot)
+
+    def completions(self, prefix, limit):
+        """
+        Returns up to limit indexed words starting with prefix.
+        
+        Words are ordered by the document frequency of their stem. Once the
+        index holds MIN_DOCUMENTS_FOR_DF_CUTOFF items, words whose stem is in
+        more than MAX_COMPLETION_DF of them are skipped: boilerplate shared
+        by every generation prompt ("photography", "remove", "labels") does
+        not tell items apart. At most PREFIX_SCAN_LIMIT words of the sorted
+        vocabulary are looked at, so one-letter prefixes cost the same as
+        longer ones.
+        """
+        with self._lock:
+            count = len(self.slots)
+            max_df = self.MAX_COMPLETION_DF * count if count >= self.MIN_DOCUMENTS_FOR_DF_CUTOFF else count
+            start = bisect.bisect_left(self.words, prefix)
+            matches = []
+            for word in self.words[start:start + self.PREFIX_SCAN_LIMIT]:
+                if not word.startswith(prefix):
+                    break
+                if len(self.postings[stem(word)]) <= max_df:
+                    matches.append(word)
+            matches.sort(key=lambda word: (-len(self.postings[stem(word)]), word))
+            return matches[:limit]
+
+    def _postings_arrays(self, term):
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self.postings[term]
+            compiled = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            )
+            self._compiled[term] = compiled
+        return compiled
+
+    def search(self, query, k=DEFAULT_PAGE_SIZE, prefix=True):
+        """
+        Ranks items against a free text query with BM25.
+        
+        Query words are ORed. With prefix=True the last word also matches
+        the MAX_PREFIX_EXPANSIONS most frequent indexed words it starts,
+        so a partially typed query already returns results.
+        
+        Args:
+            query (str): Free text.
+            k (int): Number of results.
+            prefix (bool): Whether to expand the last word as a prefix.
+            
+        Returns:
+            list: (item_id, score) pairs, best first.
+        """
+        tokens = tokenize(query or '')
+        if not tokens or k < 1:
+            return []
+        terms = {stem(token) for token in tokens}
+        with self._lock:
+            if prefix:
+                terms.update(stem(word) for word in self.completions(tokens[-1], self.MAX_PREFIX_EXPANSIONS))
+            terms = [term for term in terms if term in self.postings]
+            if not terms:
+                return []
+            count = len(self.slots)
+            average_length = self.total_length / count
+            scores = np.zeros(len(self.slot_ids), dtype=np.float32)
+            norms = self.k1 * (1 - self.b + self.b * self.lengths[:len(self.slot_ids)] / average_length)
+            for term in terms:
+                slots, frequencies = self._postings_arrays(term)
+                idf = math.log(1 + (count - len(slots) + 0.5) / (len(slots) + 0.5))
+                scores[slots] += idf * frequencies * (self.k1 + 1) / (frequencies + norms[slots])
+
+            matched = np.flatnonzero(scores)
+            if len(matched) > k:
+                matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            matched = matched[np.argsort(-scores[matched], kind='stable')]
+            return [(self.slot_ids[slot], float(scores[slot])) for slot in matched]
+
+    def suggest(self, query, limit=8):
+        """
+        Completes the last word of a typeahead query from the indexed vocabulary.
+        
+        Returns:
+            list: Full query strings, most frequent completion first.
+        """
+        tokens = tokenize(query or '')
+        if not tokens:
+            return []
+        head = ' '.join(tokens[:-1])
+        return [f"{head} {word}" if head else word for word in self.completions(tokens[-1], limit)]
+
+    def save(self, path, manifest, row_ids):
+        """
+        Writes the index with the sidecar manifest it reflects, atomically.
+        
+        Args:
+            path (str): Destination file.
+            manifest (dict): Sidecar filename to mtime_ns.
+            row_ids (dict): Sidecar filename to row_id.
+        """
+        with self._lock:
+            payload = pickle.dumps({
+                'format': FULLTEXT_FORMAT_VERSION,
+                'manifest': manifest,
+                'row_ids': row_ids,
+                'index': self
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        """
+        Reads an index written by save().
+        
+        Returns:
+            tuple: (index, manifest, row_ids), or None if the file is missing,
+                unreadable or from another format version.
+        """
+        try:
+            with open(path, "rb") as f:
+                stored = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+        if not isinstance(stored, dict) or stored.get('format') != FULLTEXT_FORMAT_VERSION:
+            return None
+        return stored['index'], stored['manifest'], stored['row_ids']
+
+STYLE_SYNONYMS = {
+    "scandi": "scandinavian", "nordic": "scandinavian", "hygge": "scandinavian",
+    "mid century": "mid century modern", "mcm": "mid century modern", "retro modern": "mid century modern",
+    "modern": "minimalist", "contemporary": "minimalist", "minimal": "minimalist", "minimalism": "minimalist",
+    "boho": "bohemian", "boho chic": "bohemian", "eclectic": "bohemian",
+    "japanese": "japandi", "japanese scandinavian": "japandi", "zen": "wabi sabi",
+    "loft": "industrial", "urban": "industrial",
+    "modern farmhouse": "farmhouse", "country": "farmhouse", "cottage": "farmhouse",
+    "classic": "traditional", "transitional": "traditional", "victorian": "traditional",
+    "nautical": "coastal", "beach": "coastal", "hamptons": "coastal",
+    "vintage": "retro",
+    "deco": "art deco", "hollywood regency": "art deco", "glam": "art deco",
+    "cabin": "rustic", "lodge": "rustic",
+}
+STYLE_MATCH_THRESHOLD = 0.75
+STYLE_MATCH_PREFIX = 2
+STYLE_RESOLVE_CACHE_SIZE = 1024
+
+def normalize_style(name):
+    """Lowercases a style name and reduces it to space-separated alphanumeric words."""
+    return ' '.join(tokenize(name))
+
+def character_trigrams(text):
+    """Returns the set of character trigrams of text, padded with spaces."""
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b):
+    """Returns the Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+class StyleTaxonomy:
+    """
+    Resolves free-form style names (e.g. from the Style Analyzer) to catalog styles.
+
+    A name is tried, in order, against the normalized catalog styles, a
+    synonym table, whole-word containment either way against styles and
+    then aliases ("Bohemian" in "Bohemian (Bojo)", "Coastal" in "Coastal
+    Grandmother", the "country" alias in "French Country") and finally a
+    character-trigram index re-scored by edit distance. Fuzzy candidates
+    must share the first letters of the query, so "Maximalist" is not read
+    as "Minimalist". Results are kept in a bounded LRU memo.
+    """
+
+    def __init__(self, styles, synonyms=None, threshold=STYLE_MATCH_THRESHOLD, cache_size=STYLE_RESOLVE_CACHE_SIZE):
+        """
+        Args:
+            styles (iterable): Catalog style names, e.g. get_available_options(items)['style'].
+            synonyms (dict, optional): Alias to style phrase; defaults to STYLE_SYNONYMS.
+                Aliases whose phrase matches no catalog style are dropped.
+            threshold (float): Minimum fuzzy score (0-1) for a match.
+            cache_size (int): Resolved names kept in the memo.
+        """
+        self.styles = sorted(set(styles) - {'N/A'})
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.exact = {}
+        self.words = {}
+        for style in self.styles:
+            key = normalize_style(style)
+            self.exact[key] = style
+            self.exact[key.replace(' ', '')] = style
+            self.words[style] = set(key.split())
+
+        self.synonyms = {}
+        self.alias_words = {}
+        alias_words = {}
+        for alias, phrase in (STYLE_SYNONYMS if synonyms is None else synonyms).items():
+            match = self._match(normalize_style(phrase), fuzzy=False)
+            if match:
+                alias = normalize_style(alias)
+                self.synonyms[alias] = self.synonyms[alias.replace(' ', '')] = match[0]
+                alias_words[alias] = set(alias.split())
+        self.alias_words = alias_words
+
+        self.trigram_index = collections.defaultdict(set)
+        self.key_styles = {**self.exact, **self.synonyms}
+        for key in self.key_styles:
+            for trigram in character_trigrams(key):
+                self.trigram_index[trigram].add(key)
+        self._resolved = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, name):
+        """
+        Resolves a style name to a catalog style.
+        
+        Args:
+            name (str): Free-form style name, e.g. "Scandi" or "mid century".
+            
+        Returns:
+            tuple: (catalog style, match score 0-1), or None if nothing is close enough.
+        """
+        with self._lock:
+            if name in self._resolved:
+                self._resolved.move_to_end(name)
+                return self._resolved[name]
+        match = self._match(normalize_style(name or ''))
+        with self._lock:
+            self._resolved[name] = match
+            while len(self._resolved) > self.cache_size:
+                self._resolved.popitem(last=False)
+        return match
+
+    def _match(self, key, fuzzy=True):
+        if not key:
+            return None
+        compact = key.replace(' ', '')
+        for table in (self.exact, self.synonyms):
+            style = table.get(key) or table.get(compact)
+            if style:
+                return style, 1.0
+
+        words = set(key.split())
+        for phrases, styles in ((self.words, None), (self.alias_words, self.synonyms)):
+            containing = [phrase for phrase in phrases if words <= phrases[phrase]]
+            if containing:
+                phrase = min(containing, key=lambda phrase: (len(phrases[phrase]), phrase))
+                return (styles[phrase] if styles else phrase), 1.0
+            contained = [phrase for phrase in phrases if phrases[phrase] <= words]
+            if contained:
+                phrase = max(contained, key=lambda phrase: (len(phrases[phrase]), phrase))
+                return (styles[phrase] if styles else phrase), len(phrases[phrase]) / len(words)
+        if not fuzzy:
+            return None
+
+        trigrams = character_trigrams(key)
+        shared = collections.Counter()
+        for trigram in trigrams:
+            shared.update(self.trigram_index.get(trigram, ()))
+        best = None
+        prefix = key[:STYLE_MATCH_PREFIX]
+        for candidate, count in shared.most_common(8):
+            if not candidate.startswith(prefix):
+                continue
+            dice = 2 * count / (len(trigrams) + len(character_trigrams(candidate)))
+            similarity = 1 - edit_distance(key, candidate) / max(len(key), len(candidate))
+            score = max(dice, similarity)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (self.key_styles[candidate], score)
+        return best
+
+    def resolve_dna(self, style_dna):
+        """
+        Resolves every styleDNA entry and merges entries that land on the same catalog style.
+        
+        Args:
+            style_dna (list): Analyzer entries like {"name": "Scandi", "percentage": 80}.
+            
+        Returns:
+            list: (catalog style, weight) pairs by descending weight, where the
+                weight is the percentage scaled by the match score.
+        """
+        weights = {}
+        for entry in style_dna or []:
+            if not isinstance(entry, dict):
+                continue
+            match = self.resolve(str(entry.get("name", "")))
+            if not match:
+                continue
+            try:
+                percentage = float(entry.get("percentage", 100))
+            except (TypeError, ValueError):
+                continue
+            if percentage > 0:
+                weights[match[0]] = weights.get(match[0], 0) + percentage * match[1]
+        return sorted(weights.items(), key=lambda pair: (-pair[1], pair[0]))
+
+def allocate_slots(weights, k):
+    """
+    Splits k slots across weighted entries by the largest-remainder method.
+    
+    Args:
+        weights (list): (key, weight) pairs.
+        k (int): Number of slots.
+        
+    Returns:
+        list: (key, slots) pairs in the input order, skipping keys with no slots.
+    """
+    total = sum(weight for _, weight in weights)
+    if total <= 0 or k <= 0:
+        return []
+    quotas = [k * weight / total for _, weight in weights]
+    slots = [int(quota) for quota in quotas]
+    by_remainder = sorted(range(len(weights)), key=lambda i: (-(quotas[i] - slots[i]), i))
+    for i in by_remainder[:k - sum(slots)]:
+        slots[i] += 1
+    return [(key, count) for (key, _), count in zip(weights, slots) if count]
+
+class StyleRecommender:
+    """
+    TF-IDF embeddings of every catalog item, ranked by cosine similarity.
+
+    Each item's metadata and prompt are embedded offline into one
+    L2-normalized row (sublinear term frequency, smoothed IDF, vocabulary
+    capped at max_features by document frequency). The rows are stored
+    sparsely by column, CSC style: indptr[c]:indptr[c + 1] slices indices
+    (row numbers) and data (weights) for vocabulary column c, so memory
+    grows with the number of (item, term) pairs rather than items times
+    vocabulary. A query is embedded the same way and scored by adding up
+    the postings of its own terms; the top k are picked with argpartition.
+    """
+
+    def __init__(self, items, max_features=4096, previous=None):
+        """
+        Args:
+            items (iterable): Furniture items, e.g. a Catalog.
+            max_features (int): Vocabulary size limit.
+            previous (StyleRecommender, optional): An earlier index whose term counts
+                are reused for items that have not changed (same item object).
+                Terms no current item uses are dropped.
+        """
+        self.ids = []
+        self.item_terms = {}
+        self.term_ids = dict(previous.term_ids) if previous is not None else {}
+        reusable = previous.item_terms if previous is not None else {}
+        for item in items:
+            item_id = item.id
+            cached = reusable.get(item_id)
+            if cached is None or cached[0] is not item:
+                terms = item_terms(item)
+                cached = (
+                    item,
+                    np.array([self.term_ids.setdefault(term, len(self.term_ids)) for term in terms], dtype=np.intp),
+                    np.fromiter(terms.values(), dtype=np.float32, count=len(terms))
+                )
+            self.ids.append(item_id)
+            self.item_terms[item_id] = cached
+
+        self.row_of = {item_id: row for row, item_id in enumerate(self.ids)}
+        count = len(self.ids)
+        entries = [self.item_terms[item_id] for item_id in self.ids]
+        lengths = [len(term_ids) for _, term_ids, _ in entries]
+        if entries:
+            terms = np.concatenate([term_ids for _, term_ids, _ in entries])
+            frequencies = np.concatenate([counts for _, _, counts in entries])
+        else:
+            terms, frequencies = np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.float32)
+        rows = np.repeat(np.arange(count), lengths)
+
+        document_frequency = np.bincount(terms, minlength=len(self.term_ids))
+        alive = document_frequency > 0
+        if not alive.all():
+            # Renumber the terms still in use so term_ids does not grow across reloads.
+            remap = np.cumsum(alive) - 1
+            self.term_ids = {term: int(remap[term_id]) for term, term_id in self.term_ids.items() if alive[term_id]}
+            terms = remap[terms]
+            document_frequency = document_frequency[alive]
+            for item_id, term_ids in zip(self.ids, np.split(terms, np.cumsum(lengths)[:-1])):
+                item, _, counts = self.item_terms[item_id]
+                self.item_terms[item_id] = (item, term_ids, counts)
+
+        vocabulary = np.argsort(-document_frequency, kind='stable')[:max_features]
+        column_of = np.full(len(self.term_ids), -1, dtype=np.intp)
+        column_of[vocabulary] = np.arange(len(vocabulary))
+        self.vocabulary = {term: int(column_of[term_id]) for term, term_id in self.term_ids.items() if column_of[term_id] >= 0}
+        self.idf = np.log((1 + count) / (1 + document_frequency[vocabulary])).astype(np.float32)
+
+        columns = column_of[terms]
+        kept = columns >= 0
+        rows, columns = rows[kept], columns[kept]
+        weights = (1 + np.log(frequencies[kept])) * self.idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weights.astype(np.float64) ** 2, minlength=count))
+        norms[norms == 0] = 1
+        weights = weights / norms[rows]
+
+        order = np.argsort(columns, kind='stable')
+        self.indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns, minlength=len(vocabulary)), out=self.indptr[1:])
+        self.indices = rows[order].astype(np.int32)
+        self.data = weights[order].astype(np.float32)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the sparse weight arrays."""
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def __len__(self):
+        return len(self.ids)
+
+    def embed(self, terms):
+        """
+        Embeds weighted query terms into the item space.
+        
+        Args:
+            terms (dict): Term to weight, e.g. from analysis_terms().
+            
+        Returns:
+            numpy.ndarray: Unit-length query vector (all zeros if no term is known).
+        """
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for term, weight in terms.items():
+            column = self.vocabulary.get(term)
+            if column is not None and weight > 0:
+                vector[column] += weight
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def rank(self, terms, k=4, candidate_ids=None):
+        """
+        Returns the k items most similar to the query terms.
+        
+        Args:
+            terms (dict): Term to weight, e.g. from analysis_terms().
+            k (int): Number of results.
+            candidate_ids (iterable, optional): Restricts the ranking to these row_ids.
+            
+        Returns:
+            list: (row_id, cosine similarity) pairs, most similar first. Empty
+                if none of the terms occur in the catalog.
+        """
+        query = self.embed(terms)
+        columns = np.flatnonzero(query)
+        if not len(columns) or not self.ids or k <= 0:
+            return []
+        rows = None
+        if candidate_ids is not None:
+            rows = np.array([self.row_of[item_id] for item_id in candidate_ids if item_id in self.row_of], dtype=np.intp)
+            if not len(rows):
+                return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for column in columns:
+            start, end = self.indptr[column], self.indptr[column + 1]
+            scores[self.indices[start:end]] += self.data[start:end] * query[column]
+        if rows is not None:
+            scores = scores[rows]
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        if rows is not None:
+            return [(self.ids[rows[i]], float(scores[i])) for i in top]
+        return [(self.ids[row], float(scores[row])) for row in top]
+
+IMAGE_FEATURE_SAMPLE = 32
+COLOR_HISTOGRAM_BINS = 4
+LAYOUT_GRID = 8
+LAYOUT_WEIGHT = 0.5
+
+def image_features(path):
+    """
+    Computes a compact visual feature vector for an image.
+    
+    The image is box-downsampled to IMAGE_FEATURE_SAMPLE pixels square. The
+    vector concatenates a joint RGB color histogram (COLOR_HISTOGRAM_BINS per
+    channel, square-rooted so dominant colors do not swamp the rest) and a
+    mean-centered LAYOUT_GRID x LAYOUT_GRID grayscale thumbnail, weighted by
+    LAYOUT_WEIGHT. The result is L2-normalized, so dot products are cosine
+    similarities.
+    
+    Args:
+        path (str): Path to the image.
+        
+    Returns:
+        numpy.ndarray: float32 vector of COLOR_HISTOGRAM_BINS**3 + LAYOUT_GRID**2 values.
+    """
+    with Image.open(path) as image:
+        image.draft('RGB', (IMAGE_FEATURE_SAMPLE * 4, IMAGE_FEATURE_SAMPLE * 4))
+        small = ImageOps.exif_transpose(image).convert('RGB').resize(
+            (IMAGE_FEATURE_SAMPLE, IMAGE_FEATURE_SAMPLE), Image.Resampling.BOX
+        )
+
+    pixels = np.asarray(small, dtype=np.float32) / 256
+    bins = (pixels * COLOR_HISTOGRAM_BINS).astype(np.intp)
+    codes = (bins[..., 0] * COLOR_HISTOGRAM_BINS + bins[..., 1]) * COLOR_HISTOGRAM_BINS + bins[..., 2]
+    histogram = np.sqrt(np.bincount(codes.ravel(), minlength=COLOR_HISTOGRAM_BINS ** 3).astype(np.float32))
+
+    layout = np.asarray(small.convert('L').resize((LAYOUT_GRID, LAYOUT_GRID), Image.Resampling.BOX), dtype=np.float32).ravel()
+    layout -= layout.mean()
+
+    parts = []
+    for part, weight in ((histogram, 1.0), (layout, LAYOUT_WEIGHT)):
+        norm = np.linalg.norm(part)
+        parts.append(part / norm * weight if norm else part)
+    vector = np.concatenate(parts)
+    return vector / np.linalg.norm(vector)
+
+class ImageFeatureStore:
+    """
+    Disk-backed cache of image_features() per source image.
+
+    Entries are remembered per (mtime, size) like ThumbnailCache's hashes,
+    so only new or changed images are decoded again. Decoding failures are
+    remembered the same way (in memory only), so a broken image is not
+    decoded again until its file changes.
+    """
+
+    def __init__(self, source_folder, path):
+        """
+        Args:
+            source_folder (str): Directory containing the images.
+            path (str, optional): Pickle file the features are persisted to; None keeps them in memory only.
+        """
+        self.source_folder = source_folder
+        self.path = path
+        self._features = {}
+        self._failed = {}
+        self._dirty = False
+        if path:
+            try:
+                with open(path, "rb") as f:
+                    self._features = pickle.load(f)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                pass
+
+    def __len__(self):
+        return len(self._features)
+
+    def get(self, filename):
+        """
+        Returns the feature vector of an image, computing it only if the file is new or changed.
+        
+        Raises:
+            FileNotFoundError: If the image does not exist.
+            OSError: If the image cannot be decoded, now or when it was last tried at this mtime and size.
+        """
+        path = os.path.join(self.source_folder, filename)
+        stat = os.stat(path)
+        cached = self._features.get(filename)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        if self._failed.get(filename) == (stat.st_mtime_ns, stat.st_size):
+            raise OSError(f"Unreadable image: {filename}")
+        try:
+            vector = image_features(path)
+        except OSError:
+            self._failed[filename] = (stat.st_mtime_ns, stat.st_size)
+            raise
+        self._failed.pop(filename, None)
+        self._features[filename] = (stat.st_mtime_ns, stat.st_size, vector)
+        self._dirty = True
+        return vector
+
+    def save(self):
+        """Persists newly computed features, if any."""
+        if not self._dirty or not self.path:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self._features, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+class VisualSimilarityIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbor index over unit vectors.
+
+    Vectors are clustered with k-means into about sqrt(n) lists. A search
+    scores only the vectors in the nprobe lists whose centroids are closest
+    to the query. New vectors join their nearest list straight away; the
+    clustering is retrained once the index has doubled since the last
+    training, so incremental adds stay cheap.
+    """
+
+    TRAINING_POINTS_PER_LIST = 32
+
+    def __init__(self, dimensions, nprobe=8, kmeans_iterations=8, seed=0):
+        """
+        Args:
+            dimensions (int): Vector length.
+            nprobe (int): Number of lists scanned per search.
+            kmeans_iterations (int): Lloyd iterations per training.
+            seed (int): Seed for picking the initial centroids.
+        """
+        self.dimensions = dimensions
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self._random = np.random.default_rng(seed)
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self._ids = []
+        self._row_of = {}
+        self._free_rows = []
+        self._centroids = np.zeros((0, dimensions), dtype=np.float32)
+        self._assignment = np.zeros(0, dtype=np.intp)
+        self._lists = []
+        self._list_arrays = {}
+        self._trained_size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __contains__(self, item_id):
+        return str(item_id) in self._row_of
+
+    def add(self, item_id, vector):
+        """Adds a vector, or replaces the vector stored for item_id."""
+        item_id = str(item_id)
+        with self._lock:
+            row = self._row_of.get(item_id)
+            if row is None:
+                row = self._free_rows.pop() if self._free_rows else self._grow()
+                self._row_of[item_id] = row
+                self._ids[row] = item_id
+            else:
+                self._unassign(row)
+            self._vectors[row] = vector
+            if len(self._row_of) > 2 * self._trained_size:
+                self.train()
+            else:
+                self._assign(row)
+
+    def remove(self, item_id):
+        """Removes the vector stored for item_id, if any."""
+        with self._lock:
+            row = self._row_of.pop(str(item_id), None)
+            if row is not None:
+                self._unassign(row)
+                self._ids[row] = None
+                self._free_rows.append(row)
+
+    def _grow(self):
+        row = len(self._ids)
+        if row == len(self._vectors):
+            capacity = max(64, 2 * len(self._vectors))
+            vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+            vectors[:row] = self._vectors[:row]
+            self._vectors = vectors
+            assignment = np.full(capacity, -1, dtype=np.intp)
+            assignment[:row] = self._assignment[:row]
+            self._assignment = assignment
+        self._ids.append(None)
+        return row
+
+    def _assign(self, row):
+        centroid = int(np.argmax(self._centroids @ self._vectors[row]))
+        self._assignment[row] = centroid
+        self._lists[centroid].add(row)
+        self._list_arrays.pop(centroid, None)
+
+    def _unassign(self, row):
+        centroid = self._assignment[row]
+        if centroid >= 0:
+            self._lists[centroid].discard(row)
+            self._list_arrays.pop(centroid, None)
+            self._assignment[row] = -1
+
+    def train(self):
+        """Reclusters every stored vector with spherical k-means trained on a sample."""
+        with self._lock:
+            rows = np.array(sorted(self._row_of.values()), dtype=np.intp)
+            vectors = self._vectors[rows]
+            list_count = max(1, int(math.sqrt(len(rows))))
+            sample_size = min(len(rows), list_count * self.TRAINING_POINTS_PER_LIST)
+            sample = vectors[self._random.choice(len(rows), sample_size, replace=False)]
+            centroids = sample[:list_count]
+            for _ in range(self.kmeans_iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+            labels = np.argmax(vectors @ centroids.T, axis=1)
+
+            self._centroids = centroids.astype(np.float32)
+            self._assignment[:] = -1
+            self._assignment[rows] = labels
+            self._lists = [set() for _ in range(list_count)]
+            for row, label in zip(rows.tolist(), labels.tolist()):
+                self._lists[label].add(row)
+            self._list_arrays = {}
+            self._trained_size = len(rows)
+
+    def _list_array(self, centroid):
+        rows = self._list_arrays.get(centroid)
+        if rows is None:
+            rows = self._list_arrays[centroid] = np.fromiter(self._lists[centroid], dtype=np.intp)
+        return rows
+
+    def search(self, vector, k=8, exclude=None):
+        """
+        Finds the stored vectors most similar to a query vector.
+        
+        Args:
+            vector (numpy.ndarray): Unit-length query vector.
+            k (int): Number of results.
+            exclude (str, optional): An id left out of the results (e.g. the query item).
+            
+        Returns:
+            list: (id, cosine similarity) pairs, most similar first.
+        """
+        with self._lock:
+            if not self._row_of:
+                return []
+            nprobe = min(self.nprobe, len(self._centroids))
+            probed = np.argpartition(-(self._centroids @ vector), nprobe - 1)[:nprobe]
+            rows = np.concatenate([self._list_array(int(centroid)) for centroid in probed])
+            if exclude is not None and str(exclude) in self._row_of:
+                rows = rows[rows != self._row_of[str(exclude)]]
+            if not len(rows):
+                return []
+            scores = self._vectors[rows] @ vector
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(self._ids[rows[i]], float(scores[i])) for i in top]
+
+    def similar(self, item_id, k=8):
+        """
+        Finds the items most similar to a stored item.
+        
+        Returns:
+            list: (id, cosine similarity) pairs, or None if item_id is not indexed.
+        """
+        with self._lock:
+            row = self._row_of.get(str(item_id))
+            if row is None:
+                return None
+            vector = self._vectors[row].copy()
+        return self.search(vector, k, exclude=item_id)
+
+class SimilarItemsIndexer:
+    """
+    Keeps a VisualSimilarityIndex in step with the catalog.
+
+    Each sync() looks only at items that were added, replaced or removed
+    since the previous sync (the watcher replaces an item object whenever
+    its sidecar changes), computes their features via an ImageFeatureStore
+    and updates the index. A catalog whose version has not moved since the
+    last sync is skipped outright. Run it from the offline job, or in a
+    daemon thread with start() so new sidecars are picked up while the app
+    runs.
+    """
+
+    def __init__(self, store, index=None):
+        """
+        Args:
+            store (ImageFeatureStore): Source of feature vectors.
+            index (VisualSimilarityIndex, optional): Index to maintain; created on first sync.
+        """
+        self.store = store
+        self.index = index
+        self._indexed = {}
+        self._items = {}
+        self._synced = (None, None)
+        self._unreadable = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sync(self, catalog):
+        """
+        Brings the index up to date with a catalog.
         
-    Returns:
-        list: A list of dictionaries containing the loaded metadata.
+        Images that cannot be read are skipped. While the catalog is
+        unchanged, later syncs look only at those items again, and the store
+        does not decode an image again until its file changes.
+        
+        Args:
+            catalog (Catalog): The catalog to mirror.
+            
+        Returns:
+            int: Number of items added, replaced or removed.
+        """
+        unchanged = self._synced == (catalog, catalog.version)
+        if unchanged and not self._unreadable:
+            return 0
+
+        changes = 0
+        unreadable = {}
+        for item_id, item in list(self._unreadable.items() if unchanged else catalog.items_by_id.items()):
+            if self._items.get(item_id) is item:
+                continue
+            try:
+                vector = self.store.get(image_filename(item))
+            except OSError:
+                unreadable[item_id] = item
+                continue
+            self._items[item_id] = item
+            if self._indexed.get(item_id) is vector:
+                continue
+            if self.index is None:
+                self.index = VisualSimilarityIndex(len(vector))
+            self.index.add(item_id, vector)
+            self._indexed[item_id] = vector
+            changes += 1
+        removed = [] if unchanged else [item_id for item_id in self._items if item_id not in catalog]
+        for item_id in removed:
+            del self._items[item_id]
+            if self._indexed.pop(item_id, None) is not None:
+                self.index.remove(item_id)
+                changes += 1
+        self.store.save()
+        self._synced = (catalog, catalog.version)
+        self._unreadable = unreadable
+        return changes
+
+    def similar(self, item_id, k=8):
+        """
+        Returns (row_id, similarity) pairs for the items that look most like item_id.
+        
+        Returns:
+            list: Most similar first, or None if the item has not been indexed (yet).
+        """
+        if self.index is None:
+            return None
+        return self.index.similar(item_id, k)
+
+    def _run(self, get_catalog, interval):
+        while True:
+            try:
+                self.sync(get_catalog())
+            except Exception:
+                logger.exception("Similar items sync failed; retrying in %.1f s", interval)
+            if self._stop.wait(interval):
+                return
+
+    def start(self, get_catalog, interval=5.0):
+        """
+        Syncs immediately and then every interval seconds in a daemon thread.
+        
+        Args:
+            get_catalog (callable): Returns the current Catalog.
+            interval (float): Seconds between syncs.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(get_catalog, interval), name="similar-items", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the sync thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+class CatalogWatcher:
     """
-    data_list = []
-    for file in os.listdir(folder):
-        if file.endswith(".json"):
-            with open(os.path.join(folder, file), "r", encoding="utf-8") as f:
-                data = json.load(f)
-                data_list.append(data)
-    return data_list
+    Keeps a Catalog in sync with its sidecar folder without restarting the app.
 
-def load_image(file_path):
+    The folder is polled for added, changed and removed sidecars. Changes are
+    applied to a copy of the current catalog, which is then published with a
+    single attribute assignment. Readers that grabbed `watcher.catalog` keep a
+    consistent view for as long as they hold it.
+
+    With a fulltext_path the watcher also maintains a FullTextIndex, updated
+    per changed sidecar and persisted next to the catalog. The index is
+    shared by every catalog version, so readers should skip ids their
+    pinned catalog does not have.
+
+    With a table_path, worker processes share one catalog: the process that
+    holds the table's lock file loads the sidecars as above and writes a
+    CatalogTable after every change; every other process maps that table
+    read-only and builds its catalog from TableItems, without parsing any
+    sidecar. Readers pick up a replaced table on their next poll, and one of
+    them takes the lock over if the writing process exits. Each process must
+    create its own watcher (e.g. no gunicorn --preload), since the lock is
+    held per open file. Sharing needs fcntl; elsewhere every process loads
+    the sidecars itself.
     """
-    Opens an image file using PIL.
-    
-    Args:
-        file_path (str): Path to the image file.
+
+    def __init__(self, folder, snapshot_path=None, interval=5.0, pricing_rules_path=None, fulltext_path=None,
+                 table_path=None):
+        """
+        Args:
+            folder (str): Directory containing the sidecars.
+            snapshot_path (str, optional): Compiled snapshot used for the initial load.
+            interval (float): Seconds between polls once start() is called.
+            pricing_rules_path (str, optional): Pricing rules file (see load_pricing_rules())
+                watched alongside the sidecars. PRICING_RULES is used while it is missing.
+            fulltext_path (str, optional): Where the full-text index is persisted. It is
+                loaded and caught up with the sidecars at startup, or built if missing.
+            table_path (str, optional): CatalogTable shared with other worker processes.
+        """
+        self.folder = folder
+        self.interval = interval
+        self.pricing_rules_path = pricing_rules_path
+        self.pricing_rules_mtime = None
+        self.fulltext_path = fulltext_path
+        self.table_path = table_path if fcntl is not None else None
+        self.table = None
+        self.table_identity = None
+        self._table_lock = None
+        reader = self._is_table_reader()
+        table = self._read_table() if reader else None
+        if table is not None:
+            self.catalog = Catalog()
+            self._apply_table(self.catalog, table)
+        else:
+            if snapshot_path:
+                manifest, metadata_list = load_sidecar_table(folder, snapshot_path)
+            else:
+                manifest = list_sidecars(folder)
+                metadata_list = list(parse_sidecars(folder, manifest).values())
+            self.manifest = dict(manifest)
+            self.row_ids = {filename: str(data.get('row_id')) for filename, data in zip(manifest, metadata_list)}
+            self.catalog = Catalog(
+                make_item(data, os.path.join(folder, filename)) for filename, data in zip(manifest, metadata_list)
+            )
+        rules = self._load_pricing_rules()
+        if rules is not None:
+            self.catalog.pricing_rules = rules
+
+        if not fulltext_path:
+            self.fulltext = None
+        elif reader:
+            stored = FullTextIndex.load(fulltext_path)
+            self.fulltext = stored[0] if stored is not None else FullTextIndex()
+        else:
+            self.fulltext = self._load_fulltext(metadata_list)
+        if self.table_path and not reader:
+            self._write_table()
+        self._prepare(self.catalog)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _prepare(self, catalog):
+        # Build the per-version indexes here, off the request path, before the catalog is published.
+        catalog.recommender()
+        catalog.search_index()
+
+    def _load_pricing_rules(self):
+        """Returns the pricing rules if the rules file changed since the last load, else None."""
+        if not self.pricing_rules_path:
+            return None
+        try:
+            mtime_ns = os.stat(self.pricing_rules_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime_ns == self.pricing_rules_mtime:
+            return None
+        try:
+            rules = load_pricing_rules(self.pricing_rules_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Keeping current pricing rules: %s", e)
+            rules = None
+        self.pricing_rules_mtime = mtime_ns
+        return rules
+
+    def _is_table_reader(self):
+        """
+        True if another process writes the shared catalog table.
         
-    Returns:
-        Image: A PIL Image object.
+        Takes the lock over once it is free; the sidecar manifest is then
+        recovered from the last table read, so the next poll only applies
+        what changed since.
+        """
+        if not self.table_path or self._table_lock is not None:
+            return False
+        lock = open(f"{self.table_path}.lock", "ab")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return True
+        self._table_lock = lock
+        if self.table is not None:
+            self.manifest = self.table.manifest()
+            self.row_ids = {filename: str(self.table.row_id(row)) for row, filename in enumerate(self.manifest)}
+            self.table = None
+        return False
+
+    def _read_table(self):
+        """Maps the catalog table if it was replaced since the last read; None if unchanged, missing or invalid."""
+        try:
+            stat = os.stat(self.table_path)
+        except FileNotFoundError:
+            return None
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self.table_identity:
+            return None
+        try:
+            table = CatalogTable(self.table_path)
+        except (OSError, ValueError):
+            return None
+        self.table_identity = table.identity
+        return table
+
+    def _apply_table(self, catalog, table):
+        """
+        Brings catalog in line with a newer catalog table.
+        
+        Items whose sidecar is unchanged since the previous table keep their
+        object and are just pointed at the new table, so per-item caches
+        (e.g. the recommender's term counts) stay valid; only changed rows
+        are re-added. Readers keep no manifest of their own, the table is it.
+        """
+        previous = {}
+        if self.table is not None:
+            old = self.table
+            mtimes = old.columns['mtime_ns']
+            previous = {old.string('filename', row): (old.row_id(row), mtimes[row]) for row in range(len(old))}
+        ids = [str(table.row_id(row)) for row in range(len(table))]
+        live = set(ids)
+        for item_id in [item_id for item_id in catalog.items_by_id if item_id not in live]:
+            catalog.remove(item_id)
+        mtimes = table.columns['mtime_ns']
+        for row, item_id in enumerate(ids):
+            current = catalog.get(item_id)
+            if isinstance(current, TableItem) and previous.get(table.string('filename', row)) == (table.row_id(row), mtimes[row]):
+                current._ref = (table, row)
+            else:
+                catalog.add(TableItem(table, row))
+        self.table = table
+        self.manifest = None
+        self.row_ids = None
+
+    def _write_table(self):
+        filenames = {row_id: filename for filename, row_id in self.row_ids.items()}
+        write_catalog_table(self.table_path, self.folder, [
+            (filenames[item.id], self.manifest[filenames[item.id]], item) for item in self.catalog
+        ])
+
+    def _load_fulltext(self, metadata_list):
+        """Loads the persisted full-text index and re-indexes only the sidecars that changed since."""
+        stored = FullTextIndex.load(self.fulltext_path)
+        index, manifest, row_ids = stored if stored is not None else (FullTextIndex(), {}, {})
+        changed = False
+        for filename, row_id in row_ids.items():
+            if self.row_ids.get(filename) != row_id:
+                index.remove(row_id)
+                changed = True
+        for filename, data in zip(self.manifest, metadata_list):
+            if manifest.get(filename) != self.manifest[filename] or row_ids.get(filename) != self.row_ids[filename]:
+                index.add(make_item(data))
+                changed = True
+        if changed:
+            index.save(self.fulltext_path, self.manifest, self.row_ids)
+        return index
+
+    def poll(self):
+        """
+        Applies sidecar and pricing rule changes since the last poll and publishes a new catalog.
+        
+        Sidecars that cannot be parsed yet (e.g. still being written) are
+        retried on the next poll. An invalid rules file is reported and the
+        current rules stay in effect until the file changes again. A process
+        reading a shared catalog table applies the latest table instead of
+        scanning the sidecars.
+        
+        Returns:
+            bool: True if a new catalog was published.
+        """
+        rules = self._load_pricing_rules()
+        if self._is_table_reader():
+            table = self._read_table()
+            if table is None and rules is None:
+                return False
+            catalog = self.catalog.copy()
+            if table is not None:
+                self._apply_table(catalog, table)
+                stored = FullTextIndex.load(self.fulltext_path) if self.fulltext_path else None
+                if stored is not None:
+                    self.fulltext = stored[0]
+            if rules is not None:
+                catalog.set_pricing_rules(rules)
+            self._prepare(catalog)
+            self.catalog = catalog
+            return True
+
+        listing = list_sidecars(self.folder)
+        changed = [filename for filename, mtime_ns in listing.items() if self.manifest.get(filename) != mtime_ns]
+        removed = [filename for filename in self.manifest if filename not in listing]
+        if not changed and not removed and rules is None:
+            return False
+
+        catalog = self.catalog.copy()
+        manifest = dict(self.manifest)
+        for filename in removed:
+            row_id = self.row_ids.pop(filename)
+            catalog.remove(row_id)
+            if self.fulltext is not None:
+                self.fulltext.remove(row_id)
+            del manifest[filename]
+
+        for filename in changed:
+            try:
+                data = load_sidecar(os.path.join(self.folder, filename))
+            except (OSError, ValueError):
+                continue
+            old_row_id = self.row_ids.get(filename)
+            new_row_id = str(data.get('row_id'))
+            if old_row_id is not None and old_row_id != new_row_id:
+                catalog.remove(old_row_id)
+                if self.fulltext is not None:
+                    self.fulltext.remove(old_row_id)
+            catalog.add(make_item(data, os.path.join(self.folder, filename)))
+            if self.fulltext is not None:
+                self.fulltext.add(make_item(data))
+            self.row_ids[filename] = new_row_id
+            manifest[filename] = listing[filename]
+
+        if rules is not None:
+            catalog.set_pricing_rules(rules)
+
+        self._prepare(catalog)
+        self.manifest = manifest
+        self.catalog = catalog
+        if self.fulltext is not None and (changed or removed):
+            self.fulltext.save(self.fulltext_path, self.manifest, self.row_ids)
+        if self.table_path and (changed or removed):
+            self._write_table()
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Catalog poll failed; keeping the current catalog")
+
+    def start(self):
+        """Starts polling in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the polling thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+SESSION_TTL_SECONDS = 31 * 24 * 60 * 60
+
+class SQLiteSessionStore:
     """
-    return Image.open(file_path)
+    Server-side store for session data (the cart) and order history, backed by SQLite.
 
-def get_all_items(folder):
+    Sessions are stored as one JSON document per session id; orders are
+    stored one row each, so reading a session never touches order history.
+    Expired sessions are deleted by save_session(), at most once every
+    purge_interval seconds; order history is kept.
     """
-    Aggregates all furniture items (images and metadata) from the folder.
+
+    def __init__(self, path, purge_interval=60.0):
+        """
+        Args:
+            path (str): SQLite database file (created if missing), or ':memory:'.
+            purge_interval (float): Minimum seconds between two purges of expired sessions.
+        """
+        self.path = path
+        self.purge_interval = purge_interval
+        self._last_purge = None
+        self._local = threading.local()
+        with self._connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+            db.execute("CREATE TABLE IF NOT EXISTS orders (id INTEGER PRIMARY KEY AUTOINCREMENT, sid TEXT NOT NULL, data TEXT NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS orders_sid ON orders (sid)")
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared across threads, so keep one per thread.
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            if self.path != ':memory:':
+                db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def load_session(self, sid):
+        """Returns the session dict for sid, or None if it is unknown or expired."""
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires > ?", (sid, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_session(self, sid, data, ttl=SESSION_TTL_SECONDS):
+        """Stores the session dict for sid for ttl seconds."""
+        with self._connection() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+                (sid, json.dumps(data), time.time() + ttl)
+            )
+        if self._last_purge is None or time.monotonic() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+    def purge_expired(self):
+        """
+        Deletes every expired session.
+        
+        Returns:
+            int: Number of sessions deleted.
+        """
+        self._last_purge = time.monotonic()
+        with self._connection() as db:
+            return db.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),)).rowcount
+
+    def delete_session(self, sid):
+        """Removes the session data for sid (order history is kept)."""
+        with self._connection() as db:
+            db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def append_order(self, sid, order):
+        """Adds an order to the history of sid."""
+        with self._connection() as db:
+            db.execute("INSERT INTO orders (sid, data) VALUES (?, ?)", (sid, json.dumps(order)))
+
+    def list_orders(self, sid):
+        """Returns the orders of sid, oldest first."""
+        rows = self._connection().execute(
+            "SELECT data FROM orders WHERE sid = ? ORDER BY id", (sid,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+class RedisSessionStore:
+    """
+    The same store interface on top of a Redis client.
+
+    Only get/set/delete/rpush/lrange/expire are used, so any redis-py
+    compatible client works, including InMemoryRedis for local runs.
+    """
+
+    def __init__(self, client, prefix="modoya"):
+        """
+        Args:
+            client: A redis-py compatible client.
+            prefix (str): Key prefix for everything this store writes.
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def _session_key(self, sid):
+        return f"{self.prefix}:session:{sid}"
+
+    def _orders_key(self, sid):
+        return f"{self.prefix}:orders:{sid}"
+
+    def load_session(self, sid):
+        """Returns the session dict for sid, or None if it is unknown or expired."""
+        raw = self.client.get(self._session_key(sid))
+        return json.loads(raw) if raw is not None else None
+
+    def save_session(self, sid, data, ttl=SESSION_TTL_SECONDS):
+        """Stores the session dict for sid for ttl seconds."""
+        self.client.set(self._session_key(sid), json.dumps(data), ex=int(ttl))
+
+    def delete_session(self, sid):
+        """Removes the session data for sid (order history is kept)."""
+        self.client.delete(self._session_key(sid))
+
+    def append_order(self, sid, order):
+        """Adds an order to the history of sid."""
+        self.client.rpush(self._orders_key(sid), json.dumps(order))
+
+    def list_orders(self, sid):
+        """Returns the orders of sid, oldest first."""
+        return [json.loads(raw) for raw in self.client.lrange(self._orders_key(sid), 0, -1)]
+
+class InMemoryRedis:
+    """
+    A thread-safe, in-process stand-in for the subset of Redis used by RedisSessionStore.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def get(self, key):
+        with self._lock:
+            return self._data[key] if self._live(key) else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = value
+            if ex is not None:
+                self._expires[key] = time.time() + ex
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key):
+                    del self._data[key]
+                    self._expires.pop(key, None)
+                    removed += 1
+            return removed
+
+    def rpush(self, key, *values):
+        with self._lock:
+            items = self._data[key] if self._live(key) else []
+            items.extend(values)
+            self._data[key] = items
+            return len(items)
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            items = self._data[key] if self._live(key) else []
+            end = len(items) if end == -1 else end + 1
+            return list(items[start:end])
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if not self._live(key):
+                return False
+            self._expires[key] = time.time() + seconds
+            return True
+
+class ResultCache:
+    """
+    A thread-safe LRU cache with per-entry TTL, optionally backed by a directory on disk.
+
+    Values must be JSON-serializable when a disk folder is used. Memory
+    misses fall through to disk, and disk hits are promoted back into memory.
+    Expired or unreadable disk entries are deleted when read, and at most every
+    prune_interval seconds a write sweeps the folder: expired files go,
+    then the oldest files until the folder fits in max_disk_bytes.
+    """
+
+    def __init__(self, max_entries=256, ttl=24 * 60 * 60, disk_folder=None, max_disk_bytes=None, prune_interval=60.0):
+        """
+        Args:
+            max_entries (int): Entries kept in memory before the least recently used is evicted.
+            ttl (float): Seconds an entry stays valid.
+            disk_folder (str, optional): Directory for the persistent copy of each entry.
+            max_disk_bytes (int, optional): Size cap for the disk folder; unbounded if None.
+            prune_interval (float): Minimum seconds between two sweeps of the disk folder.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_folder = disk_folder
+        self.max_disk_bytes = max_disk_bytes
+        self.prune_interval = prune_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._last_prune = None
+        if disk_folder:
+            os.makedirs(disk_folder, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_folder, f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+
+        if self.disk_folder:
+            path = self._disk_path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+            except OSError:
+                stored = None
+            except ValueError:
+                stored = {}
+            try:
+                expires, value = stored['expires'], stored['value']
+                fresh = expires > now
+            except (KeyError, TypeError):
+                fresh = False
+            if fresh:
+                with self._lock:
+                    self._store(key, value, expires)
+                    self.hits += 1
+                return value
+            if stored is not None:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Caches value under key for ttl seconds."""
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires)
+        if self.disk_folder:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({'expires': expires, 'value': value}, f)
+            os.replace(tmp_path, path)
+            if self._last_prune is None or time.monotonic() - self._last_prune >= self.prune_interval:
+                self.prune()
+
+    def _store(self, key, value, expires):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def prune(self):
+        """
+        Deletes expired disk entries, then the oldest ones beyond max_disk_bytes.
+        
+        Files are aged by modification time, which set() refreshes. A sweep
+        already running in another thread makes this call return at once.
+        
+        Returns:
+            int: Number of files deleted.
+        """
+        if not self.disk_folder or not self._prune_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._last_prune = time.monotonic()
+            cutoff = time.time() - self.ttl
+            files = []
+            try:
+                with os.scandir(self.disk_folder) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        if entry.name.endswith('.json') or stat.st_mtime < cutoff:
+                            files.append((stat.st_mtime, stat.st_size, entry.path, entry.name.endswith('.json')))
+            except OSError:
+                return 0
+
+            files.sort()
+            total = sum(size for _, size, _, _ in files)
+            removed = 0
+            for mtime, size, path, is_entry in files:
+                if is_entry and mtime >= cutoff and (self.max_disk_bytes is None or total <= self.max_disk_bytes):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
+        finally:
+            self._prune_lock.release()
+
+    def clear(self):
+        """Drops every in-memory entry (disk entries are left to prune())."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns hit/miss counters and the number of in-memory entries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries)
+            }
+
+def analysis_cache_key(image_digests, prompt, model):
+    """
+    Builds a content-addressed cache key for a Style Analyzer request.
+    
+    The key covers the raw upload contents (in any order), the system prompt
+    and the model name, so changing either of the latter invalidates old
+    results. It is known as soon as the uploads are spooled, before encoding.
     
     Args:
-        folder (str): Directory containing the assets.
+        image_digests (list): Hex SHA-256 digests of the raw uploads (SpooledUpload.info['sha256']).
+        prompt (str): The system prompt sent with the images.
+        model (str): Model name.
         
     Returns:
-        list: A list of dictionaries, each containing 'image_path' and 'metadata'.
+        str: Hex SHA-256 digest.
     """
-    items = []
-    metadata_list = load_metadata(folder)
-    for data in metadata_list:
-        img_file = data.get("image_file") 
+    digest = hashlib.sha256()
+    for image_digest in sorted(image_digests):
+        digest.update(image_digest.encode('ascii'))
+    digest.update(b"\0")
+    digest.update(prompt.encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(model.encode('utf-8'))
+    return digest.hexdigest()
+
+class QueueFullError(Exception):
+    """Raised when a JobQueue has no room for another job."""
+
+class JobQueue:
+    """
+    Runs jobs on a bounded thread pool and keeps their results for polling.
+
+    At most max_workers jobs run at once and at most max_pending more wait;
+    submit() raises QueueFullError beyond that so callers can apply
+    backpressure. Finished jobs are forgotten after result_ttl seconds.
+    """
+
+    def __init__(self, max_workers=4, max_pending=16, result_ttl=600):
+        """
+        Args:
+            max_workers (int): Jobs run concurrently.
+            max_pending (int): Jobs allowed to wait for a worker.
+            result_ttl (float): Seconds a finished job stays retrievable.
+        """
+        self.result_ttl = result_ttl
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queues func(*args, **kwargs).
         
-        items.append({
-            "image_path": img_file,
-            "metadata": data
-        })
-    return items
+        Returns:
+            str: The job id.
+            
+        Raises:
+            QueueFullError: If all workers are busy and the queue is full.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError("Job queue is full")
+
+        job_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._purge_expired()
+            self._jobs[job_id] = {'status': 'queued', 'result': None, 'error': None, 'finished': None}
+        try:
+            self._executor.submit(self._run, job_id, func, args, kwargs)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        job = self._jobs[job_id]
+        job['status'] = 'running'
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            job.update(status='failed', error=str(e), finished=time.time())
+        else:
+            job.update(status='done', result=result, finished=time.time())
+        finally:
+            self._slots.release()
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job['finished'] and job['finished'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """
+        Returns a snapshot of a job: 'status' ('queued', 'running', 'done' or 'failed'),
+        'result' and 'error'; or None if the job is unknown or expired.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (job['finished'] and job['finished'] < time.time() - self.result_ttl):
+                return None
+            return dict(job)
+
+    def shutdown(self, wait=True):
+        """Stops accepting jobs and optionally waits for running ones."""
+        self._executor.shutdown(wait=wait)
+
+class UpstreamUnavailableError(Exception):
+    """Raised without calling the upstream API when it is known to be unhealthy or saturated."""
+
+class CircuitBreaker:
+    """
+    Classic closed/open/half-open circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are refused for reset_timeout seconds. Then a single trial call is let
+    through: success closes the circuit, failure opens it again. A trial
+    that ends without either (e.g. interrupted) must call release_trial().
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout (float): Seconds to stay open before allowing a trial call.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """'closed', 'open' or 'half-open'."""
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """Returns True if a call may go to the upstream now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Lets another trial call through after one that recorded no outcome. No-op otherwise."""
+        with self._lock:
+            self._trial_in_flight = False
+
+class ResilientChatClient:
+    """
+    Wraps an OpenAI-style client with deadlines, retries, a concurrency cap and a circuit breaker.
+
+    Exposes the same chat.completions.create() entry point as the wrapped
+    client. Each call gets an overall deadline that covers queueing for a
+    concurrency slot and all retries; the remaining time is passed on as the
+    per-request timeout. 429/5xx responses (and the configured transport
+    errors) are retried with jittered exponential backoff, honouring
+    Retry-After when the upstream sends it.
+    """
+
+    RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+    def __init__(self, client, max_concurrency=8, deadline=60.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, breaker=None, retryable_exceptions=()):
+        """
+        Args:
+            client: An OpenAI-compatible client (its own retries should be disabled).
+            max_concurrency (int): Calls allowed in flight at once.
+            deadline (float): Seconds a call may take in total, including retries.
+            max_retries (int): Retries after the first attempt.
+            backoff_base (float): Backoff before the first retry; doubles per retry.
+            backoff_max (float): Upper bound for a single backoff.
+            breaker (CircuitBreaker, optional): Defaults to CircuitBreaker().
+            retryable_exceptions (tuple): Exception types retried regardless of status code.
+        """
+        self.client = client
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable_exceptions = tuple(retryable_exceptions)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create_chat_completion))
+
+    def _is_retryable(self, error):
+        if isinstance(error, self.retryable_exceptions):
+            return True
+        return getattr(error, 'status_code', None) in self.RETRYABLE_STATUS_CODES
+
+    def _backoff(self, error, attempt):
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            return float(headers.get('retry-after'))
+        except (TypeError, ValueError):
+            return min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def create_chat_completion(self, **kwargs):
+        """
+        Calls chat.completions.create() on the wrapped client.
+        
+        With stream=True the upstream stream is returned wrapped in a
+        GuardedStream, which keeps the concurrency slot and the deadline
+        until the stream ends and records the outcome on the breaker then.
+        
+        Raises:
+            UpstreamUnavailableError: If the circuit is open or no slot frees up before the deadline.
+            TimeoutError: If the deadline passes between retries.
+            Exception: The last upstream error once retries are exhausted or for non-retryable errors.
+        """
+        if not self.breaker.allow():
+            raise UpstreamUnavailableError("Upstream circuit is open")
+        deadline = time.monotonic() + self.deadline
+        if not self._slots.acquire(timeout=self.deadline):
+            self.breaker.record_failure()
+            raise UpstreamUnavailableError("No upstream capacity before the deadline")
+
+        handed_off = False
+        try:
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.breaker.record_failure()
+                    raise TimeoutError("Upstream deadline exceeded")
+                try:
+                    response = self.client.chat.completions.create(timeout=remaining, **kwargs)
+                except Exception as e:
+                    if not self._is_retryable(e):
+                        self.breaker.record_success()
+                        raise
+                    delay = self._backoff(e, attempt)
+                    if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        self.breaker.record_failure()
+                        raise
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                if kwargs.get('stream'):
+                    stream = GuardedStream(response, self._slots, self.breaker, deadline)
+                    handed_off = True
+                    return stream
+                self.breaker.record_success()
+                return response
+        finally:
+            if not handed_off:
+                self._slots.release()
+                self.breaker.release_trial()
+
+class GuardedStream:
+    """
+    A streamed completion that keeps its ResilientChatClient slot until it ends.
+
+    Returned by ResilientChatClient for stream=True calls. Iterating yields
+    the upstream chunks; the concurrency slot is held and the call's
+    deadline enforced between chunks until the stream is exhausted, fails
+    or is closed, and only then is the outcome recorded on the circuit
+    breaker. Close it (or use it as a context manager) when a consumer
+    stops early, otherwise the slot is released only when it is garbage
+    collected.
+    """
+
+    def __init__(self, stream, slots, breaker, deadline):
+        """
+        Args:
+            stream: The iterable returned by the wrapped client.
+            slots (threading.Semaphore): Semaphore the slot was acquired from.
+            breaker (CircuitBreaker): Breaker the outcome is recorded on.
+            deadline (float): time.monotonic() value after which the stream is abandoned.
+        """
+        self.stream = stream
+        self._iterator = None
+        self._slots = slots
+        self._breaker = breaker
+        self._deadline = deadline
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        if time.monotonic() > self._deadline:
+            self._finish(success=False)
+            raise TimeoutError("Upstream deadline exceeded")
+        try:
+            if self._iterator is None:
+                self._iterator = iter(self.stream)
+            return next(self._iterator)
+        except StopIteration:
+            self._finish(success=True)
+            raise
+        except Exception:
+            self._finish(success=False)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Stops reading, closes the upstream stream and frees the slot. Safe to call twice."""
+        self._finish(success=True)
+
+    def _finish(self, success):
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        try:
+            close = getattr(self.stream, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            if success:
+                self._breaker.record_success()
+            else:
+                self._breaker.record_failure()
+            self._slots.release()
+
+class StyleDNAStreamParser:
+    """
+    Incrementally extracts styleDNA entries from a streamed Style Analyzer JSON response.
+
+    Feed content deltas as they arrive; each call returns the styleDNA
+    entries completed by that delta, so they can be shown before the full
+    response (and the rest of the JSON) has arrived.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._decoder = json.JSONDecoder()
+        self._position = None
+        self._done = False
+
+    def feed(self, delta):
+        """
+        Appends a content delta.
+        
+        Returns:
+            list: styleDNA entries (dicts) completed by this delta.
+        """
+        self.text += delta
+        entries = []
+        if self._done:
+            return entries
+        if self._position is None:
+            key = self.text.find('"styleDNA"')
+            bracket = self.text.find('[', key) if key != -1 else -1
+            if bracket == -1:
+                return entries
+            self._position = bracket + 1
 
-def filter_furniture(items, category=None, style=None, color=None, season=None):
+        while True:
+            while self._position < len(self.text) and self.text[self._position] in ' \t\r\n,':
+                self._position += 1
+            if self._position >= len(self.text):
+                return entries
+            if self.text[self._position] == ']':
+                self._done = True
+                return entries
+            try:
+                entry, end = self._decoder.raw_decode(self.text, self._position)
+            except json.JSONDecodeError:
+                return entries
+            entries.append(entry)
+            self._position = end
+
+def filter_furniture(items, category=None, style=None, color=None, season=None, material=None):
     """
     Filters furniture items based on provided criteria.
     
     Args:
-        items (list): The list of furniture items.
+        items (list or Catalog): The furniture items. A Catalog answers from its facet indexes.
         category (str, optional): Filter by category.
         style (str, optional): Filter by style.
         color (str, optional): Filter by color.
         season (str, optional): Filter by season.
+        material (str, optional): Filter by material.
         
     Returns:
         list: A filtered list of furniture items.
     """
+    if isinstance(items, Catalog):
+        return items.filter(category=category, style=style, color=color, season=season, material=material)
+
     filtered_items = items
 
     if category:
-        filtered_items = [item for item in filtered_items if item['metadata'].get('category', '').lower() == category.lower()]
+        filtered_items = [item for item in filtered_items if item.get('category', '').lower() == category.lower()]
     
     if style:
-        filtered_items = [item for item in filtered_items if item['metadata'].get('style', '').lower() == style.lower()]
+        filtered_items = [item for item in filtered_items if item.get('style', '').lower() == style.lower()]
     
     if color:
-        filtered_items = [item for item in filtered_items if item['metadata'].get('color', '').lower() == color.lower()]
+        filtered_items = [item for item in filtered_items if item.get('color', '').lower() == color.lower()]
         
     if season:
-        filtered_items = [item for item in filtered_items if item['metadata'].get('season', '').lower() == season.lower()]
+        filtered_items = [item for item in filtered_items if item.get('season', '').lower() == season.lower()]
+
+    if material:
+        filtered_items = [item for item in filtered_items if item.get('material', '').lower() == material.lower()]
 
     return filtered_items
 
-def calculate_rent(item_metadata):
+PRICING_RULES = {
+    "version": 0,
+    "rent": {
+        "base": {"Sofa": 60, "Chair": 40, "Storage": 35, "Lamp": 20},
+        "default": 25,
+        "premium_material": 15,
+        "premium_style": 10
+    },
+    "buyout": {
+        "base": {"Sofa": 1200, "Chair": 800, "Storage": 700, "Lamp": 350},
+        "default": 500,
+        "premium_material": 300,
+        "premium_style": 150
+    },
+    "premium_materials": ("Velvet", "Leather", "Marble"),
+    "premium_styles": ("Mid-Century Modern", "Art Deco"),
+    "terms": {
+        "max_months": 36,
+        "discounts": ((6, 0.05), (12, 0.10), (24, 0.15)),
+        "rent_to_own_credit": 0.5
+    }
+}
+
+NO_TERM_DISCOUNTS = {"max_months": None, "discounts": (), "rent_to_own_credit": 0}
+QUOTE_DURATIONS = (3, 6, 12, 24)
+
+def load_pricing_rules(path):
     """
-    Calculates the monthly rental price based on item category, material, and style.
+    Loads and validates a versioned pricing rules file.
+    
+    The file is JSON in the shape of PRICING_RULES: a "version", "rent" and
+    "buyout" tables ("base" price per category, "default", "premium_material"
+    and "premium_style" surcharges) and the "premium_materials" and
+    "premium_styles" lists.
     
     Args:
-        item_metadata (dict): Metadata dictionary of the item.
+        path (str): Path to the rules file.
         
     Returns:
-        float: Calculated monthly rent.
+        dict: The rules, with the premium lists converted to tuples.
+        
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is not valid JSON or does not describe valid rules.
     """
-    base_rent_map = {
-        "Sofa": 60, "Chair": 40, "Storage": 35, "Lamp": 20
-    }
+    with open(path, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+
+    if not isinstance(rules, dict) or "version" not in rules:
+        raise ValueError(f"{path}: pricing rules need a version")
+    for kind in ("rent", "buyout"):
+        price_rules = rules.get(kind)
+        if not isinstance(price_rules, dict) or not isinstance(price_rules.get("base"), dict):
+            raise ValueError(f"{path}: missing {kind} base prices")
+        prices = [price_rules.get(key) for key in ("default", "premium_material", "premium_style")]
+        prices += list(price_rules["base"].values())
+        if not all(isinstance(price, (int, float)) and not isinstance(price, bool) for price in prices):
+            raise ValueError(f"{path}: {kind} prices must be numbers")
+    for key in ("premium_materials", "premium_styles"):
+        if not isinstance(rules.get(key), list):
+            raise ValueError(f"{path}: {key} must be a list")
+        rules[key] = tuple(rules[key])
+
+    terms = rules.setdefault("terms", dict(NO_TERM_DISCOUNTS))
+    try:
+        terms["discounts"] = tuple(sorted((int(months), float(rate)) for months, rate in terms.get("discounts", ())))
+        terms["rent_to_own_credit"] = float(terms.get("rent_to_own_credit", 0))
+        terms["max_months"] = int(terms["max_months"]) if terms.get("max_months") else None
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"{path}: invalid rental terms") from e
+    if not all(0 <= rate < 1 for _, rate in terms["discounts"]) or not 0 <= terms["rent_to_own_credit"] <= 1:
+        raise ValueError(f"{path}: term discounts and rent-to-own credit must be fractions")
+    return rules
+
+def validate_duration(duration, rules=None):
+    """
+    Checks a rental duration against the pricing rules.
     
-    base_rent = base_rent_map.get(item_metadata.get('category'), 25)
+    Args:
+        duration (int): Rental term in months.
+        rules (dict, optional): Pricing rules; defaults to PRICING_RULES.
+        
+    Returns:
+        bool: True if the duration can be quoted.
+    """
+    max_months = (rules or PRICING_RULES).get("terms", NO_TERM_DISCOUNTS)["max_months"]
+    return duration >= 1 and (max_months is None or duration <= max_months)
+
+def quote_terms(monthly_rent, buyout_price, durations, rules=None):
+    """
+    Quotes rentals for many (item, duration) pairs in one vectorized pass.
     
-    adjustment = 0
-    if item_metadata.get('material') in ['Velvet', 'Leather', 'Marble']:
-        adjustment += 15
-    if item_metadata.get('style') in ['Mid-Century Modern', 'Art Deco']:
-        adjustment += 10
+    The tiered discount for each duration is the rate of the longest
+    discount tier it reaches; it applies to the monthly rent. Rent-to-own
+    credit is that fraction of the rent paid over the term, capped at the
+    buyout price.
+    
+    Args:
+        monthly_rent (list): List monthly rent per pair.
+        buyout_price (list): Buyout price per pair.
+        durations (list): Rental term in months per pair.
+        rules (dict, optional): Pricing rules; defaults to PRICING_RULES.
+        
+    Returns:
+        list: One quote dict per pair, with duration, list_monthly_rent,
+            discount_rate, monthly_rent, total_cost, buyout_price,
+            rent_to_own_credit and buyout_after_term.
+    """
+    terms = (rules or PRICING_RULES).get("terms", NO_TERM_DISCOUNTS)
+    thresholds = np.array([months for months, _ in terms["discounts"]], dtype=np.int64)
+    rates = np.array([0.0] + [rate for _, rate in terms["discounts"]])
+
+    list_rent = np.asarray(monthly_rent, dtype=float)
+    buyout = np.asarray(buyout_price, dtype=float)
+    months = np.asarray(durations, dtype=np.int64)
+    discount = rates[np.searchsorted(thresholds, months, side='right')]
+    rent = np.round(list_rent * (1 - discount), 2)
+    total = np.round(rent * months, 2)
+    credit = np.minimum(np.round(total * terms["rent_to_own_credit"], 2), buyout)
 
-    monthly_rent = base_rent + adjustment
+    columns = zip(
+        months.tolist(), list_rent.tolist(), discount.tolist(), rent.tolist(),
+        total.tolist(), buyout.tolist(), credit.tolist(), np.round(buyout - credit, 2).tolist()
+    )
+    return [
+        {
+            'duration': duration,
+            'list_monthly_rent': list_monthly_rent,
+            'discount_rate': discount_rate,
+            'monthly_rent': rent_after_discount,
+            'total_cost': total_cost,
+            'buyout_price': item_buyout,
+            'rent_to_own_credit': rent_to_own_credit,
+            'buyout_after_term': buyout_after_term
+        }
+        for duration, list_monthly_rent, discount_rate, rent_after_discount, total_cost, item_buyout, rent_to_own_credit, buyout_after_term in columns
+    ]
+
+def _price(item_metadata, rules, price_rules):
+    price = price_rules["base"].get(item_metadata.get('category'), price_rules["default"])
+    if item_metadata.get('material') in rules["premium_materials"]:
+        price += price_rules["premium_material"]
+    if item_metadata.get('style') in rules["premium_styles"]:
+        price += price_rules["premium_style"]
+    return price
+
+def calculate_rent(item_metadata, rules=None):
+    """
+    Calculates the monthly rental price based on item category, material, and style.
     
-    return monthly_rent
+    Args:
+        item_metadata (dict|FurnitureItem): Sidecar metadata, or the item itself.
+        rules (dict, optional): Pricing rules; defaults to PRICING_RULES.
+        
+    Returns:
+        float: Calculated monthly rent.
+    """
+    rules = rules or PRICING_RULES
+    return _price(item_metadata, rules, rules["rent"])
 
-def calculate_buyout_price(item_metadata):
+def calculate_buyout_price(item_metadata, rules=None):
     """
     Calculates the total buyout price based on item category, material, and style.
     
     Args:
-        item_metadata (dict): Metadata dictionary of the item.
+        item_metadata (dict|FurnitureItem): Sidecar metadata, or the item itself.
+        rules (dict, optional): Pricing rules; defaults to PRICING_RULES.
         
     Returns:
         float: Calculated buyout price.
     """
-    buyout_map = {
-        "Sofa": 1200, "Chair": 800, "Storage": 700, "Lamp": 350
-    }
-    
-    base_buyout_price = buyout_map.get(item_metadata.get('category'), 500)
-    
-    adjustment = 0
-    if item_metadata.get('material') in ['Velvet', 'Leather', 'Marble']:
-        adjustment += 300
-    if item_metadata.get('style') in ['Mid-Century Modern', 'Art Deco']:
-        adjustment += 150
+    rules = rules or PRICING_RULES
+    return _price(item_metadata, rules, rules["buyout"])
 
-    final_buyout_price = base_buyout_price + adjustment
-    
-    return final_buyout_price
+class PricingEngine:
+    """
+    Prices a whole set of items in one vectorized pass.
+
+    Category, material and style are factorized into integer codes over the
+    items once. The rules are then compiled into small per-value arrays
+    (base price by category code, premium flag by material and style code)
+    and every item is priced with a single NumPy gather; afterwards monthly
+    rent and buyout price are O(1) lookups by row_id. Results are identical
+    to calculate_rent() and calculate_buyout_price().
+    """
+
+    PRICED_FIELDS = ('category', 'material', 'style')
+
+    def __init__(self, items, rules=None):
+        """
+        Args:
+            items (iterable): FurnitureItems, e.g. a Catalog.
+            rules (dict, optional): Pricing rules in the shape of PRICING_RULES.
+        """
+        items = list(items)
+        self.ids = [item.id for item in items]
+        self.index = {item_id: i for i, item_id in enumerate(self.ids)}
+        self.codes = {}
+        self.values = {}
+        for field in self.PRICED_FIELDS:
+            table = {}
+            self.codes[field] = np.array(
+                [table.setdefault(getattr(item, field), len(table)) for item in items],
+                dtype=np.intp
+            )
+            self.values[field] = list(table)
+        self.reprice(rules or PRICING_RULES)
+
+    def reprice(self, rules):
+        """
+        Recomputes every price under new rules without touching the item metadata.
+        
+        Args:
+            rules (dict): Pricing rules in the shape of PRICING_RULES.
+        """
+        premium_material = np.array(
+            [value in rules["premium_materials"] for value in self.values['material']], dtype=bool
+        )[self.codes['material']]
+        premium_style = np.array(
+            [value in rules["premium_styles"] for value in self.values['style']], dtype=bool
+        )[self.codes['style']]
+
+        self.prices = {}
+        lookups = {}
+        for kind in ("rent", "buyout"):
+            price_rules = rules[kind]
+            base_prices = [price_rules["base"].get(value, price_rules["default"]) for value in self.values['category']]
+            base = np.array(base_prices)
+            self.prices[kind] = (
+                base[self.codes['category']]
+                + premium_material * price_rules["premium_material"]
+                + premium_style * price_rules["premium_style"]
+            )
+            # calculate_rent() returns an int unless a float price went into the sum
+            is_float = (
+                np.array([isinstance(price, float) for price in base_prices], dtype=bool)[self.codes['category']]
+                | (premium_material & isinstance(price_rules["premium_material"], float))
+                | (premium_style & isinstance(price_rules["premium_style"], float))
+            )
+            prices = self.prices[kind].tolist()
+            if not is_float.all() and self.prices[kind].dtype.kind == 'f':
+                prices = [price if float_price else int(price) for price, float_price in zip(prices, is_float.tolist())]
+            lookups[kind] = prices
+        self.rules = rules
+        self.monthly_rent = lookups["rent"]
+        self.buyout_price = lookups["buyout"]
+
+    def with_rules(self, rules):
+        """
+        Returns a new engine for the same items priced under other rules.
+        
+        The factorized codes are shared, so only the per-value rule arrays and
+        the final gather are recomputed; this engine is left unchanged.
+        """
+        engine = copy.copy(self)
+        engine.reprice(rules)
+        return engine
+
+    def changed_ids(self, other):
+        """
+        Lists the items whose rent or buyout price differs between two engines for the same items.
+        
+        Args:
+            other (PricingEngine): An engine returned by with_rules().
+            
+        Returns:
+            list: row_ids (str) whose prices changed.
+        """
+        changed = (self.prices["rent"] != other.prices["rent"]) | (self.prices["buyout"] != other.prices["buyout"])
+        return [self.ids[i] for i in np.flatnonzero(changed)]
+
+    def __len__(self):
+        return len(self.index)
+
+    def price(self, item_id):
+        """
+        Looks up the prices of one item.
+        
+        Args:
+            item_id (str|int): The item's row_id.
+            
+        Returns:
+            tuple: (monthly_rent, buyout_price).
+            
+        Raises:
+            KeyError: If the item was not priced by this engine.
+        """
+        i = self.index[str(item_id)]
+        return self.monthly_rent[i], self.buyout_price[i]
 
 def get_available_options(items):
     """
@@ -147,17 +4090,18 @@ def get_available_options(items):
         'category': set()
     }
     for item in items:
-        metadata = item['metadata']
-        options['style'].add(metadata.get('style', 'N/A'))
-        options['color'].add(metadata.get('color', 'N/A'))
-        options['season'].add(metadata.get('season', 'N/A'))
-        options['category'].add(metadata.get('category', 'N/A'))
+        options['style'].add(item.get('style', 'N/A'))
+        options['color'].add(item.get('color', 'N/A'))
+        options['season'].add(item.get('season', 'N/A'))
+        options['category'].add(item.get('category', 'N/A'))
     return {k: sorted(list(v)) for k, v in options.items()}
 
 def get_item_by_id(items, item_id):
-    """Retrieves a single item from the list by its row_id."""
+    """Retrieves a single item from the list (or Catalog) by its row_id."""
+    if isinstance(items, Catalog):
+        return items.get(item_id)
     for item in items:
-        if str(item['metadata'].get('row_id')) == str(item_id):
+        if item.id == str(item_id):
             return item
     return None
 
@@ -166,14 +4110,13 @@ def get_item_by_id(items, item_id):
 
 def place_order(item, rental_details, order_type="RENT"):
     """Handles the CLI logic for placing an order."""
-    metadata = item['metadata']
     duration = rental_details.get('duration', 0)
     monthly_rent = rental_details.get('monthly_rent', 0)
     buyout_price = rental_details.get('buyout_price', 0)
 
     print("\n========================================")
     print(f"CONFIRMATION: You are about to proceed with the following:")
-    print(f"   Item: {metadata['series']} ({metadata['style']})")
+    print(f"   Item: {item.series} ({item.style})")
     
     if order_type == "RENT":
         total_cost = monthly_rent * duration
@@ -191,7 +4134,7 @@ def place_order(item, rental_details, order_type="RENT"):
     if user_confirm == 'yes':
         print("\nORDER PLACED SUCCESSFULLY!")
         print(f"Order Type: {order_type}")
-        print(f"Order ID: {hash(metadata['row_id'])}")
+        print(f"Order ID: {hash(item.row_id)}")
         print(f"Total Charged: ${total_cost:.2f}")
         print(f"Delivery: Estimated 5-7 business days.")
         print("========================================\n")
@@ -212,13 +4155,13 @@ def display_recommendations(recommendations, duration):
     
     display_limit = 5
     selectable_items = recommendations[:display_limit]
+    pricing = PricingEngine(selectable_items)
     
     for i, item in enumerate(selectable_items):
-        monthly_rent = calculate_rent(item['metadata'])
-        buyout_price = calculate_buyout_price(item['metadata'])
+        monthly_rent, buyout_price = pricing.price(item.id)
         total_rental_cost = monthly_rent * duration
         
-        print(f"[{i+1}] Item: {item['metadata']['series']} | Style: {item['metadata']['style']}")
+        print(f"[{i+1}] Item: {item.series} | Style: {item.style}")
         print(f"      Monthly Rent: ${monthly_rent:.2f} | Total Rent ({duration}M): ${total_rental_cost:.2f} | Buyout Price: ${buyout_price:.2f}")
         
     print("---------------------------------------------")
@@ -234,10 +4177,11 @@ def display_recommendations(recommendations, duration):
         if 1 <= selection_index <= len(selectable_items):
             selected_item = selectable_items[selection_index - 1]
             
+            monthly_rent, buyout_price = pricing.price(selected_item.id)
             rental_details = {
                 "duration": duration,
-                "monthly_rent": calculate_rent(selected_item['metadata']),
-                "buyout_price": calculate_buyout_price(selected_item['metadata'])
+                "monthly_rent": monthly_rent,
+                "buyout_price": buyout_price
             }
             
             action = input("Select action (Type 'RENT' or 'BUY'): ").strip().upper()
@@ -251,4 +4195,32 @@ def display_recommendations(recommendations, duration):
             print("Invalid selection number. Please try again.")
 
     except ValueError:
-        print("Invalid input. Please enter a number.")
\ No newline at end of file
+        print("Invalid input. Please enter a number.")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile the catalog sidecars into a snapshot file.")
+    parser.add_argument("folder", nargs="?", default="Pictures")
+    parser.add_argument("snapshot", nargs="?", default=".catalog.snapshot")
+    parser.add_argument("--workers", type=int, default=0, help="parse sidecars in this many processes")
+    parser.add_argument("--image-features", metavar="PATH", help="also compute image features for the similar-items index into PATH")
+    args = parser.parse_args()
+
+    timings = {}
+    items = get_all_items(args.folder, args.snapshot, args.workers, timings)
+    start = time.perf_counter()
+    catalog = Catalog(items)
+    add_timing(timings, 'indexing', time.perf_counter() - start)
+
+    if args.image_features:
+        start = time.perf_counter()
+        indexer = SimilarItemsIndexer(ImageFeatureStore(args.folder, args.image_features))
+        indexer.sync(catalog)
+        add_timing(timings, 'features', time.perf_counter() - start)
+
+    print(f"Compiled {len(items)} items into {args.snapshot}")
+    if args.image_features:
+        print(f"Stored {len(indexer.store)} image feature vectors in {args.image_features}")
+    for phase, seconds in timings.items():
+        print(f"  {phase:<10} {seconds:.3f} s")
@@ -0,0 +1,31 @@
+import sys
+import types
+
+import pytest
+
+import module
+from tests.fakes import FakeOpenAIClient
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """Imports the Flask app, with a placeholder API key when keys.py is absent."""
+    try:
+        import keys
+    except ImportError:
+        keys = types.ModuleType("keys")
+        keys.OpenAI_key = "test"
+        sys.modules["keys"] = keys
+    import main
+    return main
+
+
+@pytest.fixture
+def app_client(main_module, monkeypatch):
+    """A Flask test client with the fake OpenAI client, an empty analysis cache and a small job queue."""
+    monkeypatch.setattr(main_module, "client", FakeOpenAIClient())
+    monkeypatch.setattr(main_module, "ANALYSIS_CACHE", module.ResultCache())
+    jobs = module.JobQueue(max_workers=1, max_pending=1)
+    monkeypatch.setattr(main_module, "ANALYZER_JOBS", jobs)
+    yield main_module.app.test_client()
+    jobs.shutdown()
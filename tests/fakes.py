@@ -0,0 +1,151 @@
+"""Offline stand-ins for the OpenAI API and the catalog folder used by the tests."""
+
+import http.server
+import json
+import threading
+import time
+import types
+
+
+class FakeOpenAIClient:
+    """
+    Offline stand-in for openai.OpenAI covering chat.completions.create().
+
+    Returns a fixed Style Analyzer response (after an optional delay), which
+    lets the analyzer routes run locally and in load tests without an API key.
+    """
+
+    DEFAULT_RESPONSE = {
+        "styleDNA": [
+            {"name": "Minimalist", "percentage": 85},
+            {"name": "Scandinavian", "percentage": 75}
+        ],
+        "keyElements": ["Neutral Color Palette", "Natural Light", "Wood Accents"],
+        "designRecommendations": ["Introduce a statement floor lamp in a corner to create a focal point."]
+    }
+
+    def __init__(self, response=None, delay=0.0):
+        """
+        Args:
+            response (dict, optional): JSON returned as the message content.
+            delay (float): Seconds to sleep per call, to mimic upstream latency.
+        """
+        self.response = response if response is not None else self.DEFAULT_RESPONSE
+        self.delay = delay
+        self.calls = []
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.delay:
+            time.sleep(self.delay)
+        content = json.dumps(self.response)
+        if kwargs.get('stream'):
+            return self._stream(content)
+        message = types.SimpleNamespace(role="assistant", content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(index=0, message=message, finish_reason="stop")])
+
+    @staticmethod
+    def _stream(content, piece_size=16):
+        for start in range(0, len(content), piece_size):
+            delta = types.SimpleNamespace(role="assistant", content=content[start:start + piece_size])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+
+class FakeOpenAIServer:
+    """
+    Local HTTP stand-in for the OpenAI chat completions endpoint.
+
+    Point a real OpenAI client at `server.base_url`. Each POST to
+    /v1/chat/completions consumes the next scripted (status, delay) step,
+    falling back to a 200 with FakeOpenAIClient.DEFAULT_RESPONSE (streamed as
+    chunks when the request asks for stream=True), which lets retries,
+    timeouts and the circuit breaker be exercised end to end.
+    """
+
+    def __init__(self, response=None, script=None):
+        """
+        Args:
+            response (dict, optional): JSON returned as the message content on success.
+            script (list, optional): (status code, delay seconds) per request, consumed in order.
+        """
+        self.response = response if response is not None else FakeOpenAIClient.DEFAULT_RESPONSE
+        self.script = list(script or [])
+        self.requests = []
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with fake._lock:
+                    fake.requests.append(json.loads(body or b"{}"))
+                    status, delay = fake.script.pop(0) if fake.script else (200, 0)
+                if delay:
+                    time.sleep(delay)
+                if status == 200 and fake.requests[-1].get('stream'):
+                    self._send_stream(json.dumps(fake.response))
+                    return
+                if status == 200:
+                    payload = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": "fake",
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": json.dumps(fake.response)},
+                            "finish_reason": "stop"
+                        }],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                    }
+                else:
+                    payload = {"error": {"message": f"Scripted status {status}", "type": "fake", "code": None}}
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, content, piece_size=16):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                for start in range(0, len(content), piece_size):
+                    chunk = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": "fake",
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": content[start:start + piece_size]},
+                            "finish_reason": None
+                        }]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def write_sidecar(folder, row_id, **fields):
+    """Writes a minimal JSON sidecar for row_id into folder (a pathlib.Path)."""
+    data = {"row_id": row_id, "category": "Chair", "series": f"Chair {row_id}", "image_file": f"Pictures\\{row_id}.png", **fields}
+    path = folder / f"{row_id}.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
@@ -0,0 +1,18 @@
+def test_cart_renders_records_once(app_client, main_module, monkeypatch):
+    item_ids = [item.id for item in list(main_module.CATALOG_WATCHER.catalog)[:3]]
+    for item_id in item_ids:
+        assert app_client.get(f"/add_to_cart/{item_id}").status_code == 302
+
+    calls = []
+    real = main_module.get_render_records
+
+    def counting():
+        calls.append(1)
+        return real()
+
+    monkeypatch.setattr(main_module, "get_render_records", counting)
+    response = app_client.get("/cart")
+    assert response.status_code == 200
+    assert len(calls) == 1
+    for item_id in item_ids:
+        assert f"/update_cart/{item_id}" in response.get_data(as_text=True)
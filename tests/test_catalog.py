@@ -0,0 +1,75 @@
+import pytest
+
+import module
+
+
+def make_catalog(count=10):
+    rows = [
+        {"row_id": i, "category": "Sofa" if i % 2 else "Chair", "style": "Rustic", "image_file": f"Pictures/{i}.png"}
+        for i in range(count)
+    ]
+    return module.Catalog([module.make_item(row) for row in rows])
+
+
+def walk(catalog, limit, **criteria):
+    ids, cursor = [], None
+    while True:
+        result = catalog.page(cursor=cursor, limit=limit, **criteria)
+        ids.extend(result['ids'])
+        cursor = result['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def test_cursors_round_trip():
+    for position in (0, 7, 123456):
+        assert module.decode_cursor(module.encode_cursor(position)) == position
+    for cursor in ("not a cursor", module.encode_cursor(3)[::-1], "!!"):
+        with pytest.raises(ValueError):
+            module.decode_cursor(cursor)
+
+
+def test_cursor_walk_returns_every_item_once():
+    catalog = make_catalog()
+    assert walk(catalog, limit=3) == [str(i) for i in range(10)]
+    assert walk(catalog, limit=2, category="sofa") == ["1", "3", "5", "7", "9"]
+
+    last = catalog.page(limit=10)
+    assert last['next_cursor'] is None
+    assert last['total'] == 10
+
+
+def test_paging_continues_after_a_remove():
+    catalog = make_catalog()
+    first = catalog.page(limit=4)
+    assert first['ids'] == ["0", "1", "2", "3"]
+
+    catalog.remove("3")
+    catalog.remove("4")
+    second = catalog.page(cursor=first['next_cursor'], limit=4)
+    assert second['ids'] == ["5", "6", "7", "8"]
+    assert second['total'] == 8
+
+    catalog.add(module.make_item({"row_id": 10, "category": "Chair", "image_file": "Pictures/10.png"}))
+    third = catalog.page(cursor=second['next_cursor'], limit=4)
+    assert third['ids'] == ["9", "10"]
+    assert third['next_cursor'] is None
+
+
+def test_page_rejects_bad_limits():
+    catalog = make_catalog()
+    for limit, offset in ((0, 0), (5, -1)):
+        with pytest.raises(ValueError):
+            catalog.page(limit=limit, offset=offset)
+    assert len(catalog.page(limit=module.MAX_PAGE_SIZE + 50)['ids']) == 10
+
+
+def test_api_items_pages_with_cursors(app_client, main_module):
+    catalog = main_module.CATALOG_WATCHER.catalog
+    first = app_client.get("/api/items?limit=2").get_json()
+    assert first['total'] == len(catalog)
+    assert [str(item['id']) for item in first['items']] == catalog.page(limit=2)['ids']
+
+    second = app_client.get(f"/api/items?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [str(item['id']) for item in second['items']] == catalog.page(limit=2, offset=2)['ids']
+    assert app_client.get("/api/items?cursor=bogus").status_code == 400
@@ -0,0 +1,70 @@
+import pytest
+
+import module
+from tests.fakes import write_sidecar
+
+pytestmark = pytest.mark.skipif(module.fcntl is None, reason="shared catalog tables need fcntl")
+
+
+def fields(catalog):
+    return {item.id: (item.row_id, item.image_path, item.category, item.series, item.material) for item in catalog}
+
+
+def test_table_round_trips_rows(tmp_path):
+    items = [
+        module.make_item({"row_id": "a-1", "category": "Sofa", "series": "Velvet Sofa", "image_file": "Pictures/a.png"}),
+        module.make_item({"row_id": "b-2", "category": "Sofa", "material": "Oak"})
+    ]
+    path = str(tmp_path / "catalog.table")
+    module.write_catalog_table(path, str(tmp_path), [("a.json", 11, items[0]), ("b.json", 22, items[1])])
+
+    table = module.CatalogTable(path)
+    assert len(table) == 2
+    assert table.manifest() == {"a.json": 11, "b.json": 22}
+    assert table.vocabularies['category'] == ["Sofa"]
+    rows = [module.TableItem(table, row) for row in range(len(table))]
+    assert fields(rows) == fields(items)
+    assert rows[1].image_path is None
+    assert rows[0].source == str(tmp_path / "a.json")
+
+
+def test_non_table_file_is_rejected(tmp_path):
+    path = tmp_path / "catalog.table"
+    path.write_bytes(b"not a table" * 10)
+    with pytest.raises(ValueError):
+        module.CatalogTable(str(path))
+
+
+def test_readers_follow_the_writer_and_take_over_its_lock(tmp_path):
+    folder = tmp_path / "items"
+    folder.mkdir()
+    table_path = str(tmp_path / "catalog.table")
+    for row_id in range(3):
+        write_sidecar(folder, row_id, prompt=f"Prompt {row_id}")
+
+    writer = module.CatalogWatcher(str(folder), table_path=table_path)
+    reader = module.CatalogWatcher(str(folder), table_path=table_path)
+    assert writer.table is None
+    assert all(isinstance(item, module.TableItem) for item in reader.catalog)
+    assert fields(reader.catalog) == fields(writer.catalog)
+    assert reader.catalog.items_by_id["1"].get('prompt') == "Prompt 1"
+    assert not reader.poll()
+
+    unchanged = reader.catalog.items_by_id["0"]
+    write_sidecar(folder, 2, material="Velvet")
+    (folder / "1.json").unlink()
+    assert writer.poll()
+    assert reader.poll()
+    assert fields(reader.catalog) == fields(writer.catalog)
+    assert reader.catalog.items_by_id["0"] is unchanged
+    assert reader.catalog.items_by_id["2"].material == "Velvet"
+
+    writer._table_lock.close()
+    write_sidecar(folder, 5)
+    assert reader.poll()
+    assert reader.table is None
+    assert set(reader.catalog.items_by_id) == {"0", "2", "5"}
+
+    late = module.CatalogWatcher(str(folder), table_path=table_path)
+    assert isinstance(late.catalog.items_by_id["5"], module.TableItem)
+    assert fields(late.catalog) == fields(reader.catalog)
@@ -0,0 +1,57 @@
+import threading
+
+import module
+from tests.fakes import write_sidecar
+
+
+def test_poll_errors_are_logged_and_polling_continues(tmp_path, monkeypatch, caplog):
+    write_sidecar(tmp_path, 0)
+    watcher = module.CatalogWatcher(str(tmp_path), interval=0.01)
+    real_poll = watcher.poll
+    calls = []
+    recovered = threading.Event()
+
+    def flaky_poll():
+        calls.append(1)
+        if len(calls) == 1:
+            raise KeyError("row_id")
+        result = real_poll()
+        recovered.set()
+        return result
+
+    monkeypatch.setattr(watcher, "poll", flaky_poll)
+    write_sidecar(tmp_path, 1)
+    watcher.start()
+    try:
+        assert recovered.wait(5)
+    finally:
+        watcher.stop()
+    assert "Catalog poll failed" in caplog.text
+    assert "1" in watcher.catalog
+
+
+
+def test_invalid_pricing_rules_are_logged_and_ignored(tmp_path, caplog):
+    items = tmp_path / "items"
+    items.mkdir()
+    write_sidecar(items, 0)
+    rules_path = tmp_path / "pricing_rules.json"
+    rules_path.write_text('{"version": 3, "rent": {}}', encoding="utf-8")
+    watcher = module.CatalogWatcher(str(items), pricing_rules_path=str(rules_path))
+    assert watcher.catalog.pricing_rules is module.PRICING_RULES
+    assert "Keeping current pricing rules" in caplog.text
+    assert "missing rent base prices" in caplog.text
+
+
+def test_published_catalogs_have_their_indexes_built(tmp_path):
+    write_sidecar(tmp_path, 0, material="Oak")
+    watcher = module.CatalogWatcher(str(tmp_path))
+    assert watcher.catalog._recommender_version == watcher.catalog.version
+
+    write_sidecar(tmp_path, 1, material="Velvet")
+    assert watcher.poll()
+    catalog = watcher.catalog
+    assert catalog._recommender_version == catalog.version
+    assert len(catalog._recommender) == 2
+    assert catalog._search_index_version == catalog.version
+    assert catalog._search_index.size == 2
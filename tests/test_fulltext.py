@@ -0,0 +1,61 @@
+import module
+
+PROMPT = "Product photography of a {series}. Remove all labels, remove all words."
+
+
+def make_index(count=30):
+    index = module.FullTextIndex()
+    series = ["Velvet Sofa", "Walnut Desk", "Wicker Chair"]
+    for row_id in range(count):
+        name = series[row_id % len(series)]
+        index.add(module.make_item({
+            "row_id": row_id, "series": name, "attributes": "Wood legs" if row_id % 2 else "Plush seat",
+            "prompt": PROMPT.format(series=name), "image_file": f"Pictures/{row_id}.png"
+        }))
+    return index
+
+
+def test_completions_skip_boilerplate_terms():
+    index = make_index()
+    assert index.completions("p", 8) == ["plush"]
+    assert index.completions("w", 8) == ["wood", "walnut", "wicker"]
+    assert index.completions("re", 8) == []
+    assert index.suggest("velvet w") == ["velvet wood", "velvet walnut", "velvet wicker"]
+
+
+def test_small_index_keeps_every_completion():
+    index = make_index(count=3)
+    assert "photography" in index.completions("p", 8)
+
+
+def test_boilerplate_terms_are_still_searchable():
+    index = make_index()
+    assert len(index.search("photography", k=100)) == 30
+    assert {item_id for item_id, _ in index.search("walnut", k=100)} == {str(i) for i in range(1, 30, 3)}
+
+
+def test_remove_only_touches_the_items_postings():
+    index = make_index()
+    index.remove("0")
+    assert "0" not in index
+    assert all(0 not in postings for postings in index.postings.values())
+    assert index.search("velvet", k=100) and "0" not in dict(index.search("velvet", k=100))
+
+    index.add(module.make_item({"row_id": 99, "series": "Zebra Ottoman", "image_file": "Pictures/99.png"}))
+    assert index.completions("zeb", 8) == ["zebra"]
+    index.remove("99")
+    assert index.completions("zeb", 8) == []
+    assert "zebra" not in index.postings
+
+
+def test_loaded_index_can_remove_items(tmp_path):
+    index = make_index()
+    path = str(tmp_path / "fulltext")
+    index.save(path, {}, {})
+    loaded, _, _ = module.FullTextIndex.load(path)
+    assert {slot: set(terms) for slot, terms in loaded.slot_terms.items()} == {
+        slot: set(terms) for slot, terms in index.slot_terms.items()
+    }
+    loaded.remove("3")
+    assert all(index.slots["3"] not in postings for postings in loaded.postings.values())
+    assert "3" not in dict(loaded.search("walnut", k=100))
@@ -0,0 +1,43 @@
+import module
+from tests.fakes import write_sidecar
+
+
+def test_cold_fields_are_read_from_the_sidecar_on_demand(tmp_path, monkeypatch):
+    path = write_sidecar(tmp_path, 0, prompt="A velvet chair", size="1024x1024")
+    watcher = module.CatalogWatcher(str(tmp_path))
+    item = watcher.catalog.items_by_id["0"]
+    assert item.source == str(path)
+    assert item._cold is None
+
+    reads = []
+    load_sidecar = module.load_sidecar
+    monkeypatch.setattr(module, "load_sidecar", lambda source: reads.append(source) or load_sidecar(source))
+    assert item.get('category') == "Chair"
+    assert item.get('image_file') == "Pictures\\0.png"
+    assert reads == []
+
+    assert item.get('prompt') == "A velvet chair"
+    assert item.cold_fields() == {"prompt": "A velvet chair", "size": "1024x1024"}
+    assert reads == [str(path), str(path)]
+
+    write_sidecar(tmp_path, 0, prompt="A leather chair")
+    assert item.get('prompt') == "A leather chair"
+    path.unlink()
+    assert item.get('prompt', "gone") == "gone"
+
+
+def test_items_without_a_sidecar_keep_cold_fields_in_memory(monkeypatch):
+    monkeypatch.setattr(module, "load_sidecar", lambda source: 1 / 0)
+    item = module.make_item({"row_id": 3, "style": "Rustic", "prompt": "A rustic table", "model": "dall-e-3"})
+    assert item.get('prompt') == "A rustic table"
+    assert item.get('model') == "dall-e-3"
+    assert item.get('material', "n/a") == "n/a"
+    assert item.get('row_id') == 3
+
+
+def test_hot_fields_are_slotted_and_interned():
+    style = "".join(["Mid-Century ", "Modern"])
+    first = module.make_item({"row_id": 1, "style": style})
+    second = module.make_item({"row_id": 2, "style": "".join(["Mid-Century", " Modern"])})
+    assert first.style is second.style
+    assert not hasattr(first, "__dict__")
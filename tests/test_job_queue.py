@@ -0,0 +1,138 @@
+import io
+import threading
+import time
+import types
+
+import pytest
+from PIL import Image
+
+import module
+from tests.fakes import FakeOpenAIClient
+
+
+def wait_for(queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_submit_runs_job_and_keeps_result():
+    queue = module.JobQueue(max_workers=1, max_pending=1)
+    job_id = queue.submit(lambda a, b: a + b, 2, b=3)
+    job = wait_for(queue, job_id)
+    assert job['status'] == 'done'
+    assert job['result'] == 5
+    assert job['error'] is None
+    queue.shutdown()
+
+
+def test_failed_job_reports_error():
+    def fail():
+        raise ValueError("bad input")
+
+    queue = module.JobQueue(max_workers=1, max_pending=1)
+    job = wait_for(queue, queue.submit(fail))
+    assert job['status'] == 'failed'
+    assert job['error'] == "bad input"
+    queue.shutdown()
+
+
+def test_full_queue_raises_until_a_worker_frees_up():
+    release = threading.Event()
+    queue = module.JobQueue(max_workers=1, max_pending=1)
+    running = queue.submit(release.wait)
+    waiting = queue.submit(release.wait)
+    assert queue.get(waiting)['status'] == 'queued'
+    with pytest.raises(module.QueueFullError):
+        queue.submit(release.wait)
+    release.set()
+    wait_for(queue, running)
+    wait_for(queue, waiting)
+    assert queue.submit(lambda: None)
+    queue.shutdown()
+
+
+def test_finished_jobs_expire():
+    queue = module.JobQueue(max_workers=1, max_pending=1, result_ttl=0.05)
+    job_id = queue.submit(lambda: 1)
+    wait_for(queue, job_id)
+    time.sleep(0.1)
+    assert queue.get(job_id) is None
+    assert queue.get("unknown") is None
+    queue.shutdown()
+
+
+class FailingClient:
+    def __init__(self):
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        raise RuntimeError("upstream exploded")
+
+
+def upload(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
+
+def post_job(client, color=(200, 180, 160)):
+    data = {f"image{i}": (upload(color), f"room{i}.png") for i in (1, 2, 3)}
+    return client.post("/analyze_style?mode=job", data=data, content_type="multipart/form-data")
+
+
+def poll(client, status_url, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get(status_url)
+        if response.status_code != 202:
+            return response
+        assert response.get_json()['status'] in ('queued', 'running')
+        time.sleep(0.02)
+    raise AssertionError("Job did not finish")
+
+
+def test_job_mode_returns_job_then_result(app_client, main_module):
+    response = post_job(app_client)
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['job_id'] and body['status_url']
+
+    result = poll(app_client, body['status_url'])
+    assert result.status_code == 200
+    data = result.get_json()
+    assert data['status'] == 'done'
+    assert data['styleDNA'] == FakeOpenAIClient.DEFAULT_RESPONSE['styleDNA']
+    assert data['recommendations']
+    assert len(main_module.client.calls) == 1
+
+
+def test_job_mode_reports_full_queue(app_client, main_module, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(main_module, "request_style_analysis", lambda *args: release.wait())
+    try:
+        assert post_job(app_client, (10, 10, 10)).status_code == 202
+        assert post_job(app_client, (20, 20, 20)).status_code == 202
+        response = post_job(app_client, (30, 30, 30))
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == "5"
+    finally:
+        release.set()
+
+
+def test_job_mode_reports_upstream_failure(app_client, main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "client", FailingClient())
+    response = post_job(app_client, (40, 50, 60))
+    result = poll(app_client, response.get_json()['status_url'])
+    assert result.status_code == 500
+    assert result.get_json()['status'] == 'failed'
+    assert "upstream exploded" in result.get_json()['error']
+
+
+def test_unknown_job_is_not_found(app_client):
+    assert app_client.get("/analyze_style/unknown-job").status_code == 404
@@ -0,0 +1,125 @@
+import random
+
+import pytest
+
+import module
+
+
+def assert_engine_matches(engine, items, rules=None):
+    for item in items:
+        expected = (module.calculate_rent(item, rules), module.calculate_buyout_price(item, rules))
+        actual = engine.price(item.id)
+        assert actual == expected, (item, actual, expected)
+        assert list(map(type, actual)) == list(map(type, expected)), (item, actual, expected)
+
+
+def random_rules(rng, vocabulary):
+    def price():
+        return rng.choice([rng.randint(0, 2000), round(rng.uniform(0, 2000), 2)])
+
+    def price_rules():
+        categories = rng.sample(vocabulary['category'], rng.randint(0, len(vocabulary['category'])))
+        return {
+            "base": {category: price() for category in categories},
+            "default": price(),
+            "premium_material": price(),
+            "premium_style": price()
+        }
+
+    return {
+        "version": rng.randint(1, 100),
+        "rent": price_rules(),
+        "buyout": price_rules(),
+        "premium_materials": tuple(rng.sample(vocabulary['material'], rng.randint(0, 4))),
+        "premium_styles": tuple(rng.sample(vocabulary['style'], rng.randint(0, 4)))
+    }
+
+
+def random_items(rng, count, vocabulary):
+    items = []
+    for row_id in range(count):
+        metadata = {'row_id': row_id}
+        for field, values in vocabulary.items():
+            choice = rng.choice(values + ['Unknown', None])
+            if choice is not None:
+                metadata[field] = choice
+        items.append(module.make_item(metadata))
+    return items
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return module.get_all_items("Pictures")
+
+
+@pytest.fixture(scope="module")
+def vocabulary(catalog):
+    vocabulary = {
+        field: {getattr(item, field) for item in catalog if getattr(item, field)}
+        for field in module.PricingEngine.PRICED_FIELDS
+    }
+    vocabulary['material'] |= set(module.PRICING_RULES['premium_materials'])
+    vocabulary['style'] |= set(module.PRICING_RULES['premium_styles'])
+    vocabulary['category'] |= set(module.PRICING_RULES['rent']['base'])
+    return {field: sorted(values) for field, values in vocabulary.items()}
+
+
+def test_engine_matches_scalar_pricing_over_catalog(catalog):
+    assert_engine_matches(module.PricingEngine(catalog), catalog)
+
+
+def test_engine_matches_scalar_pricing_under_rules_file(catalog):
+    rules = module.load_pricing_rules("pricing_rules.json")
+    assert_engine_matches(module.PricingEngine(catalog, rules), catalog, rules)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_engine_matches_scalar_pricing_under_random_rules(seed, vocabulary):
+    rng = random.Random(seed)
+    items = random_items(rng, 300, vocabulary)
+    rules = random_rules(rng, vocabulary)
+    engine = module.PricingEngine(items, rules)
+    assert_engine_matches(engine, items, rules)
+
+    other_rules = random_rules(rng, vocabulary)
+    repriced = engine.with_rules(other_rules)
+    assert_engine_matches(repriced, items, other_rules)
+    assert_engine_matches(engine, items, rules)
+    changed = set(engine.changed_ids(repriced))
+    for item in items:
+        before = (module.calculate_rent(item, rules), module.calculate_buyout_price(item, rules))
+        after = (module.calculate_rent(item, other_rules), module.calculate_buyout_price(item, other_rules))
+        assert (item.id in changed) == (before != after)
+
+
+def test_term_discount_applies_from_each_tier_boundary():
+    durations = [1, 5, 6, 11, 12, 23, 24, 36]
+    quotes = module.quote_terms([100] * len(durations), [10000] * len(durations), durations)
+    assert [quote['discount_rate'] for quote in quotes] == [0.0, 0.0, 0.05, 0.05, 0.10, 0.10, 0.15, 0.15]
+    assert [quote['monthly_rent'] for quote in quotes] == [100.0, 100.0, 95.0, 95.0, 90.0, 90.0, 85.0, 85.0]
+    assert quotes[-1]['total_cost'] == 85.0 * 36
+
+
+def test_rent_to_own_credit_is_capped_at_the_buyout_price():
+    uncapped, capped = module.quote_terms([100, 100], [500, 500], [3, 24])
+    assert uncapped['rent_to_own_credit'] == 150.0
+    assert uncapped['buyout_after_term'] == 350.0
+    assert capped['total_cost'] == 2040.0
+    assert capped['rent_to_own_credit'] == 500.0
+    assert capped['buyout_after_term'] == 0.0
+
+
+def test_durations_are_limited_by_the_rules():
+    assert [module.validate_duration(months) for months in (0, 1, 36, 37)] == [False, True, True, False]
+    assert module.validate_duration(120, {"terms": module.NO_TERM_DISCOUNTS})
+    quote, = module.quote_terms([100], [500], [24], {"terms": module.NO_TERM_DISCOUNTS})
+    assert quote['discount_rate'] == 0.0
+    assert quote['rent_to_own_credit'] == 0.0
+
+
+def test_quotes_route_rejects_unsupported_durations(app_client, main_module):
+    item_id = next(iter(main_module.CATALOG_WATCHER.catalog)).id
+    quotes = app_client.get(f"/api/items/{item_id}/quotes?durations=6,12").get_json()['quotes']
+    assert [quote['duration'] for quote in quotes] == [6, 12]
+    assert app_client.get(f"/api/items/{item_id}/quotes?durations=37").status_code == 400
+    assert app_client.get("/api/items/missing/quotes").status_code == 404
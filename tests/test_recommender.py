@@ -0,0 +1,63 @@
+import numpy as np
+
+import module
+
+ROWS = [
+    {"row_id": 0, "category": "Sofa", "series": "Velvet Sofa", "style": "Art Deco", "material": "Velvet", "attributes": "Tufted back"},
+    {"row_id": 1, "category": "Chair", "series": "Oak Chair", "style": "Japandi", "material": "Oak", "attributes": "Natural linen seat"},
+    {"row_id": 2, "category": "Table", "series": "Oak Table", "style": "Rustic", "material": "Oak", "attributes": "Live edge"},
+    {"row_id": 3, "category": "Lamp", "series": "Floor Lamp", "style": "Industrial", "material": "Metal", "attributes": "Matte black"},
+]
+
+
+def make_items(rows=ROWS):
+    return [module.make_item(dict(row, image_file=f"Pictures/{row['row_id']}.png")) for row in rows]
+
+
+def dense_scores(recommender, terms):
+    """Cosine scores computed the straightforward way, to check the sparse layout against."""
+    matrix = np.zeros((len(recommender), len(recommender.vocabulary)), dtype=np.float64)
+    for column in range(len(recommender.vocabulary)):
+        start, end = recommender.indptr[column], recommender.indptr[column + 1]
+        matrix[recommender.indices[start:end], column] = recommender.data[start:end]
+    return matrix @ recommender.embed(terms)
+
+
+def test_rows_are_unit_length():
+    recommender = module.StyleRecommender(make_items())
+    norms = np.zeros(len(recommender))
+    np.add.at(norms, recommender.indices, recommender.data.astype(np.float64) ** 2)
+    assert np.allclose(norms, 1.0, atol=1e-5)
+
+
+def test_rank_matches_dense_cosine():
+    recommender = module.StyleRecommender(make_items())
+    terms = {"oak": 2.0, "linen": 1.0, "velvet": 0.5}
+    scores = dense_scores(recommender, terms)
+    expected = [recommender.ids[row] for row in np.argsort(-scores, kind='stable')[:3]]
+    ranked = recommender.rank(terms, 3)
+    assert [item_id for item_id, _ in ranked] == expected
+    assert ranked[0][0] == "1"
+    assert np.allclose([score for _, score in ranked], np.sort(scores)[::-1][:3], atol=1e-5)
+
+
+def test_rank_restricted_to_candidates():
+    recommender = module.StyleRecommender(make_items())
+    ranked = recommender.rank({"oak": 1.0}, 2, candidate_ids=["2", "3", "missing"])
+    assert [item_id for item_id, _ in ranked] == ["2", "3"]
+    assert recommender.rank({"unknown": 1.0}, 2) == []
+
+
+def test_previous_index_drops_terms_no_item_uses():
+    items = make_items()
+    first = module.StyleRecommender(items)
+    assert "velvet" in first.term_ids
+
+    replaced = make_items([dict(ROWS[0], series="Linen Sofa", material="Linen")])
+    second = module.StyleRecommender(replaced + items[1:], previous=first)
+    assert "velvet" not in second.term_ids
+    assert sorted(second.term_ids.values()) == list(range(len(second.term_ids)))
+    assert second.item_terms["1"][0] is items[1]
+    fresh = module.StyleRecommender(replaced + items[1:])
+    terms = {"oak": 1.0, "linen": 1.0}
+    assert second.rank(terms, 4) == fresh.rank(terms, 4)
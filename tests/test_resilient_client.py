@@ -0,0 +1,133 @@
+import json
+import time
+import types
+
+import pytest
+from openai import OpenAI, APIConnectionError, BadRequestError, InternalServerError
+
+import module
+from tests.fakes import FakeOpenAIClient, FakeOpenAIServer
+
+
+@pytest.fixture
+def server():
+    server = FakeOpenAIServer()
+    yield server
+    server.close()
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault('backoff_base', 0.01)
+    kwargs.setdefault('backoff_max', 0.05)
+    kwargs.setdefault('deadline', 5.0)
+    kwargs.setdefault('retryable_exceptions', (APIConnectionError,))
+    return module.ResilientChatClient(OpenAI(api_key="test", base_url=server.base_url, max_retries=0), **kwargs)
+
+
+def create(client):
+    response = client.chat.completions.create(model="fake", messages=[{"role": "user", "content": "hi"}])
+    return response.choices[0].message.content
+
+
+def test_retries_server_errors_until_success(server):
+    server.script = [(500, 0), (503, 0)]
+    client = make_client(server)
+    assert json.loads(create(client)) == FakeOpenAIClient.DEFAULT_RESPONSE
+    assert len(server.requests) == 3
+    assert client.breaker.state == 'closed'
+
+
+def test_gives_up_after_max_retries(server):
+    server.script = [(500, 0)] * 3
+    client = make_client(server, max_retries=2)
+    with pytest.raises(InternalServerError):
+        create(client)
+    assert len(server.requests) == 3
+
+
+def test_client_errors_are_not_retried_or_counted(server):
+    server.script = [(400, 0)]
+    breaker = module.CircuitBreaker(failure_threshold=1)
+    client = make_client(server, breaker=breaker)
+    with pytest.raises(BadRequestError):
+        create(client)
+    assert len(server.requests) == 1
+    assert breaker.state == 'closed'
+
+
+def test_deadline_bounds_slow_upstream(server):
+    server.script = [(200, 2.0)]
+    client = make_client(server, deadline=0.3, max_retries=5)
+    started = time.monotonic()
+    with pytest.raises((APIConnectionError, TimeoutError)):
+        create(client)
+    assert time.monotonic() - started < 1.5
+    assert client.breaker._failures == 1
+
+
+def test_no_slot_before_deadline_is_unavailable(server):
+    server.script = [(200, 0.5)]
+    client = make_client(server, max_concurrency=1, deadline=0.2)
+    client._slots.acquire()
+    with pytest.raises(module.UpstreamUnavailableError):
+        create(client)
+    assert server.requests == []
+
+
+def test_breaker_opens_then_half_opens_then_closes(server):
+    server.script = [(500, 0), (500, 0)]
+    breaker = module.CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    client = make_client(server, breaker=breaker, max_retries=0)
+    for _ in range(2):
+        with pytest.raises(InternalServerError):
+            create(client)
+    assert breaker.state == 'open'
+    with pytest.raises(module.UpstreamUnavailableError):
+        create(client)
+    assert len(server.requests) == 2
+
+    time.sleep(0.25)
+    assert breaker.state == 'half-open'
+    create(client)
+    assert breaker.state == 'closed'
+    assert len(server.requests) == 3
+
+
+def test_failed_half_open_trial_reopens(server):
+    server.script = [(500, 0), (500, 0)]
+    breaker = module.CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+    client = make_client(server, breaker=breaker, max_retries=0)
+    with pytest.raises(InternalServerError):
+        create(client)
+    time.sleep(0.25)
+    with pytest.raises(InternalServerError):
+        create(client)
+    assert breaker.state == 'open'
+
+
+def test_half_open_allows_one_trial_at_a_time():
+    breaker = module.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+
+def test_interrupted_half_open_trial_does_not_block_the_next_one():
+    def interrupted(**kwargs):
+        raise KeyboardInterrupt
+
+    breaker = module.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    upstream = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=interrupted)))
+    client = module.ResilientChatClient(upstream, max_concurrency=1, breaker=breaker)
+    with pytest.raises(KeyboardInterrupt):
+        client.chat.completions.create(model="fake", messages=[])
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    assert client._slots.acquire(blocking=False)
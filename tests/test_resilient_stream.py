@@ -0,0 +1,103 @@
+import time
+import types
+
+import pytest
+
+import module
+
+
+class StreamingClient:
+    """Returns the scripted chunk iterables in order, one per call."""
+
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        return self.streams.pop(0)
+
+
+def chunks(*pieces, delay=0.0, error=None):
+    for piece in pieces:
+        if delay:
+            time.sleep(delay)
+        yield piece
+    if error:
+        raise error
+
+
+def make_client(*streams, **kwargs):
+    kwargs.setdefault('max_concurrency', 1)
+    kwargs.setdefault('deadline', 0.2)
+    return module.ResilientChatClient(StreamingClient(*streams), **kwargs)
+
+
+def test_stream_holds_slot_until_exhausted():
+    client = make_client(chunks("a", "b"), chunks("c"))
+    stream = client.chat.completions.create(stream=True)
+    assert next(stream) == "a"
+    assert not client._slots.acquire(blocking=False)
+    assert list(stream) == ["b"]
+    assert list(client.chat.completions.create(stream=True)) == ["c"]
+
+
+def test_closing_stream_early_releases_slot():
+    client = make_client(chunks("a", "b"), chunks("c"))
+    with client.chat.completions.create(stream=True) as stream:
+        assert next(stream) == "a"
+    assert list(client.chat.completions.create(stream=True)) == ["c"]
+
+
+def test_stream_failure_is_recorded_after_it_happens():
+    breaker = module.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    client = make_client(chunks("a", error=ConnectionError("reset")), breaker=breaker)
+    stream = client.chat.completions.create(stream=True)
+    assert breaker.state == 'closed'
+    assert next(stream) == "a"
+    with pytest.raises(ConnectionError):
+        next(stream)
+    assert breaker.state == 'open'
+
+
+def test_stream_deadline_is_enforced_between_chunks():
+    breaker = module.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    client = make_client(chunks("a", "b", "c", delay=0.15), chunks("d"), breaker=breaker)
+    stream = client.chat.completions.create(stream=True)
+    with pytest.raises(TimeoutError):
+        list(stream)
+    assert breaker.state == 'open'
+    with pytest.raises(module.UpstreamUnavailableError):
+        client.chat.completions.create(stream=True)
+
+
+def test_half_open_trial_closes_circuit_only_when_stream_completes():
+    breaker = module.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    client = make_client(chunks("a", "b"), breaker=breaker, max_concurrency=2)
+    stream = client.chat.completions.create(stream=True)
+    assert next(stream) == "a"
+    assert breaker.state == 'half-open'
+    assert not breaker.allow()
+    list(stream)
+    assert breaker.state == 'closed'
+
+
+def test_consumer_closed_mid_trial_does_not_block_the_next_one():
+    breaker = module.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    client = make_client(chunks("a", "b"), chunks("c"), breaker=breaker)
+
+    def relay():
+        stream = client.chat.completions.create(stream=True)
+        try:
+            yield from stream
+        finally:
+            stream.close()
+
+    consumer = relay()
+    assert next(consumer) == "a"
+    consumer.close()
+    assert breaker.state == 'closed'
+    assert list(client.chat.completions.create(stream=True)) == ["c"]
@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import module
+
+
+def write_entry(folder, key, age, size=100):
+    path = os.path.join(folder, f"{key}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({'expires': time.time() + 60 - age, 'value': "x" * size}, f)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_round_trips_through_disk(tmp_path):
+    cache = module.ResultCache(ttl=60, disk_folder=str(tmp_path))
+    cache.set("a", {"value": 1})
+    cache.clear()
+    assert cache.get("a") == {"value": 1}
+    assert cache.stats()['hits'] == 1
+
+
+def test_expired_disk_entry_is_deleted_on_read(tmp_path):
+    cache = module.ResultCache(ttl=60, disk_folder=str(tmp_path))
+    path = write_entry(str(tmp_path), "old", age=120)
+    assert cache.get("old") is None
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize("content", ['{"expires": 1', '["old", "format"]', '{"value": 1}', '{"expires": "soon", "value": 1}'])
+def test_unreadable_disk_entry_is_a_miss_and_deleted(tmp_path, content):
+    cache = module.ResultCache(ttl=60, disk_folder=str(tmp_path))
+    path = tmp_path / "bad.json"
+    path.write_text(content, encoding="utf-8")
+    assert cache.get("bad") is None
+    assert cache.stats()['misses'] == 1
+    assert not path.exists()
+
+
+def test_prune_removes_expired_entries_and_stale_temp_files(tmp_path):
+    cache = module.ResultCache(ttl=60, disk_folder=str(tmp_path))
+    expired = write_entry(str(tmp_path), "expired", age=120)
+    fresh = write_entry(str(tmp_path), "fresh", age=1)
+    stale_tmp = os.path.join(str(tmp_path), "fresh.json.1.2.tmp")
+    open(stale_tmp, "w").close()
+    os.utime(stale_tmp, (time.time() - 120, time.time() - 120))
+    assert cache.prune() == 2
+    assert sorted(os.listdir(str(tmp_path))) == ["fresh.json"]
+    assert os.path.exists(fresh) and not os.path.exists(expired)
+
+
+def test_prune_enforces_size_cap_oldest_first(tmp_path):
+    folder = str(tmp_path)
+    paths = [write_entry(folder, f"k{i}", age=50 - i, size=1000) for i in range(5)]
+    cap = os.path.getsize(paths[3]) + os.path.getsize(paths[4])
+    cache = module.ResultCache(ttl=60, disk_folder=folder, max_disk_bytes=cap)
+    assert cache.prune() == 3
+    assert sorted(os.listdir(folder)) == ["k3.json", "k4.json"]
+
+
+def test_writes_prune_at_most_once_per_interval(tmp_path):
+    folder = str(tmp_path)
+    cache = module.ResultCache(ttl=60, disk_folder=folder, max_disk_bytes=1, prune_interval=3600)
+    cache.set("a", 1)
+    assert os.listdir(folder) == []
+    cache.set("b", 2)
+    assert os.listdir(folder) == ["b.json"]
+
+
+def upload(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
+
+def test_analyze_style_has_the_same_shape_on_miss_and_hit(app_client, main_module):
+    def post():
+        data = {f"image{i}": (upload((90, 120, 150)), f"room{i}.png") for i in (1, 2, 3)}
+        return app_client.post("/analyze_style", data=data, content_type="multipart/form-data")
+
+    miss = post()
+    hit = post()
+    assert miss.status_code == hit.status_code == 200
+    assert miss.get_json() == hit.get_json()
+    assert miss.get_json()['status'] == 'done'
+    assert len(main_module.client.calls) == 1
+
+
+def test_analyze_style_checks_the_cache_before_encoding(app_client, main_module, monkeypatch):
+    encoded = []
+    encode_images = main_module.encode_images
+    monkeypatch.setattr(main_module, "encode_images", lambda uploads: encoded.append(len(uploads)) or encode_images(uploads))
+
+    def post(path):
+        data = {f"image{i}": (upload((30, 60, 90)), f"room{i}.png") for i in (1, 2, 3)}
+        return app_client.post(path, data=data, content_type="multipart/form-data")
+
+    assert post("/analyze_style").status_code == 200
+    assert encoded == [3]
+    assert post("/analyze_style").status_code == 200
+    stream = post("/analyze_style/stream")
+    assert stream.status_code == 200
+    assert b"event: result" in stream.data
+    assert encoded == [3]
+    assert len(main_module.client.calls) == 1
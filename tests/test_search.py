@@ -0,0 +1,57 @@
+import threading
+
+import module
+
+
+def make_catalog():
+    rows = [
+        {"row_id": 0, "category": "Sofa", "series": "Velvet Sofa", "style": "Art Deco", "attributes": "Tufted back"},
+        {"row_id": 1, "category": "Sofa", "series": "Velvet Loveseat", "style": "Art Deco", "attributes": "Velvet cushions"},
+        {"row_id": 2, "category": "Chair", "series": "Venetian Chair", "style": "Traditional", "attributes": "Carved legs"},
+        {"row_id": 3, "category": "Table", "series": "Oak Table", "style": "Rustic", "attributes": "Live edge"},
+    ]
+    return module.Catalog([module.make_item(dict(row, image_file=f"Pictures/{row['row_id']}.png")) for row in rows])
+
+
+def test_suggestions_are_ranked_by_matches():
+    index = module.SearchIndex(make_catalog())
+    assert index.suggest("ve") == ["velvet", "venetian"]
+    assert index.suggest("") == []
+
+
+def test_suggestions_only_offer_words_search_matches():
+    index = module.SearchIndex(make_catalog())
+    for suggestion in index.suggest("v") + index.suggest("o") + index.suggest("tufted v"):
+        assert index.search(text=suggestion)['total'] > 0
+    assert index.suggest("tufted v") == ["tufted velvet"]
+    assert index.suggest("rustic") == []
+
+
+def test_suggestions_respect_limit():
+    index = module.SearchIndex(make_catalog())
+    assert index.suggest("v", limit=1) == ["velvet"]
+
+
+def test_short_prefixes_expand_to_the_most_frequent_words(monkeypatch):
+    rows = [{"row_id": i, "series": f"a{i:03d} common" if i % 2 else f"a{i:03d}"} for i in range(40)]
+    rows += [{"row_id": 40 + i, "series": "alpha"} for i in range(5)]
+    catalog = module.Catalog([module.make_item(dict(row, image_file=f"Pictures/{row['row_id']}.png")) for row in rows])
+    index = module.SearchIndex(catalog)
+    assert index.search(text="a")['total'] == 45
+
+    monkeypatch.setattr(module.SearchIndex, "MAX_PREFIX_EXPANSIONS", 3)
+    index = module.SearchIndex(catalog)
+    result = index.search(text="a", limit=100)
+    assert set(result['ids']) >= {str(40 + i) for i in range(5)}
+    assert result['total'] == 5 + 2
+    assert index.search(text="a017")['total'] == 1
+
+
+def test_search_index_does_not_wait_for_the_recommender():
+    catalog = make_catalog()
+    with catalog._recommender_lock:
+        finished = threading.Event()
+        thread = threading.Thread(target=lambda: (catalog.search_index(), finished.set()))
+        thread.start()
+        assert finished.wait(5)
+        thread.join()
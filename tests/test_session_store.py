@@ -0,0 +1,49 @@
+import module
+
+
+def count_sessions(store):
+    return store._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def test_sessions_round_trip_until_they_expire(tmp_path):
+    store = module.SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    store.save_session("live", {"cart": {"1": {"duration": 6}}})
+    store.save_session("dead", {"cart": {}}, ttl=-1)
+    assert store.load_session("live") == {"cart": {"1": {"duration": 6}}}
+    assert store.load_session("dead") is None
+
+
+def test_expired_sessions_are_purged_on_write(tmp_path):
+    store = module.SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), purge_interval=0)
+    store.append_order("old", {"id": 1})
+    for i in range(5):
+        store.save_session(f"old-{i}", {}, ttl=-1)
+    store.save_session("new", {"cart": {}})
+    assert count_sessions(store) == 1
+    assert store.list_orders("old") == [{"id": 1}]
+
+
+def test_purges_are_rate_limited(tmp_path):
+    store = module.SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), purge_interval=3600)
+    store.save_session("first", {})
+    store.save_session("expired", {}, ttl=-1)
+    assert count_sessions(store) == 2
+    assert store.purge_expired() == 1
+    assert count_sessions(store) == 1
+
+
+def test_anonymous_visits_store_no_session(app_client, main_module, tmp_path, monkeypatch):
+    store = module.SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    monkeypatch.setattr(main_module.app.session_interface, "store", store)
+    monkeypatch.setattr(main_module, "SESSION_STORE", store)
+
+    for path in ("/", "/cart", "/clear_cart", "/remove_item/1"):
+        response = app_client.get(path)
+        assert response.status_code in (200, 302), path
+        assert "Set-Cookie" not in response.headers, path
+    assert count_sessions(store) == 0
+
+    item_id = next(iter(main_module.CATALOG_WATCHER.catalog)).id
+    app_client.get(f"/add_to_cart/{item_id}")
+    assert count_sessions(store) == 1
+    assert item_id in app_client.get("/cart").get_data(as_text=True)
@@ -0,0 +1,125 @@
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import module
+
+
+class FakeStore:
+    """Feature store that returns one fixed vector per image and records lookups."""
+
+    def __init__(self, unreadable=()):
+        self.vectors = {}
+        self.lookups = []
+        self.unreadable = set(unreadable)
+        self.saves = 0
+
+    def get(self, filename):
+        self.lookups.append(filename)
+        if filename in self.unreadable:
+            raise OSError(f"cannot read {filename}")
+        if filename not in self.vectors:
+            self.vectors[filename] = np.random.default_rng(len(self.vectors)).random(8).astype(np.float32)
+        return self.vectors[filename]
+
+    def save(self):
+        self.saves += 1
+
+
+def item(row_id, name=None):
+    return module.make_item({"row_id": row_id, "series": "Chair", "image_file": f"Pictures/{name or row_id}.png"})
+
+
+def test_unchanged_catalog_is_skipped():
+    store = FakeStore()
+    indexer = module.SimilarItemsIndexer(store)
+    catalog = module.Catalog([item(i) for i in range(5)])
+    assert indexer.sync(catalog) == 5
+    store.lookups.clear()
+    assert indexer.sync(catalog) == 0
+    assert store.lookups == []
+
+
+def test_only_changed_items_are_looked_up():
+    store = FakeStore()
+    indexer = module.SimilarItemsIndexer(store)
+    catalog = module.Catalog([item(i) for i in range(5)])
+    indexer.sync(catalog)
+    store.lookups.clear()
+
+    updated = catalog.copy()
+    updated.add(item(2, name="2-new"))
+    updated.add(item(9))
+    updated.remove(4)
+    assert indexer.sync(updated) == 3
+    assert sorted(store.lookups) == ["2-new.png", "9.png"]
+    neighbours = dict(indexer.similar("0", 10))
+    assert "9" in neighbours and "4" not in neighbours
+
+
+def test_unreadable_images_are_retried():
+    store = FakeStore(unreadable={"3.png"})
+    indexer = module.SimilarItemsIndexer(store)
+    catalog = module.Catalog([item(i) for i in range(5)])
+    assert indexer.sync(catalog) == 4
+    store.unreadable.clear()
+    store.lookups.clear()
+    assert indexer.sync(catalog) == 1
+    assert store.lookups == ["3.png"]
+    assert indexer.sync(catalog) == 0
+
+
+def test_sync_thread_keeps_polling_after_errors(caplog):
+    store = FakeStore()
+    indexer = module.SimilarItemsIndexer(store)
+    catalog = module.Catalog([item(i) for i in range(3)])
+    calls = []
+    synced = threading.Event()
+
+    def get_catalog():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError("catalog not ready")
+        synced.set()
+        return catalog
+
+    indexer.start(get_catalog, interval=0.01)
+    try:
+        assert synced.wait(5)
+    finally:
+        indexer.stop()
+    assert "Similar items sync failed" in caplog.text
+    assert indexer.similar("0") is not None
+
+
+def test_only_unreadable_items_are_retried_while_the_catalog_is_unchanged():
+    store = FakeStore(unreadable={"3.png"})
+    indexer = module.SimilarItemsIndexer(store)
+    catalog = module.Catalog([item(i) for i in range(5)])
+    indexer.sync(catalog)
+    store.lookups.clear()
+    assert indexer.sync(catalog) == 0
+    assert indexer.sync(catalog) == 0
+    assert store.lookups == ["3.png", "3.png"]
+
+
+def test_store_decodes_a_broken_image_again_only_once_it_changes(tmp_path, monkeypatch):
+    decoded = []
+    image_features = module.image_features
+    monkeypatch.setattr(module, "image_features", lambda path: decoded.append(path) or image_features(path))
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    store = module.ImageFeatureStore(str(tmp_path), None)
+
+    for _ in range(3):
+        with pytest.raises(OSError):
+            store.get("broken.png")
+    assert len(decoded) == 1
+
+    Image.new("RGB", (32, 32), (200, 40, 40)).save(broken, format="PNG")
+    assert store.get("broken.png").shape == (module.COLOR_HISTOGRAM_BINS ** 3 + module.LAYOUT_GRID ** 2,)
+    assert len(decoded) == 2
+    assert store.get("broken.png") is store.get("broken.png")
+    assert len(decoded) == 2
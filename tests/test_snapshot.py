@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+import module
+from tests.fakes import write_sidecar
+
+
+@pytest.fixture
+def parsed_files(monkeypatch):
+    parsed = []
+    parse_chunk = module._parse_sidecar_chunk
+
+    def tracking_parse_chunk(folder, filenames):
+        parsed.extend(filenames)
+        return parse_chunk(folder, filenames)
+
+    monkeypatch.setattr(module, "_parse_sidecar_chunk", tracking_parse_chunk)
+    return parsed
+
+
+def touch(path, offset_ns):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + offset_ns))
+
+
+def test_pack_round_trips_sparse_fields():
+    metadata = [{"row_id": 0, "style": "Rustic"}, {"row_id": 1, "color": "Red"}]
+    snapshot = module.pack_snapshot({"0.json": 1, "1.json": 2}, metadata)
+    assert snapshot['columns']['style'] == ["Rustic", None]
+    assert module.unpack_snapshot(snapshot) == metadata
+
+
+def test_reload_parses_only_changed_sidecars(tmp_path, parsed_files):
+    folder = tmp_path / "items"
+    folder.mkdir()
+    snapshot_path = str(tmp_path / "catalog.snapshot")
+    paths = [write_sidecar(folder, row_id) for row_id in range(4)]
+
+    assert len(module.load_metadata_snapshot(str(folder), snapshot_path)) == 4
+    assert sorted(parsed_files) == ["0.json", "1.json", "2.json", "3.json"]
+    written = os.stat(snapshot_path).st_mtime_ns
+
+    parsed_files.clear()
+    timings = {}
+    assert len(module.load_metadata_snapshot(str(folder), snapshot_path, timings=timings)) == 4
+    assert parsed_files == []
+    assert 'parsing' not in timings
+    assert os.stat(snapshot_path).st_mtime_ns == written
+
+    write_sidecar(folder, 2, style="Art Deco")
+    touch(paths[2], 1_000_000)
+    paths[3].unlink()
+    metadata = module.load_metadata_snapshot(str(folder), snapshot_path)
+    assert parsed_files == ["2.json"]
+    assert {data['row_id']: data.get('style') for data in metadata} == {0: None, 1: None, 2: "Art Deco"}
+    assert set(module.read_snapshot(snapshot_path)['manifest']) == {"0.json", "1.json", "2.json"}
+
+
+def test_unreadable_snapshot_is_rebuilt(tmp_path, parsed_files):
+    folder = tmp_path / "items"
+    folder.mkdir()
+    snapshot_path = tmp_path / "catalog.snapshot"
+    write_sidecar(folder, 0)
+    snapshot_path.write_bytes(b"truncated")
+
+    assert module.read_snapshot(str(snapshot_path)) is None
+    assert len(module.load_metadata_snapshot(str(folder), str(snapshot_path))) == 1
+    assert parsed_files == ["0.json"]
+    assert module.read_snapshot(str(snapshot_path))['manifest'].keys() == {"0.json"}
@@ -0,0 +1,52 @@
+import module
+
+STYLES = ["Minimalist", "Maximalist", "Farmhouse", "Scandinavian", "Bohemian", "Coastal", "Mid Century Modern", "Industrial"]
+
+
+def make_taxonomy(**kwargs):
+    return module.StyleTaxonomy([style for style in STYLES if style != "Maximalist"], **kwargs)
+
+
+def test_exact_and_synonym_names_resolve():
+    taxonomy = make_taxonomy()
+    assert taxonomy.resolve("minimalist") == ("Minimalist", 1.0)
+    assert taxonomy.resolve("Mid-Century Modern") == ("Mid Century Modern", 1.0)
+    assert taxonomy.resolve("midcentury modern") == ("Mid Century Modern", 1.0)
+    assert taxonomy.resolve("Boho") == ("Bohemian", 1.0)
+
+
+def test_misspellings_resolve():
+    taxonomy = make_taxonomy()
+    assert taxonomy.resolve("Scandanavian")[0] == "Scandinavian"
+    assert taxonomy.resolve("Industral")[0] == "Industrial"
+    assert taxonomy.resolve("Bohemain")[0] == "Bohemian"
+
+
+def test_different_style_with_similar_spelling_does_not_resolve():
+    taxonomy = make_taxonomy()
+    assert taxonomy.resolve("Maximalist") is None
+    assert module.StyleTaxonomy(STYLES).resolve("Maximalist") == ("Maximalist", 1.0)
+
+
+def test_containment_covers_styles_and_synonyms():
+    taxonomy = make_taxonomy()
+    assert taxonomy.resolve("Coastal Grandmother")[0] == "Coastal"
+    assert taxonomy.resolve("French Country")[0] == "Farmhouse"
+    assert taxonomy.resolve("Urban Loft")[0] == "Industrial"
+
+
+def test_unknown_names_resolve_to_none():
+    taxonomy = make_taxonomy()
+    assert taxonomy.resolve("") is None
+    assert taxonomy.resolve(None) is None
+    assert taxonomy.resolve("Spaceship") is None
+
+
+def test_memo_is_bounded():
+    taxonomy = make_taxonomy(cache_size=4)
+    for i in range(20):
+        taxonomy.resolve(f"Style {i}")
+    taxonomy.resolve("Scandanavian")
+    assert len(taxonomy._resolved) == 4
+    assert "Scandanavian" in taxonomy._resolved
+    assert "Style 0" not in taxonomy._resolved
@@ -0,0 +1,60 @@
+import os
+import threading
+
+from PIL import Image
+
+import module
+
+
+def make_images(folder, count):
+    for i in range(count):
+        Image.new("RGB", (8, 8), (i % 256, 0, 0)).save(os.path.join(folder, f"{i}.png"))
+    return [f"{i}.png" for i in range(count)]
+
+
+def test_manifest_is_written_only_when_hashes_change(tmp_path):
+    source, cache_folder = tmp_path / "src", tmp_path / "cache"
+    source.mkdir()
+    names = make_images(str(source), 3)
+    cache = module.ThumbnailCache(str(source), str(cache_folder))
+    cache.fingerprint_all(names)
+    manifest = cache_folder / module.ThumbnailCache.MANIFEST_NAME
+    written = manifest.stat().st_mtime_ns
+    os.utime(manifest, ns=(written - 10**9, written - 10**9))
+
+    cache.fingerprint_all(names)
+    cache.save_manifest()
+    assert manifest.stat().st_mtime_ns == written - 10**9
+
+    reloaded = module.ThumbnailCache(str(source), str(cache_folder))
+    assert reloaded.fingerprint_all(names) == cache.fingerprint_all(names)
+    assert not reloaded._dirty
+
+
+def test_saving_while_other_threads_hash(tmp_path):
+    source, cache_folder = tmp_path / "src", tmp_path / "cache"
+    source.mkdir()
+    names = make_images(str(source), 200)
+    cache = module.ThumbnailCache(str(source), str(cache_folder))
+    errors = []
+
+    def hash_all(chunk):
+        try:
+            for name in chunk:
+                cache.fingerprint(name)
+                cache.save_manifest()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=hash_all, args=(names[i::4],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cache.save_manifest()
+
+    assert errors == []
+    assert not cache._dirty
+    reloaded = module.ThumbnailCache(str(source), str(cache_folder))
+    assert set(reloaded._hashes) == set(names)
+    assert [name for name in os.listdir(str(cache_folder)) if name.endswith(".tmp")] == []
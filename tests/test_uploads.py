@@ -0,0 +1,76 @@
+import concurrent.futures
+import hashlib
+import io
+
+import pytest
+from PIL import Image
+
+import module
+
+
+def png(size=(64, 64)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (120, 90, 60)).save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        yield executor
+
+
+def test_uploads_are_prepared_in_order(executor):
+    results = module.ingest_uploads([png((64, 64)), png((80, 40)), png((40, 80))], executor, max_bytes=1 << 20)
+    assert [(info['width'], info['height']) for _, info in results] == [(64, 64), (80, 40), (40, 80)]
+    assert all(b64_image for b64_image, _ in results)
+
+
+def test_failure_names_the_image_and_keeps_the_cause(executor):
+    with pytest.raises(module.InvalidUploadError) as raised:
+        module.ingest_uploads([png(), io.BytesIO(b"not an image"), png()], executor, max_bytes=1 << 20)
+    assert str(raised.value) == "Image 2: Not a readable image"
+    assert isinstance(raised.value.__cause__, module.InvalidUploadError)
+
+
+def test_oversized_upload_keeps_its_type(executor):
+    with pytest.raises(module.UploadTooLargeError) as raised:
+        module.ingest_uploads([png(), png(), png()], executor, max_bytes=50)
+    assert str(raised.value).startswith("Image 1: Image is larger than the limit")
+    assert isinstance(raised.value.__cause__, module.UploadTooLargeError)
+
+
+def test_spooling_hashes_the_raw_upload_before_encoding():
+    raw = png().getvalue()
+    with module.spool_upload(io.BytesIO(raw), max_bytes=1 << 20) as upload:
+        assert upload.info['sha256'] == hashlib.sha256(raw).hexdigest()
+        assert 'encode' not in upload.info['timings']
+        assert upload.encode(max_dimension=32)
+        assert 'encode' in upload.info['timings']
+
+
+def test_failed_spool_closes_the_other_uploads(executor, monkeypatch):
+    spooled = []
+    spool_upload = module.spool_upload
+
+    def tracking_spool_upload(stream, **kwargs):
+        upload = spool_upload(stream, **kwargs)
+        spooled.append(upload)
+        return upload
+
+    monkeypatch.setattr(module, "spool_upload", tracking_spool_upload)
+    with pytest.raises(module.InvalidUploadError):
+        module.spool_uploads([png(), io.BytesIO(b"not an image"), png()], executor, max_bytes=1 << 20)
+    assert len(spooled) == 2
+    assert all(upload.file.closed for upload in spooled)
+
+
+def test_unreadable_upload_chains_the_decoder_error():
+    with pytest.raises(module.InvalidUploadError) as raised:
+        module.spool_upload(io.BytesIO(b"not an image"), max_bytes=1 << 20)
+    assert isinstance(raised.value.__cause__, OSError)
+
+    with pytest.raises(ValueError) as raised:
+        module.prepare_image_for_upload(io.BytesIO(b"not an image"))
+    assert isinstance(raised.value.__cause__, OSError)